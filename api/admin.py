@@ -1,3 +1,21 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Blob, Project, Revision
+
+
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    list_display = ('id', 'owner', 'name', 'updated_at')
+    search_fields = ('owner', 'name')
+
+
+@admin.register(Revision)
+class RevisionAdmin(admin.ModelAdmin):
+    list_display = ('project', 'number', 'created_at')
+    raw_id_fields = ('project', 'parent', 'source', 'graph')
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'kind', 'size', 'created_at')
+    exclude = ('content',)
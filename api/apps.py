@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+
+def warm_up_server():
+    """
+    Pay for imports, the C language and the first conversion before the first
+    request. Called by the WSGI and ASGI entry points (and so by runserver),
+    not from ready(), so migrate, shell and other commands do not pay for it.
+    """
+    if getattr(settings, 'FLOWCHART_WARM_UP', True):
+        from engine.warmup import warm_up
+        warm_up()
@@ -0,0 +1,84 @@
+"""
+Batch conversion of many C sources on a process pool.
+
+Each worker process warms its own tree-sitter parser once, when it starts,
+and then converts whole files, so a batch uses every core of the machine
+instead of one request thread. The pool is created lazily in the process that
+first needs it, so pre-forking servers do not share one between workers.
+
+Workers are started from a forkserver (spawn where there is none), never
+forked from the server process: a gthread worker or the async executor may
+have another thread holding a lock (the parser pool's, the metrics') at the
+moment of the fork, and the child would wait for it forever.
+"""
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from engine import UNLIMITED, convert_source
+from engine.parser_pool import pool as parser_pool
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    parser_pool.warm()
+
+
+def worker_count():
+    return getattr(settings, 'FLOWCHART_BATCH_WORKERS', None) or os.cpu_count() or 1
+
+
+def _mp_context():
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # The forkserver imports the engine once; workers fork from it with it loaded
+    context.set_forkserver_preload(['engine'])
+    return context
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=worker_count(), mp_context=_mp_context(), initializer=_init_worker,
+            )
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def convert_batch(files, limits=UNLIMITED):
+    """
+    Convert a {name: code} mapping and return {name: result}, in the same order.
+    Small batches are converted in-process, where a process pool would only add overhead.
+    """
+    names = list(files)
+    sources = [files[name] for name in names]
+    workers = worker_count()
+    if workers <= 1 or len(sources) <= 1:
+        results = [convert_source(code, limits) for code in sources]
+    else:
+        chunksize = max(1, len(sources) // (workers * 4))
+        try:
+            convert = functools.partial(convert_source, limits=limits)
+            results = list(_get_executor().map(convert, sources, chunksize=chunksize))
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            _reset_executor()
+            raise
+    return dict(zip(names, results))
@@ -0,0 +1,112 @@
+"""
+Content-addressed cache of serialized conversion results.
+
+Each kind of result has its own cache and key namespace. Keys hash the
+normalized input together with the engine version, so an entry is never
+served by an engine that would produce something else. Entries are the
+already-encoded bytes, which lets a hit skip the parse, the walk and the
+encoding.
+
+There are two tiers: a bounded in-process LRU, and optionally a Django cache
+backend (``FLOWCHART_CACHE_ALIAS``) that is shared between worker processes.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def normalize_source(code):
+    # Leading and trailing whitespace never shows up in the flowchart
+    return code.strip()
+
+
+class ResultCache:
+    def __init__(self, namespace, version, max_entries=512, max_bytes=64 * 1024 * 1024, alias=None):
+        self.namespace = namespace
+        self.version = version
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, *parts):
+        # A JSON list keeps the parts apart whatever characters they contain
+        encoded = json.dumps([self.version, *parts], ensure_ascii=False, separators=(',', ':'))
+        return f"{self.namespace}:{hashlib.sha256(encoded.encode('utf8')).hexdigest()}"
+
+    def _shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def get(self, key):
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return content
+
+        shared = self._shared()
+        content = shared.get(key) if shared is not None else None
+        with self._lock:
+            if content is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self._store_local(key, content)
+        return content
+
+    def set(self, key, content):
+        self._store_local(key, content)
+        shared = self._shared()
+        if shared is not None:
+            shared.set(key, content)
+
+    def _store_local(self, key, content):
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = content
+            self._size += len(content)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+            }
+
+
+def result_cache(namespace, version):
+    return ResultCache(
+        namespace,
+        version,
+        max_entries=getattr(settings, 'FLOWCHART_CACHE_SIZE', 512),
+        max_bytes=getattr(settings, 'FLOWCHART_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+        alias=getattr(settings, 'FLOWCHART_CACHE_ALIAS', None),
+    )
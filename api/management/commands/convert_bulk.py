@@ -0,0 +1,30 @@
+"""
+Bulk conversion of directory trees with the server's limits.
+
+    python manage.py convert_bulk INPUT [INPUT ...] --output DIR [--jobs N] ...
+
+The same as `python -m engine` (see engine.cli), except that the
+FLOWCHART_* limits from the settings apply unless overridden.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from engine import Limits, cli
+
+
+class Command(BaseCommand):
+    help = 'Convert directory trees of .c files and exported flowchart graphs in bulk.'
+
+    def add_arguments(self, parser):
+        cli.add_arguments(parser)
+
+    def handle(self, *args, **options):
+        limits = Limits(
+            parse_timeout=getattr(settings, 'FLOWCHART_PARSE_TIMEOUT', None),
+            max_nodes=getattr(settings, 'FLOWCHART_MAX_NODES', None),
+            max_edges=getattr(settings, 'FLOWCHART_MAX_EDGES', None),
+            max_depth=getattr(settings, 'FLOWCHART_MAX_DEPTH', None),
+        )
+        failed = cli.execute(options, out=self.stdout, limits=limits)
+        if failed:
+            raise CommandError(f'{failed} file(s) could not be converted')
@@ -0,0 +1,140 @@
+"""
+Measure a cold start of the backend in fresh interpreters.
+
+    python manage.py profile_startup [--runs 3] [--budget-ms 1500] [--no-warm-up] [--json]
+
+Every run starts a new Python process with -X importtime that sets Django up,
+loads the URLconf and sends a first and a second request to both conversion
+endpoints. The median of every phase is reported with the slowest imports,
+and the command fails when the cold start (interpreter start to first
+flowchart response) is over the budget.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROBE = r'''
+import io, json, sys, time
+marks = {}
+start = time.perf_counter()
+
+# The same path a WSGI server takes: django.setup() and the engine warm-up
+from visual_coder_backend.wsgi import application
+marks['django_setup'] = time.perf_counter()
+
+from django.conf import settings
+from django.urls import get_resolver
+get_resolver().url_patterns
+marks['urlconf'] = time.perf_counter()
+
+settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'startup-probe']
+
+
+def post(path, body):
+    status = []
+    environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'SERVER_NAME': 'startup-probe', 'SERVER_PORT': '80',
+        'HTTP_HOST': 'startup-probe', 'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+    }
+    content = b''.join(application(environ, lambda line, headers, exc_info=None: status.append(line)))
+    return status[0], content
+
+
+code = 'int main() { int x = 1; if (x) { x = 2; } while (x) { x--; } return x; }'
+status, flowchart = post('/api/generate-flowchart/', json.dumps({'code': code}).encode())
+marks['first_flowchart'] = time.perf_counter()
+post('/api/generate-code-from-flowchart/', flowchart)
+marks['first_code'] = time.perf_counter()
+post('/api/generate-flowchart/', json.dumps({'code': code + ' '}).encode())
+marks['second_flowchart'] = time.perf_counter()
+
+from engine import warmup
+previous = start
+phases = {}
+for name, mark in marks.items():
+    phases[name] = (mark - previous) * 1000
+    previous = mark
+print(json.dumps({'status': status, 'phases': phases, 'warm_up': warmup.last_timings}))
+'''
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Measure import and first-request times of a cold start, against a budget.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--budget-ms', type=float, default=getattr(settings, 'FLOWCHART_STARTUP_BUDGET_MS', None))
+        parser.add_argument('--no-warm-up', action='store_true', help='start with FLOWCHART_WARM_UP=0')
+        parser.add_argument('--top', type=int, default=15, help='number of slowest imports to list')
+        parser.add_argument('--json', action='store_true')
+
+    def probe(self, warm_up):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'visual_coder_backend.settings')}
+        env['FLOWCHART_WARM_UP'] = '1' if warm_up else '0'
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            raise CommandError(f'Startup probe failed:\n{result.stderr[-2000:]}')
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        if not report['status'].startswith('200'):
+            raise CommandError(f"Startup probe got {report['status']} from generate-flowchart")
+        report['wall_ms'] = wall_ms
+        report['imports'] = parse_importtime(result.stderr)
+        return report
+
+    def handle(self, *args, **options):
+        runs = [self.probe(not options['no_warm_up']) for _ in range(max(1, options['runs']))]
+
+        phases = {name: statistics.median(run['phases'][name] for run in runs) for name in runs[0]['phases']}
+        # Interpreter start-up is what the wall clock saw and the probe did not
+        probe_total = statistics.median(sum(run['phases'].values()) for run in runs)
+        phases = {'interpreter': statistics.median(run['wall_ms'] for run in runs) - probe_total, **phases}
+        cold_start = sum(phases[name] for name in ('interpreter', 'django_setup', 'urlconf', 'first_flowchart'))
+        imports = sorted(runs[-1]['imports'].items(), key=lambda item: item[1][0], reverse=True)[:options['top']]
+        budget = options['budget_ms']
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'warm_up': not options['no_warm_up'],
+                'runs': len(runs),
+                'phases_ms': {name: round(value, 3) for name, value in phases.items()},
+                'warm_up_ms': runs[-1]['warm_up'],
+                'cold_start_ms': round(cold_start, 3),
+                'budget_ms': budget,
+                'slowest_imports': [{'module': name, 'self_us': s, 'cumulative_us': c} for name, (s, c) in imports],
+            }, indent=2))
+        else:
+            self.stdout.write(f"Median of {len(runs)} run(s), warm-up {'off' if options['no_warm_up'] else 'on'}:")
+            for name, value in phases.items():
+                self.stdout.write(f'  {name:<18} {value:9.1f} ms')
+            for name, value in runs[-1]['warm_up'].items():
+                self.stdout.write(f'    warm-up {name:<10} {value:9.1f} ms')
+            self.stdout.write(f'  {"cold start":<18} {cold_start:9.1f} ms' + (f' (budget {budget:.0f} ms)' if budget else ''))
+            self.stdout.write('Slowest imports (self time):')
+            for name, (self_us, cumulative_us) in imports:
+                self.stdout.write(f'  {self_us / 1000:7.1f} ms {cumulative_us / 1000:8.1f} ms cumulative  {name}')
+
+        if budget and cold_start > budget:
+            raise CommandError(f'Cold start took {cold_start:.0f} ms, over the {budget:.0f} ms budget')
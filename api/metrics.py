@@ -0,0 +1,156 @@
+"""
+In-process counters and histograms for the conversion engine.
+
+Series are keyed by name and a sorted tuple of label pairs, and are kept per
+process. Recording one is a dict lookup and a bisect under a lock; the text
+exposition is only built when /api/metrics/ is scraped. engine_stats exposes
+the counters as a snapshot.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+NAMESPACE = 'visual_coder'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}  # key -> [buckets, bucket counts, sum, count]
+
+
+def inc(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Record value in the histogram name; buckets are fixed by the first observation."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [buckets, [0] * (len(buckets) + 1), 0, 0]
+        histogram[1][bisect_left(histogram[0], value)] += 1
+        histogram[2] += value
+        histogram[3] += 1
+
+
+def snapshot():
+    """Return {name: [{'labels': {...}, 'value': n}, ...]} of every counter."""
+    with _lock:
+        items = sorted(_counters.items())
+    result = {}
+    for (name, labels), value in items:
+        result.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+    return result
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def render(gauges=None):
+    """
+    The Prometheus text exposition of every series. gauges is an optional
+    {name: value} of point-in-time values added to the output.
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (h[0], list(h[1]), h[2], h[3])) for key, h in _histograms.items())
+
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        full_name = f'{NAMESPACE}_{name}'
+        if full_name not in seen:
+            seen.add(full_name)
+            lines.append(f'# TYPE {full_name} counter')
+        lines.append(f'{full_name}{_labels(labels)} {value}')
+
+    for (name, labels), (buckets, counts, total, count) in histograms:
+        full_name = f'{NAMESPACE}_{name}'
+        if full_name not in seen:
+            seen.add(full_name)
+            lines.append(f'# TYPE {full_name} histogram')
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{full_name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+        lines.append(f'{full_name}_bucket{_labels(labels + (("le", "+Inf"),))} {count}')
+        lines.append(f'{full_name}_sum{_labels(labels)} {total}')
+        lines.append(f'{full_name}_count{_labels(labels)} {count}')
+
+    for name, value in sorted((gauges or {}).items()):
+        full_name = f'{NAMESPACE}_{name}'
+        lines.append(f'# TYPE {full_name} gauge')
+        lines.append(f'{full_name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTimer:
+    """
+    Times the phases of one conversion request. finish() adds them to the
+    response as a Server-Timing header and records them, with the request's
+    total time and status, in the histograms and counters.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.phases = []
+        self.notes = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def note(self, name, description):
+        """A Server-Timing entry without a duration, e.g. cache;desc=hit."""
+        self.notes.append(f'{name};desc="{description}"')
+
+    def header(self):
+        entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.phases]
+        entries.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.2f}')
+        return ', '.join(entries + self.notes)
+
+    def error(self, exc):
+        inc('errors_total', endpoint=self.endpoint, type=type(exc).__name__)
+
+    def finish(self, response):
+        """
+        Add the Server-Timing header and record the request. A streamed body
+        is only produced while it is sent, so then the request is recorded,
+        with a 'stream' phase, once the last chunk is out (or the client left).
+        """
+        response['Server-Timing'] = self.header()
+        if response.streaming and not response.is_async:
+            response.streaming_content = self._record_when_sent(response.streaming_content, response.status_code)
+        else:
+            self._record(response.status_code)
+        return response
+
+    def _record_when_sent(self, chunks, status):
+        start = time.perf_counter()
+        try:
+            yield from chunks
+        finally:
+            self.phases.append(('stream', time.perf_counter() - start))
+            self._record(status)
+
+    def _record(self, status):
+        for name, seconds in self.phases:
+            observe('phase_seconds', seconds, endpoint=self.endpoint, phase=name)
+        observe('request_seconds', time.perf_counter() - self.started, endpoint=self.endpoint)
+        inc('requests_total', endpoint=self.endpoint, status=status)
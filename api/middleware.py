@@ -0,0 +1,39 @@
+"""
+Middleware that works in both the sync and the async request path.
+
+Django runs a sync-only middleware under ASGI by adapting the rest of the
+chain through one thread-sensitive executor, which serializes every request
+that passes it. The async views hand their conversions to a bounded executor
+and answer 503 when it is saturated; behind a sync-only middleware no two of
+them would ever be in flight together, so that backpressure never triggers.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise, serving static files without leaving the event loop for other requests."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Looks at the file system, so keep it off the loop
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:54
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('source', 'Source'), ('graph', 'Graph')], max_length=8)),
+                ('size', models.PositiveIntegerField()),
+                ('content', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Project',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('owner', models.CharField(max_length=128)),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Revision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('graph', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.blob')),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.revision')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='api.project')),
+                ('source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.blob')),
+            ],
+            options={
+                'ordering': ['project', 'number'],
+            },
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='head',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.revision'),
+        ),
+        migrations.AddConstraint(
+            model_name='revision',
+            constraint=models.UniqueConstraint(fields=('project', 'number'), name='revision_project_number'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['owner', '-updated_at'], name='project_owner_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['-updated_at'], name='project_updated'),
+        ),
+    ]
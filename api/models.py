@@ -1,3 +1,64 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class Blob(models.Model):
+    """
+    Content-addressed storage: a zlib-compressed source or flowchart keyed by
+    the sha256 of its uncompressed bytes, so identical content is stored once
+    no matter how many revisions refer to it.
+    """
+    SOURCE = 'source'
+    GRAPH = 'graph'
+    KIND_CHOICES = [(SOURCE, 'Source'), (GRAPH, 'Graph')]
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    size = models.PositiveIntegerField()
+    content = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.digest[:12]}"
+
+
+class Project(models.Model):
+    """
+    A saved diagram. owner is an opaque client id; head points at the
+    latest revision, so a project loads with one joined, indexed query.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.CharField(max_length=128)
+    name = models.CharField(max_length=200, blank=True)
+    head = models.ForeignKey('Revision', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-updated_at'], name='project_owner_updated'),
+            models.Index(fields=['-updated_at'], name='project_updated'),
+        ]
+
+    def __str__(self):
+        return self.name or str(self.id)
+
+
+class Revision(models.Model):
+    """One saved state of a project: its source and flowchart blobs."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField()
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    source = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name='+')
+    graph = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'number'], name='revision_project_number'),
+        ]
+        ordering = ['project', 'number']
+
+    def __str__(self):
+        return f"{self.project_id} r{self.number}"
@@ -0,0 +1,69 @@
+"""
+Bounded off-loop execution of conversion work for the async views.
+
+Conversions are CPU-bound, so the async views hand them to a fixed-size
+thread pool instead of running them on the event loop. At most
+``max_workers + max_queue`` conversions may be in flight; past that the
+caller gets ``Saturated`` straight away, so an overloaded server answers
+503 instead of letting latency grow without bound.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class Saturated(Exception):
+    pass
+
+
+class BoundedExecutor:
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        # Created on first use so forked workers do not inherit a dead pool
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='flowchart')
+        return self._executor
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise Saturated()
+            self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+
+executor = BoundedExecutor(
+    getattr(settings, 'FLOWCHART_ASYNC_WORKERS', None) or os.cpu_count() or 1,
+    getattr(settings, 'FLOWCHART_ASYNC_QUEUE', 64),
+)
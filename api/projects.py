@@ -0,0 +1,167 @@
+"""
+Saving and loading projects.
+
+Sources and flowcharts are stored as content-addressed blobs: the graph is
+serialized canonically (sorted keys, compact separators), hashed, and only
+inserted if no blob with that digest exists yet. A save after the first one
+sends a patch against the revision it was based on, in the same shape as the
+flowchart session deltas; the server applies it to the stored graph. If the
+base is no longer the head, the save is refused with a conflict.
+"""
+import hashlib
+import json
+import zlib
+
+from django.db import IntegrityError, transaction
+
+from .models import Blob, Project, Revision
+
+
+class SaveError(ValueError):
+    pass
+
+
+class Conflict(SaveError):
+    """The save was based on a revision that is no longer the project's head."""
+
+
+def canonical_graph(nodes, edges):
+    return json.dumps({'nodes': nodes, 'edges': edges}, sort_keys=True, separators=(',', ':')).encode('utf8')
+
+
+def store_blob(kind, data):
+    """Store data (bytes) once under its sha256 and return the Blob."""
+    digest = hashlib.sha256(data).hexdigest()
+    blob, _ = Blob.objects.get_or_create(
+        digest=digest,
+        defaults={'kind': kind, 'size': len(data), 'content': zlib.compress(data)},
+    )
+    return blob
+
+
+def read_blob(blob):
+    return zlib.decompress(bytes(blob.content))
+
+
+def read_graph(blob):
+    data = json.loads(read_blob(blob))
+    return data['nodes'], data['edges']
+
+
+def _item_id(item_id, kind):
+    if not isinstance(item_id, (str, int)) or isinstance(item_id, bool) or item_id == '':
+        raise SaveError(f"Every {kind[:-1]} needs a string or integer id")
+    return item_id
+
+
+def _patch_items(items, patch, kind):
+    """Apply {'added', 'updated', 'removed'} to a list of dicts with 'id', keeping order."""
+    if not patch:
+        return items
+    if not isinstance(patch, dict):
+        raise SaveError(f"'{kind}' patch must be an object")
+    for part in ('removed', 'updated', 'added'):
+        if not isinstance(patch.get(part, []), list):
+            raise SaveError(f"'{kind}.{part}' must be a list")
+    by_id = {item['id']: item for item in items}
+    for item_id in patch.get('removed', []):
+        if by_id.pop(_item_id(item_id, kind), None) is None:
+            raise SaveError(f"Cannot remove unknown {kind[:-1]} {item_id}")
+    for item in patch.get('updated', []):
+        if not isinstance(item, dict):
+            raise SaveError(f"Every updated {kind[:-1]} must be an object")
+        if _item_id(item.get('id'), kind) not in by_id:
+            raise SaveError(f"Cannot update unknown {kind[:-1]} {item['id']}")
+        by_id[item['id']] = item
+    for item in patch.get('added', []):
+        if not isinstance(item, dict):
+            raise SaveError(f"Every added {kind[:-1]} must be an object")
+        if _item_id(item.get('id'), kind) in by_id:
+            raise SaveError(f"Cannot add existing {kind[:-1]} {item['id']}")
+        by_id[item['id']] = item
+    return list(by_id.values())
+
+
+def validate_graph(nodes, edges):
+    """Check a whole graph before it is stored: unique ids, and no edge to a missing node."""
+    if not isinstance(nodes, list) or not isinstance(edges, list):
+        raise SaveError("'nodes' and 'edges' must be lists")
+    node_ids = set()
+    for kind, items in (('nodes', nodes), ('edges', edges)):
+        seen = node_ids if kind == 'nodes' else set()
+        for item in items:
+            if not isinstance(item, dict):
+                raise SaveError(f"Every {kind[:-1]} must be an object")
+            item_id = _item_id(item.get('id'), kind)
+            if item_id in seen:
+                raise SaveError(f"Duplicate {kind[:-1]} id {item_id}")
+            seen.add(item_id)
+    for edge in edges:
+        ends = (edge.get('source'), edge.get('target'))
+        if not all(isinstance(end, (str, int)) and end in node_ids for end in ends):
+            raise SaveError(f"Edge {edge['id']} points to a missing node")
+
+
+def apply_patch(nodes, edges, patch):
+    """Return the nodes and edges after a {'nodes': {...}, 'edges': {...}} patch."""
+    nodes = _patch_items(nodes, patch.get('nodes'), 'nodes')
+    edges = _patch_items(edges, patch.get('edges'), 'edges')
+    return nodes, edges
+
+
+def create_project(owner, name, nodes, edges, source=None):
+    with transaction.atomic():
+        project = Project.objects.create(owner=owner, name=name)
+        _add_revision(project, None, nodes, edges if edges is not None else [], source)
+    return project
+
+
+def save_revision(project_id, base_number, patch=None, nodes=None, edges=None, source=None):
+    """
+    Save a new revision of a project from a patch against revision base_number
+    (or from a full nodes/edges graph). Returns the project, whose head is the
+    new revision, or the unchanged one if nothing changed.
+    """
+    with transaction.atomic():
+        project = Project.objects.select_for_update(of=('self',)).select_related('head__graph', 'head__source').get(pk=project_id)
+        head = project.head
+        if head is None or head.number != base_number:
+            raise Conflict(f"Revision {base_number} is not the latest, reload the project")
+        if nodes is None:
+            nodes, edges = apply_patch(*read_graph(head.graph), patch or {})
+        _add_revision(project, head, nodes, edges if edges is not None else [], source)
+    return project
+
+
+def _add_revision(project, head, nodes, edges, source):
+    # Every save path ends here, so a stored graph is always one a patch can apply to
+    validate_graph(nodes, edges)
+    if source is not None and not isinstance(source, str):
+        raise SaveError("'code' must be a string")
+    graph = store_blob(Blob.GRAPH, canonical_graph(nodes, edges))
+    if source is not None:
+        source_blob = store_blob(Blob.SOURCE, source.encode('utf8'))
+    else:
+        source_blob = head.source if head else None
+    if head and head.graph_id == graph.digest and head.source_id == (source_blob and source_blob.digest):
+        return head
+    try:
+        with transaction.atomic():
+            revision = Revision.objects.create(
+                project=project,
+                number=head.number + 1 if head else 1,
+                parent=head,
+                source=source_blob,
+                graph=graph,
+            )
+    except IntegrityError:
+        # select_for_update does not lock on SQLite, so a concurrent save of the same base can win the race
+        raise Conflict(f"Revision {head.number if head else 0} is not the latest, reload the project")
+    project.head = revision
+    project.save(update_fields=['head', 'updated_at'])
+    return revision
+
+
+def load_project(project_id):
+    """The project with its head revision and both blobs, in one query."""
+    return Project.objects.select_related('head__graph', 'head__source').get(pk=project_id)
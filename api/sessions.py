@@ -0,0 +1,226 @@
+"""
+Incremental re-parse sessions for the code-to-flowchart editor.
+
+A session keeps the last source, tree-sitter ``Tree`` and flowchart of one
+editor. Text edits are applied with ``Tree.edit`` and the source is re-parsed
+against the old tree, so tree-sitter only re-does the parts that changed. The
+new flowchart is then matched against the previous one so that unchanged nodes
+keep their ids, and only the difference is sent back to the client.
+
+CodeSession is the other direction: it holds an engine.editing.CodeDocument
+that flowchart patches are applied to, and hands back a diff of the code.
+
+Sessions live in process memory, so with several workers a client may land on
+a worker that does not know its session; it then has to start a new one.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from django.conf import settings
+
+
+class EditError(ValueError):
+    pass
+
+
+def byte_to_point(source, offset):
+    """Convert a byte offset in ``source`` to a tree-sitter (row, column) point."""
+    row = source.count(b'\n', 0, offset)
+    line_start = source.rfind(b'\n', 0, offset) + 1
+    return (row, offset - line_start)
+
+
+class FlowchartSession:
+    def __init__(self, session_id):
+        self.id = session_id
+        self.lock = threading.Lock()
+        self.version = 0
+        self.source = b''
+        self.tree = None
+        self.nodes = []
+        self.edges = []
+        self.next_id = 1
+
+    def apply_edits(self, edits):
+        """
+        Apply text edits to the session source and the old tree.
+        Each edit is {'start_byte', 'old_end_byte', 'text'}, with offsets into
+        the source as it is after the previous edits of the same list. The
+        whole list is checked before the tree is touched, so a bad edit
+        leaves the session as it was.
+        """
+        if not isinstance(edits, list):
+            raise EditError("'edits' must be a list")
+        source = self.source
+        tree_edits = []
+        for edit in edits:
+            if not isinstance(edit, dict):
+                raise EditError('Each edit must be an object')
+            start = edit.get('start_byte')
+            old_end = edit.get('old_end_byte')
+            if any(not isinstance(value, int) or isinstance(value, bool) for value in (start, old_end)):
+                raise EditError('Each edit needs integer start_byte and old_end_byte')
+            if not 0 <= start <= old_end <= len(source):
+                raise EditError(f'Edit range {start}-{old_end} is outside the source')
+            text = edit.get('text', '')
+            if not isinstance(text, str):
+                raise EditError("An edit's text must be a string")
+
+            new_text = text.encode('utf8')
+            new_source = source[:start] + new_text + source[old_end:]
+            new_end = start + len(new_text)
+            tree_edits.append({
+                'start_byte': start,
+                'old_end_byte': old_end,
+                'new_end_byte': new_end,
+                'start_point': byte_to_point(source, start),
+                'old_end_point': byte_to_point(source, old_end),
+                'new_end_point': byte_to_point(new_source, new_end),
+            })
+            source = new_source
+
+        if self.tree is not None:
+            for tree_edit in tree_edits:
+                self.tree.edit(**tree_edit)
+        self.source = source
+
+    def _allocate_id(self):
+        node_id = f"node-{self.next_id}"
+        self.next_id += 1
+        return node_id
+
+    @staticmethod
+    def _links(edges):
+        """node id -> sorted (source, target, label) of the edges into and out of it."""
+        links = {}
+        for edge in edges:
+            key = (edge['source'], edge['target'], edge['label'])
+            links.setdefault(edge['source'], []).append(key)
+            links.setdefault(edge['target'], []).append(key)
+        return {node_id: sorted(keys) for node_id, keys in links.items()}
+
+    def update(self, tree, nodes, edges):
+        """
+        Store a freshly built flowchart and return what changed since the last one.
+        Nodes of the new flowchart are matched to the old ones by (type, label)
+        order, so that matched nodes keep the ids the client already has. A
+        matched node is reported as updated when its type, data or edges
+        changed; one that only moved (e.g. pushed down by an inserted
+        statement) is sent as an {id: position} entry of 'moved'.
+        """
+        old_nodes = {node['id']: node for node in self.nodes}
+        old_edges = {(e['source'], e['target'], e['label']): e for e in self.edges}
+
+        signature = lambda node: (node['type'], node['data'].get('label', ''))
+        matcher = SequenceMatcher(
+            None, [signature(n) for n in self.nodes], [signature(n) for n in nodes], autojunk=False
+        )
+        id_map = {}
+        for old_start, new_start, size in matcher.get_matching_blocks():
+            for offset in range(size):
+                id_map[nodes[new_start + offset]['id']] = self.nodes[old_start + offset]['id']
+        for node in nodes:
+            if node['id'] not in id_map:
+                id_map[node['id']] = self._allocate_id()
+
+        # A node whose edges change is updated too; one that only moved just gets its new position
+        old_links = self._links(self.edges)
+        new_links = self._links(
+            {**edge, 'source': id_map[edge['source']], 'target': id_map[edge['target']]} for edge in edges
+        )
+
+        new_nodes = []
+        added_nodes = []
+        updated_nodes = []
+        moved_nodes = {}
+        for node in nodes:
+            node = {**node, 'id': id_map[node['id']]}
+            new_nodes.append(node)
+            previous = old_nodes.pop(node['id'], None)
+            if previous is None:
+                added_nodes.append(node)
+            elif (previous['type'] != node['type'] or previous['data'] != node['data']
+                  or old_links.get(node['id']) != new_links.get(node['id'])):
+                updated_nodes.append(node)
+            elif previous['position'] != node['position']:
+                moved_nodes[node['id']] = node['position']
+
+        new_edges = []
+        added_edges = []
+        for edge in edges:
+            key = (id_map[edge['source']], id_map[edge['target']], edge['label'])
+            previous = old_edges.pop(key, None)
+            if previous is None:
+                edge = {
+                    **edge,
+                    'id': f"e-{key[0]}-{key[1]}-{key[2]}-{self._allocate_id()}",
+                    'source': key[0],
+                    'target': key[1],
+                }
+                added_edges.append(edge)
+            else:
+                edge = previous
+            new_edges.append(edge)
+
+        self.tree = tree
+        self.nodes = new_nodes
+        self.edges = new_edges
+        self.version += 1
+        return {
+            'nodes': {
+                'added': added_nodes,
+                'updated': updated_nodes,
+                'moved': moved_nodes,
+                'removed': list(old_nodes),
+            },
+            'edges': {
+                'added': added_edges,
+                'removed': [edge['id'] for edge in old_edges.values()],
+            },
+        }
+
+
+class CodeSession:
+    def __init__(self, session_id):
+        self.id = session_id
+        self.lock = threading.Lock()
+        self.document = None
+
+    @property
+    def version(self):
+        return self.document.version if self.document else 0
+
+
+class SessionStore:
+    """Bounded, thread-safe LRU of editor sessions."""
+
+    def __init__(self, max_sessions=256, session_class=FlowchartSession):
+        self.max_sessions = max_sessions
+        self.session_class = session_class
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self):
+        session = self.session_class(uuid.uuid4().hex)
+        with self._lock:
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+store = SessionStore(getattr(settings, 'FLOWCHART_MAX_SESSIONS', 256))
+code_store = SessionStore(getattr(settings, 'FLOWCHART_MAX_SESSIONS', 256), CodeSession)
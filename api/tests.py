@@ -1,3 +1,1212 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import importlib
+import io
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.conf import global_settings, settings
+from django.core.management import CommandError, call_command
+from django.http import JsonResponse
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, override_settings
+
+from engine import UNLIMITED, LimitExceeded, Limits, UnstructuredFlowchart, code_to_flowchart, flowchart_to_code
+from engine.editing import CodeDocument
+from engine.flowchart import FlowchartBuilder, _Template
+from engine.limits import parse as parse_source
+from engine.parser_pool import pool as parser_pool
+from engine.wire import COMPACT_CONTENT_TYPE, to_columnar
+
+from . import batch, metrics, projects, views
+from .apps import warm_up_server
+from .cache import ResultCache
+from .models import Blob, Project, Revision
+from .offload import BoundedExecutor
+from .sessions import EditError, FlowchartSession
+
+
+def sample_program(statements):
+    body = ''.join(f'    int v{i} = {i};\n    if (v{i} > 1) {{ printf("{i}"); }}\n' for i in range(statements))
+    return f'int main() {{\n{body}    return 0;\n}}\n'
+
+
+class ConcurrentFlowchartTests(SimpleTestCase):
+    def convert(self, code):
+        response = Client().post(
+            '/api/generate-flowchart/', json.dumps({'code': code}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_ids_stay_unique_under_concurrent_requests(self):
+        # Every request gets a different program so none is served from the result cache
+        programs = [sample_program(5 + i % 20) + f'/* {i} */' for i in range(64)]
+        expected = [self.convert(sample_program(5 + i)) for i in range(20)]
+
+        # Switch threads as often as possible so conversions really interleave
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                results = list(executor.map(self.convert, programs))
+        finally:
+            sys.setswitchinterval(interval)
+
+        for result in results:
+            node_ids = [node['id'] for node in result['nodes']]
+            edge_ids = [edge['id'] for edge in result['edges']]
+            self.assertEqual(len(node_ids), len(set(node_ids)))
+            self.assertEqual(len(edge_ids), len(set(edge_ids)))
+            self.assertTrue(set(node_ids).isdisjoint(edge_ids))
+            for edge in result['edges']:
+                self.assertIn(edge['source'], node_ids)
+                self.assertIn(edge['target'], node_ids)
+        self.assertEqual(results[:20], expected)
+
+    def test_interleaved_conversions_share_no_state(self):
+        sources = [sample_program(4).encode(), sample_program(7).encode()]
+        with parser_pool.checkout() as parser:
+            trees = [parser.parse(source) for source in sources]
+        expected = [FlowchartBuilder(source).build(tree.root_node) for source, tree in zip(sources, trees)]
+
+        # Step two walks in turn on one thread; each must still number its nodes from node-1
+        walks = [FlowchartBuilder(source).events(tree.root_node) for source, tree in zip(sources, trees)]
+        events = [[], []]
+        for steps in itertools.zip_longest(*walks):
+            for i, step in enumerate(steps):
+                if step is not None:
+                    events[i].append(step)
+        for (nodes, edges), walked in zip(expected, events):
+            self.assertEqual([item for kind, item in walked if kind == 'node'], nodes)
+            self.assertEqual([item for kind, item in walked if kind == 'edge'], edges)
+            self.assertEqual(nodes[0]['id'], 'node-1')
+
+
+class AsyncBackpressureTests(SimpleTestCase):
+    def test_saturated_executor_answers_503(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=0)
+        release = threading.Event()
+
+        def slow_response(body, wire_format, limits):
+            release.wait(timeout=10)
+            return JsonResponse({'status': 'success'})
+
+        async def post():
+            response = await AsyncClient().post(
+                '/api/async/generate-flowchart/', {'code': 'int main() { return 0; }'},
+                content_type='application/json',
+            )
+            return response.status_code
+
+        async def release_when_rejected():
+            # Requests only reach the executor together if nothing in the middleware serializes them
+            for _ in range(500):
+                if executor.stats()['rejected'] >= 3:
+                    break
+                await asyncio.sleep(0.01)
+            release.set()
+
+        async def run():
+            *statuses, _ = await asyncio.gather(*(post() for _ in range(4)), release_when_rejected())
+            return statuses
+
+        busy = counter('requests_total', endpoint='generate_flowchart', status=503)
+        with mock.patch('api.views.executor', executor), mock.patch('api.views.flowchart_response', slow_response):
+            statuses = asyncio.run(run())
+
+        self.assertEqual(sorted(statuses), [200, 503, 503, 503])
+        self.assertEqual(executor.stats()['rejected'], 3)
+        self.assertEqual(counter('requests_total', endpoint='generate_flowchart', status=503), busy + 3)
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        views.flowchart_cache.clear()
+
+    def post(self, code, **options):
+        return Client().post('/api/generate-flowchart/', json.dumps({'code': code, **options}),
+                             content_type='application/json')
+
+    def test_repeated_source_is_served_from_the_cache(self):
+        code = sample_program(3)
+        before = views.flowchart_cache.stats()
+        first = self.post(code)
+        # Surrounding whitespace does not change the flowchart, so it is the same entry
+        second = self.post(f'\n\n{code}   \n')
+        self.assertEqual(second.content, first.content)
+        self.assertNotIn('cache;desc="hit"', first['Server-Timing'])
+        self.assertIn('cache;desc="hit"', second['Server-Timing'])
+
+        stats = views.flowchart_cache.stats()
+        self.assertEqual(stats['hits'] - before['hits'], 1)
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], len(first.content))
+
+    def test_options_are_part_of_the_key(self):
+        code = sample_program(3)
+        default = self.post(code)
+        layered = self.post(code, layout='layered')
+        blocks = self.post(code, basic_blocks=True)
+        for response in (layered, blocks):
+            self.assertNotIn('cache;desc="hit"', response['Server-Timing'])
+            self.assertNotEqual(response.content, default.content)
+        self.assertEqual(views.flowchart_cache.stats()['entries'], 3)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ResultCache('test', '1', max_entries=2)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        self.assertEqual(cache.get('a'), b'1')
+        cache.set('c', b'3')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1')
+        self.assertEqual(cache.get('c'), b'3')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_size_is_bounded_in_bytes(self):
+        cache = ResultCache('test', '1', max_bytes=10)
+        cache.set('big', b'x' * 11)
+        self.assertIsNone(cache.get('big'))
+        cache.set('a', b'x' * 6)
+        cache.set('b', b'x' * 6)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), b'x' * 6)
+        self.assertEqual(cache.stats()['bytes'], 6)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'result-cache-tests'},
+    })
+    def test_shared_tier_fills_other_processes(self):
+        writer = ResultCache('test', '1', alias='shared')
+        reader = ResultCache('test', '1', alias='shared')
+        key = writer.key('source')
+        writer.set(key, b'content')
+        self.assertEqual(reader.get(key), b'content')
+        self.assertEqual(reader.get(key), b'content')
+        self.assertEqual(reader.stats()['shared_hits'], 1)
+        self.assertEqual(reader.stats()['hits'], 1)
+
+
+class CacheKeyTests(SimpleTestCase):
+    def setUp(self):
+        for cache in (views.flowchart_cache, views.function_cache, views.source_cache):
+            cache.clear()
+
+    def post(self, path, data):
+        response = Client().post(path, json.dumps(data), content_type='application/json')
+        return response.status_code, json.loads(response.content)
+
+    def test_parts_are_kept_apart(self):
+        cache = ResultCache('test', '1')
+        self.assertNotEqual(cache.key('a\0b', 'c'), cache.key('a', 'b\0c'))
+        self.assertNotEqual(cache.key('ab', 'c'), cache.key('a', 'bc'))
+        self.assertNotEqual(cache.key('a'), ResultCache('test', '2').key('a'))
+        self.assertEqual(cache.key('a', 'b'), cache.key('a', 'b'))
+
+    def test_flowchart_request_cannot_poison_function_graphs(self):
+        code = 'int helper(int x) {\n    return x + 1;\n}\nint main() {\n    int a = helper(2);\n    return a;\n}\n'
+        status, outline = self.post('/api/generate-flowchart/', {'code': code, 'outline': True})
+        self.assertEqual(status, 200)
+        source_id = outline['source_id']
+
+        # A code string that spells out the parts of a function key
+        status, poison = self.post('/api/generate-flowchart/', {'code': f'{source_id}\0main'})
+        self.assertEqual(status, 200)
+
+        status, function = self.post('/api/generate-flowchart/function/', {'source_id': source_id, 'function': 'main'})
+        self.assertEqual(status, 200)
+        self.assertNotEqual(function['nodes'], poison['nodes'])
+        self.assertTrue(any('helper(2)' in node['data']['label'] for node in function['nodes']))
+
+
+class OutlineTests(SimpleTestCase):
+    code = (
+        '#include <stdio.h>\n'
+        'static int *first(int *p) {\n    return p;\n}\n'
+        '#ifdef FEATURE\n'
+        'int (*second(void))(int) {\n    if (x) { y(); }\n    return 0;\n}\n'
+        '#endif\n'
+        'int main() {\n    int a = first(0) != 0;\n    return a;\n}\n'
+    )
+
+    def setUp(self):
+        for cache in (views.flowchart_cache, views.function_cache, views.source_cache):
+            cache.clear()
+
+    def post(self, path, data):
+        response = Client().post(path, json.dumps(data), content_type='application/json')
+        return response, json.loads(response.content)
+
+    def test_outline_lists_every_function(self):
+        response, outline = self.post('/api/generate-flowchart/', {'code': self.code, 'outline': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(outline['source_id'], hashlib.sha256(self.code.encode()).hexdigest())
+        self.assertEqual([function['name'] for function in outline['functions']], ['first', 'second', 'main'])
+        source = self.code.encode()
+        for function in outline['functions']:
+            text = source[function['start_byte']:function['end_byte']]
+            self.assertTrue(text.endswith(b'}'))
+            self.assertIn(function['name'].encode() + b'(', text)
+            self.assertEqual(function['size'], len(text))
+            self.assertEqual(self.code.splitlines()[function['start_line'] - 1].encode(), text.splitlines()[0])
+
+    def test_function_graph_matches_a_full_conversion(self):
+        _, outline = self.post('/api/generate-flowchart/', {'code': self.code, 'outline': True})
+        for name in ('first', 'second', 'main'):
+            response, graph = self.post('/api/generate-flowchart/function/',
+                                        {'source_id': outline['source_id'], 'function': name})
+            self.assertEqual(response.status_code, 200)
+            nodes, edges = code_to_flowchart(self.code, function=name)
+            self.assertEqual((graph['nodes'], graph['edges']), (nodes, edges))
+
+        # Sending the code instead of the source_id gives the same, now cached, graph
+        response, graph = self.post('/api/generate-flowchart/function/', {'code': self.code, 'function': 'second'})
+        self.assertIn('cache;desc="hit"', response['Server-Timing'])
+        self.assertEqual(graph['nodes'], code_to_flowchart(self.code, function='second')[0])
+
+    def test_function_request_errors(self):
+        _, outline = self.post('/api/generate-flowchart/', {'code': self.code, 'outline': True})
+        source_id = outline['source_id']
+        for data, status in (
+            ({'source_id': source_id}, 400),
+            ({'source_id': source_id, 'function': ''}, 400),
+            ({'source_id': source_id, 'function': 'main', 'layout': 'circular'}, 400),
+            ({'source_id': source_id, 'function': 'missing'}, 404),
+            ({'code': self.code, 'function': 'missing'}, 404),
+            ({'source_id': '0' * 64, 'function': 'main'}, 404),
+            ({'source_id': 7, 'function': 'main'}, 404),
+        ):
+            response, error = self.post('/api/generate-flowchart/function/', data)
+            self.assertEqual(response.status_code, status, data)
+            self.assertEqual(error['status'], 'error')
+
+        response = Client().get('/api/generate-flowchart/function/')
+        self.assertEqual(response.status_code, 405)
+
+
+class LayeredLayoutTests(SimpleTestCase):
+    def convert(self, code, **options):
+        views.flowchart_cache.clear()
+        response = Client().post('/api/generate-flowchart/', json.dumps({'code': code, **options}),
+                                 content_type='application/json')
+        return response.status_code, json.loads(response.content)
+
+    def positions(self, graph):
+        return {node['id']: (node['position']['x'], node['position']['y']) for node in graph['nodes']}
+
+    def test_only_positions_change(self):
+        code = CompactRoundTripTests.program
+        _, default = self.convert(code)
+        status, layered = self.convert(code, layout='layered')
+        self.assertEqual(status, 200)
+        self.assertEqual(layered['edges'], default['edges'])
+        for node in default['nodes'] + layered['nodes']:
+            del node['position']
+        self.assertEqual(layered['nodes'], default['nodes'])
+
+    def test_nodes_never_overlap(self):
+        _, layered = self.convert(CompactRoundTripTests.program, layout='layered')
+        positions = self.positions(layered)
+        self.assertEqual(len(set(positions.values())), len(positions))
+
+    def test_edges_point_down_without_loops(self):
+        _, layered = self.convert(sample_program(6), layout='layered')
+        positions = self.positions(layered)
+        for edge in layered['edges']:
+            self.assertGreater(positions[edge['target']][1], positions[edge['source']][1], edge)
+
+    def test_branches_sit_side_by_side(self):
+        code = 'int main() {\n    if (a) { x(); } else { y(); }\n    return 0;\n}\n'
+        _, layered = self.convert(code, layout='layered')
+        positions = self.positions(layered)
+        decision = next(node['id'] for node in layered['nodes'] if node['type'] == 'decision')
+        (x1, y1), (x2, y2) = [positions[edge['target']] for edge in layered['edges'] if edge['source'] == decision]
+        self.assertEqual(y1, y2)
+        self.assertNotEqual(x1, x2)
+
+    def test_unknown_layout_is_a_400(self):
+        status, error = self.convert(sample_program(1), layout='circular')
+        self.assertEqual(status, 400)
+        self.assertEqual(error['message'], 'Unknown layout: circular')
+
+
+def from_columnar(data):
+    strings, columns = data['strings'], data['nodes']
+    ids = [f"{data['id_prefix']}{node_id}" for node_id in columns['id']]
+    nodes = [
+        {'id': node_id, 'type': strings[node_type], 'position': {'x': x, 'y': y}, 'data': {'label': strings[label]}}
+        for node_id, node_type, label, x, y in zip(ids, columns['type'], columns['label'], columns['x'], columns['y'])
+    ]
+    edges = [
+        {'source': ids[source], 'target': ids[target], 'label': strings[label], 'type': data['edge_type']}
+        for source, target, label in zip(data['edges']['source'], data['edges']['target'], data['edges']['label'])
+    ]
+    return nodes, edges
+
+
+class WireFormatTests(SimpleTestCase):
+    code = sample_program(8)
+
+    def setUp(self):
+        views.flowchart_cache.clear()
+
+    def post(self, path='/api/generate-flowchart/', **headers):
+        return Client().post(path, json.dumps({'code': self.code}), content_type='application/json',
+                             headers=headers)
+
+    def test_compact_format_carries_the_same_graph(self):
+        default = json.loads(self.post().content)
+        for response in (self.post('/api/generate-flowchart/?format=compact'),
+                         self.post(accept=COMPACT_CONTENT_TYPE)):
+            self.assertEqual(response['Content-Type'], COMPACT_CONTENT_TYPE)
+            compact = json.loads(response.content)
+            self.assertEqual(compact['format'], 'compact')
+            self.assertEqual(compact['id_prefix'], 'node-')
+            nodes, edges = from_columnar(compact)
+            self.assertEqual(nodes, default['nodes'])
+            self.assertEqual(edges, [{key: edge[key] for key in ('source', 'target', 'label', 'type')}
+                                     for edge in default['edges']])
+            self.assertLess(len(response.content), len(json.dumps(default)) / 2)
+
+    def test_compact_responses_are_gzipped_on_request(self):
+        plain = self.post('/api/generate-flowchart/?format=compact')
+        zipped = self.post('/api/generate-flowchart/?format=compact', accept_encoding='gzip')
+        self.assertEqual(zipped['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        self.assertEqual(gzip.decompress(zipped.content), plain.content)
+        self.assertFalse(self.post(accept_encoding='gzip').has_header('Content-Encoding'))
+
+    def test_other_node_ids_are_sent_as_strings(self):
+        nodes = [{'id': 'start', 'type': 'startEnd', 'position': {'x': 0, 'y': 0}, 'data': {'label': 'Start'}},
+                 {'id': 'node-2', 'type': 'startEnd', 'position': {'x': 0, 'y': 1}, 'data': {'label': 'End'}}]
+        edges = [{'id': 'e', 'source': 'start', 'target': 'node-2', 'label': '', 'type': 'smoothstep'}]
+        compact = to_columnar(nodes, edges)
+        self.assertEqual(compact['id_prefix'], '')
+        self.assertEqual(compact['nodes']['id'], ['start', 'node-2'])
+        self.assertEqual(compact['strings'], ['startEnd', 'Start', 'End', ''])
+        self.assertEqual(from_columnar(compact)[1], [{'source': 'start', 'target': 'node-2', 'label': '', 'type': 'smoothstep'}])
+        self.assertEqual(from_columnar(compact)[0], nodes)
+
+
+class BulkConversionTests(SimpleTestCase):
+    def setUp(self):
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+        self.inputs = os.path.join(self.root, 'src')
+        self.output = os.path.join(self.root, 'out')
+        self.write('main.c', sample_program(3))
+        self.write('lib/deep/util.c', 'int main() {\n    int x = 1;\n    return x;\n}\n')
+        self.write('lib/notes.txt', 'not C')
+        nodes, edges = code_to_flowchart(sample_program(2))
+        self.write('graphs/exported.json', json.dumps({'nodes': nodes, 'edges': edges}))
+
+    def write(self, relative, content):
+        path = os.path.join(self.inputs, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def read(self, relative):
+        with open(os.path.join(self.output, relative)) as f:
+            return f.read()
+
+    def run_engine(self, *args):
+        # The engine has to work on its own, without Django being imported
+        script = 'import sys; from engine.cli import main; code = main(sys.argv[1:]); ' \
+                 'assert "django" not in sys.modules; sys.exit(code)'
+        return subprocess.run([sys.executable, '-c', script, *args], capture_output=True, text=True,
+                              cwd=settings.BASE_DIR, timeout=60)
+
+    def test_tree_is_converted_both_ways(self):
+        manifest = os.path.join(self.root, 'manifest.jsonl')
+        result = self.run_engine(self.inputs, '-o', self.output, '-j', '2', '--manifest', manifest)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('3 file(s)', result.stdout)
+
+        self.assertEqual(json.loads(self.read('main.json'))['nodes'], code_to_flowchart(sample_program(3))[0])
+        self.assertIn('"nodes"', self.read('lib/deep/util.json'))
+        self.assertEqual(self.read('graphs/exported.c'), flowchart_to_code(*code_to_flowchart(sample_program(2))))
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'lib/notes.json')))
+        with open(manifest) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(sorted(record['input'] for record in records),
+                         ['graphs/exported.json', 'lib/deep/util.c', 'main.c'])
+        self.assertEqual({record['status'] for record in records}, {'success'})
+
+        result = self.run_engine(self.inputs, '-o', self.output, '-j', '1', '--skip-existing')
+        self.assertIn('3 skipped', result.stdout)
+
+    def test_failures_are_reported_per_file(self):
+        self.write('broken.json', '{not json')
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '2 file(s) could not be converted'):
+            call_command('convert_bulk', self.inputs, '-o', self.output, '-j', '1', '--max-nodes', '12',
+                         '--manifest', '-', stdout=out)
+        records = {record['input']: record for record in map(json.loads, out.getvalue().splitlines()[:-1])}
+        self.assertEqual(records['broken.json']['status'], 'error')
+        self.assertEqual(records['main.c']['error'], 'limit_exceeded')
+        self.assertEqual(records['lib/deep/util.c']['status'], 'success')
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'main.json')))
+
+
+class LimitTests(SimpleTestCase):
+    # The same block over and over, so copies are stamped out of a template
+    repeated = 'int main() {\n' + '    if (a > 1) { printf("a"); }\n' * 20 + '    return 0;\n}\n'
+
+    def setUp(self):
+        views.flowchart_cache.clear()
+
+    def post(self, path, data):
+        response = Client().post(path, json.dumps(data), content_type='application/json')
+        return response.status_code, json.loads(response.content)
+
+    def assertLimit(self, result, status, limit):
+        self.assertEqual(result[0], status, result[1])
+        self.assertEqual(result[1]['error'], 'limit_exceeded')
+        self.assertEqual(result[1]['limit'], limit)
+
+    @override_settings(FLOWCHART_MAX_BODY_BYTES=100)
+    def test_oversized_bodies_are_413s(self):
+        before = counter('limit_exceeded_total', limit='max_body_bytes')
+        code = sample_program(5)
+        self.assertLimit(self.post('/api/generate-flowchart/', {'code': code}), 413, 'max_body_bytes')
+        self.assertLimit(self.post('/api/generate-code-from-flowchart/', {'nodes': [{'id': code}], 'edges': []}),
+                         413, 'max_body_bytes')
+        self.assertEqual(counter('limit_exceeded_total', limit='max_body_bytes'), before + 2)
+
+    def test_node_budget_is_exact(self):
+        nodes, _ = code_to_flowchart(self.repeated)
+        with override_settings(FLOWCHART_MAX_NODES=len(nodes)):
+            status, _ = self.post('/api/generate-flowchart/', {'code': self.repeated})
+            self.assertEqual(status, 200)
+        views.flowchart_cache.clear()
+        with override_settings(FLOWCHART_MAX_NODES=len(nodes) - 1):
+            self.assertLimit(self.post('/api/generate-flowchart/', {'code': self.repeated}), 422, 'max_nodes')
+
+    def test_edge_budget(self):
+        _, edges = code_to_flowchart(self.repeated)
+        with self.assertRaises(LimitExceeded) as raised:
+            code_to_flowchart(self.repeated, limits=Limits(max_edges=len(edges) - 1))
+        self.assertEqual(raised.exception.limit, 'max_edges')
+
+    @override_settings(FLOWCHART_MAX_DEPTH=5)
+    def test_deep_nesting_is_a_422(self):
+        code = 'int main() {\n' + 'if (x) {\n' * 10 + 'y();\n' + '}\n' * 10 + '}\n'
+        self.assertLimit(self.post('/api/generate-flowchart/', {'code': code}), 422, 'max_depth')
+
+    def test_nesting_is_unbounded_without_a_depth_limit(self):
+        code = 'int main() {\n' + 'if (x) {\n' * 3000 + 'y();\n' + '}\n' * 3000 + '}\n'
+        nodes, edges = code_to_flowchart(code, limits=UNLIMITED)
+        self.assertEqual(sum(node['type'] == 'decision' for node in nodes), 3000)
+        self.assertEqual(flowchart_to_code(nodes, edges, UNLIMITED).count('if ((x))'), 3000)
+
+    @override_settings(FLOWCHART_MAX_NODES=3)
+    def test_oversized_flowcharts_are_413s(self):
+        nodes, edges = code_to_flowchart(sample_program(2))
+        self.assertLimit(self.post('/api/generate-code-from-flowchart/', {'nodes': nodes, 'edges': edges}),
+                         413, 'max_nodes')
+
+    def test_parse_gives_up_at_the_deadline(self):
+        source = sample_program(50).encode()
+        # Every clock reading is ten seconds after the last one
+        with mock.patch('engine.limits.time.monotonic', side_effect=itertools.count(0, 10)), \
+                parser_pool.checkout() as parser:
+            with self.assertRaises(LimitExceeded) as raised:
+                parse_source(parser, source, Limits(parse_timeout=1))
+        self.assertEqual(raised.exception.limit, 'parse_timeout')
+        self.assertEqual(raised.exception.status, 422)
+
+
+class FlowchartSessionTests(SimpleTestCase):
+    code = 'int main() {\n    int a = 1;\n    if (a > 0) {\n        printf("yes");\n    }\n    return 0;\n}\n'
+
+    def post(self, data):
+        response = Client().post('/api/flowchart-session/', json.dumps(data), content_type='application/json')
+        return response.status_code, json.loads(response.content)
+
+    def labels(self, nodes):
+        return sorted((node['type'], node['data']['label']) for node in nodes)
+
+    def test_edits_give_the_same_flowchart_as_a_full_conversion(self):
+        status, started = self.post({'code': self.code})
+        self.assertEqual(status, 200)
+        nodes = {node['id']: node for node in started['nodes']['added']}
+
+        source = self.code
+        start = source.index('"yes"')
+        edits = [
+            {'start_byte': start, 'old_end_byte': start + 5, 'text': '"no"'},
+            {'start_byte': 0, 'old_end_byte': 0, 'text': '// edited\n'},
+        ]
+        source = source[:start] + '"no"' + source[start + 5:]
+        source = '// edited\n' + source
+        status, delta = self.post({'session_id': started['session_id'], 'edits': edits})
+        self.assertEqual(status, 200)
+        self.assertEqual(delta['version'], 2)
+        self.assertEqual([node['data']['label'] for node in delta['nodes']['added']], ['printf("no");'])
+        for node_id in delta['nodes']['removed']:
+            del nodes[node_id]
+        nodes.update((node['id'], node) for node in delta['nodes']['added'] + delta['nodes']['updated'])
+
+        full = Client().post('/api/generate-flowchart/', json.dumps({'code': source}), content_type='application/json')
+        self.assertEqual(self.labels(nodes.values()), self.labels(json.loads(full.content)['nodes']))
+
+    def test_an_insertion_moves_the_nodes_below_it(self):
+        status, started = self.post({'code': self.code})
+        nodes = {node['id']: node for node in started['nodes']['added']}
+        start = self.code.index('    int a')
+        edit = {'start_byte': start, 'old_end_byte': start, 'text': '    printf("first");\n'}
+        status, delta = self.post({'session_id': started['session_id'], 'edits': [edit]})
+        self.assertEqual(status, 200)
+        self.assertEqual([node['data']['label'] for node in delta['nodes']['added']], ['printf("first");'])
+        # Everything below the new statement moved down, but only its neighbours got new edges
+        self.assertEqual(sorted(node['data']['label'] for node in delta['nodes']['updated']), ['Start', 'int a = 1;'])
+        self.assertEqual(len(delta['nodes']['moved']), len(nodes) - 2)
+        for node_id, position in delta['nodes']['moved'].items():
+            self.assertGreater(position['y'], nodes[node_id]['position']['y'])
+
+        # Applying the delta, positions included, gives the flowchart of the edited code
+        nodes.update((node['id'], node) for node in delta['nodes']['added'] + delta['nodes']['updated'])
+        for node_id, position in delta['nodes']['moved'].items():
+            nodes[node_id] = {**nodes[node_id], 'position': position}
+        source = self.code[:start] + edit['text'] + self.code[start:]
+        full, _ = code_to_flowchart(source)
+        placed = lambda nodes: sorted((n['type'], n['data']['label'], n['position']['x'], n['position']['y'])
+                                      for n in nodes)
+        self.assertEqual(placed(nodes.values()), placed(full))
+
+    def test_a_bad_edit_is_refused_and_drops_the_session(self):
+        for bad in (
+            [{'start_byte': 0, 'old_end_byte': 0, 'text': 5}],
+            [{'start_byte': 0, 'old_end_byte': 0, 'text': 'x'}, {'start_byte': '1', 'old_end_byte': 2}],
+            [{'start_byte': 0, 'old_end_byte': 10 ** 6, 'text': ''}],
+            ['not an edit'],
+            {'start_byte': 0},
+        ):
+            status, started = self.post({'code': self.code})
+            status, body = self.post({'session_id': started['session_id'], 'edits': bad})
+            self.assertEqual(status, 400, bad)
+            self.assertEqual(body['status'], 'error')
+            status, _ = self.post({'session_id': started['session_id'], 'edits': []})
+            self.assertEqual(status, 404)
+
+    def test_a_bad_edit_leaves_source_and_tree_untouched(self):
+        session = FlowchartSession('test')
+        session.source = self.code.encode('utf8')
+        with parser_pool.checkout() as parser:
+            session.tree = parser.parse(session.source)
+        before = str(session.tree.root_node)
+        with self.assertRaises(EditError):
+            session.apply_edits([
+                {'start_byte': 0, 'old_end_byte': 3, 'text': 'long'},
+                {'start_byte': 0, 'old_end_byte': 0, 'text': None},
+            ])
+        self.assertEqual(session.source, self.code.encode('utf8'))
+        self.assertEqual(session.tree.root_node.end_byte, len(session.source))
+        self.assertEqual(str(session.tree.root_node), before)
+
+
+class ProjectTests(TestCase):
+    nodes = [
+        {'id': 'n1', 'type': 'startEnd', 'data': {'label': 'Start'}},
+        {'id': 'n2', 'type': 'startEnd', 'data': {'label': 'End'}},
+    ]
+    edges = [{'id': 'e1', 'source': 'n1', 'target': 'n2'}]
+
+    def post(self, path, data):
+        response = Client().post(path, json.dumps(data), content_type='application/json')
+        return response.status_code, json.loads(response.content)
+
+    def create(self, **data):
+        return self.post('/api/projects/', {'owner': 'alice', 'name': 'demo', 'nodes': self.nodes,
+                                            'edges': self.edges, 'code': 'int main() {}', **data})
+
+    def save(self, project_id, data):
+        return self.post(f'/api/projects/{project_id}/revisions/', data)
+
+    def load(self, project_id):
+        response = Client().get(f'/api/projects/{project_id}/')
+        return response.status_code, json.loads(response.content)
+
+    def test_migrations_match_the_models(self):
+        call_command('makemigrations', 'api', '--check', '--dry-run', verbosity=0)
+
+    def test_requests_are_timed(self):
+        requests = (('projects', 201), ('projects', 200), ('project_detail', 200), ('project_revisions', 409))
+        before = [counter('requests_total', endpoint=endpoint, status=status) for endpoint, status in requests]
+        _, project = self.create()
+        self.load(project['id'])
+        self.save(project['id'], {'base_revision': 0, 'nodes': self.nodes, 'edges': self.edges})
+        response = Client().get('/api/projects/', {'owner': 'alice'})
+        self.assertIn('load;dur=', response['Server-Timing'])
+        for (endpoint, status), count in zip(requests, before):
+            self.assertEqual(counter('requests_total', endpoint=endpoint, status=status), count + 1, endpoint)
+
+        errors = counter('errors_total', endpoint='project_detail', type='RuntimeError')
+        with mock.patch('api.views.load_project', side_effect=RuntimeError('database is gone')):
+            status, _ = self.load(project['id'])
+        self.assertEqual(status, 500)
+        self.assertEqual(counter('errors_total', endpoint='project_detail', type='RuntimeError'), errors + 1)
+
+    def test_create_patch_and_load(self):
+        status, project = self.create()
+        self.assertEqual(status, 201)
+        self.assertEqual(project['revision'], 1)
+
+        patch = {
+            'nodes': {'added': [{'id': 'n3', 'type': 'process', 'data': {'label': 'x = 1;'}}]},
+            'edges': {'removed': ['e1'], 'added': [{'id': 'e2', 'source': 'n1', 'target': 'n3'},
+                                                   {'id': 'e3', 'source': 'n3', 'target': 'n2'}]},
+        }
+        status, saved = self.save(project['id'], {'base_revision': 1, 'patch': patch, 'code': 'int main() { x = 1; }'})
+        self.assertEqual(status, 200)
+        self.assertEqual(saved['revision'], 2)
+
+        status, loaded = self.load(project['id'])
+        self.assertEqual(status, 200)
+        self.assertEqual(loaded['code'], 'int main() { x = 1; }')
+        self.assertEqual([node['id'] for node in loaded['graph']['nodes']], ['n1', 'n2', 'n3'])
+        self.assertEqual([edge['id'] for edge in loaded['graph']['edges']], ['e2', 'e3'])
+        revisions = Revision.objects.filter(project_id=project['id'])
+        self.assertEqual([(r.number, r.parent and r.parent.number) for r in revisions], [(1, None), (2, 1)])
+
+        listed = json.loads(Client().get('/api/projects/?owner=alice').content)
+        self.assertEqual([p['id'] for p in listed['projects']], [project['id']])
+
+    def test_blobs_are_stored_once(self):
+        self.create()
+        self.create()
+        self.assertEqual(Blob.objects.filter(kind=Blob.GRAPH).count(), 1)
+        self.assertEqual(Blob.objects.filter(kind=Blob.SOURCE).count(), 1)
+
+    def test_unchanged_save_keeps_the_revision(self):
+        _, project = self.create()
+        status, saved = self.save(project['id'], {'base_revision': 1, 'nodes': self.nodes, 'edges': self.edges})
+        self.assertEqual(status, 200)
+        self.assertEqual(saved['revision'], 1)
+
+    def test_stale_base_is_a_conflict(self):
+        _, project = self.create()
+        self.save(project['id'], {'base_revision': 1, 'patch': {'nodes': {'removed': []}}, 'code': 'int main() { }'})
+        status, _ = self.save(project['id'], {'base_revision': 1, 'patch': {}, 'code': 'void f() {}'})
+        self.assertEqual(status, 409)
+
+    def test_concurrent_saves_of_the_same_base_conflict(self):
+        _, project = self.create()
+        competing = {'base_revision': 1, 'nodes': self.nodes[:1], 'edges': []}
+        validate = projects.validate_graph
+
+        def save_in_between(nodes, edges):
+            # Another save of revision 1 commits after this one read the head but before it inserts
+            validate(nodes, edges)
+            if nodes != competing['nodes']:
+                with mock.patch('api.projects.validate_graph', validate):
+                    self.assertEqual(self.save(project['id'], competing)[0], 200)
+
+        with mock.patch('api.projects.validate_graph', save_in_between):
+            status, body = self.save(project['id'], {'base_revision': 1, 'nodes': self.nodes, 'edges': []})
+        self.assertEqual(status, 409, body)
+        self.assertEqual(body['message'], 'Revision 1 is not the latest, reload the project')
+
+    def test_dangling_edges_are_refused_on_every_save_path(self):
+        dangling = self.edges + [{'id': 'e9', 'source': 'n1', 'target': 'missing'}]
+        status, _ = self.create(edges=dangling)
+        self.assertEqual(status, 400)
+        self.assertFalse(Project.objects.exists())
+
+        _, project = self.create()
+        status, _ = self.save(project['id'], {'base_revision': 1, 'nodes': self.nodes, 'edges': dangling})
+        self.assertEqual(status, 400)
+        status, _ = self.save(project['id'], {'base_revision': 1, 'patch': {'nodes': {'removed': ['n2']}}})
+        self.assertEqual(status, 400)
+        # The project is still patchable
+        status, saved = self.save(project['id'], {'base_revision': 1, 'patch': {'edges': {'removed': ['e1']}}})
+        self.assertEqual((status, saved['revision']), (200, 2))
+
+    def test_malformed_saves_are_400s(self):
+        _, project = self.create()
+        for data in (
+            {'base_revision': 1, 'patch': {'nodes': {'added': ['n4']}}},
+            {'base_revision': 1, 'patch': {'nodes': {'updated': [None]}}},
+            {'base_revision': 1, 'patch': {'nodes': {'removed': [['n1']]}}},
+            {'base_revision': 1, 'patch': {'nodes': {'added': {'id': 'n4'}}}},
+            {'base_revision': 1, 'patch': {'edges': {'added': [{'id': 'e5', 'source': ['n1'], 'target': 'n2'}]}}},
+            {'base_revision': 1, 'patch': {}, 'code': 42},
+            {'base_revision': 1, 'nodes': self.nodes + [self.nodes[0]], 'edges': []},
+            {'base_revision': 1, 'nodes': 'n1'},
+        ):
+            status, body = self.save(project['id'], data)
+            self.assertEqual(status, 400, data)
+            self.assertEqual(body['status'], 'error')
+        self.assertEqual(self.create(code=['int'])[0], 400)
+        self.assertEqual(self.create(name=7)[0], 400)
+
+    def test_project_without_revisions_loads(self):
+        project = Project.objects.create(owner='alice')
+        status, loaded = self.load(project.id)
+        self.assertEqual(status, 200)
+        self.assertIsNone(loaded['graph'])
+        self.assertIsNone(loaded['revision'])
+        status, _ = self.load(uuid.uuid4())
+        self.assertEqual(status, 404)
+
+
+class SwitchCodegenTests(SimpleTestCase):
+    code = (
+        'int main() {\n    int n = 2;\n    switch (n) {\n        case 1:\n            printf("one");\n            break;\n'
+        '        case 2:\n            printf("two");\n            break;\n        default:\n            printf("other");\n'
+        '    }\n    return 0;\n}\n'
+    )
+
+    def test_walked_switch_comes_back_as_a_switch(self):
+        nodes, edges = code_to_flowchart(self.code)
+        labels = sorted(edge['label'] for edge in edges if edge['label'])
+        self.assertEqual(labels, ['case 1', 'case 2', 'default'])
+        code = flowchart_to_code(nodes, edges)
+        self.assertIn('switch (n) {', code)
+        for case, body in (('case 1:', 'printf("one");'), ('case 2:', 'printf("two");'), ('default:', 'printf("other");')):
+            lines = code.split('\n')
+            position = next(i for i, line in enumerate(lines) if line.strip() == case)
+            self.assertEqual(lines[position + 1].strip(), body)
+        self.assertNotIn('if (switch', code)
+
+    def test_switch_without_default_keeps_the_no_match_path(self):
+        nodes, edges = code_to_flowchart('int main() {\n    switch (x) {\n        case 4:\n            f();\n    }\n    g();\n}\n')
+        code = flowchart_to_code(nodes, edges)
+        # g() runs after the switch, not only in case 4
+        self.assertIn('    case 4:\n      f();\n      break;\n    default:\n      break;\n  }\n  g();\n', code)
+
+    def test_multiway_decision_with_unlabelled_edges_is_refused(self):
+        nodes = [
+            {'id': 's', 'type': 'startEnd', 'data': {'label': 'Start'}},
+            {'id': 'd', 'type': 'decision', 'data': {'label': 'k'}},
+            {'id': 'a', 'type': 'process', 'data': {'label': 'a()'}},
+            {'id': 'b', 'type': 'process', 'data': {'label': 'b()'}},
+            {'id': 'c', 'type': 'process', 'data': {'label': 'c()'}},
+            {'id': 'e', 'type': 'startEnd', 'data': {'label': 'End'}},
+        ]
+        edges = [{'id': 'e0', 'source': 's', 'target': 'd'}] + [
+            {'id': f'e-{t}', 'source': 'd', 'target': t} for t in 'abc'
+        ] + [{'id': f'x-{t}', 'source': t, 'target': 'e'} for t in 'abc']
+        with self.assertRaises(UnstructuredFlowchart):
+            flowchart_to_code(nodes, edges)
+        response = Client().post('/api/generate-code-from-flowchart/', json.dumps({'nodes': nodes, 'edges': edges}),
+                                 content_type='application/json')
+        self.assertTrue(json.loads(response.content)['code'].startswith('// Error: Decision "k" has 3 branches'))
+
+        for edge, label in zip(edges[1:4], ('1', 'case 2', 'default')):
+            edge['label'] = label
+        code = flowchart_to_code(nodes, edges)
+        self.assertIn('switch (k) {\n    case 1:\n      a();\n      break;\n    case 2:\n      b();', code)
+        self.assertIn('default:\n      c();', code)
+
+
+class HashConsingTests(SimpleTestCase):
+    # Blocks that come back again and again, some of them refer to nodes outside themselves
+    blocks = [
+        '{ printf("a"); }',
+        '{ if (a > 1) { printf("a"); } else { printf("b"); } }',
+        '{ while (i < n) { i++; if (i == 3) { break; } } }',
+        '{ for (int j = 0; j < n; j++) { if (j) { continue; } printf("j"); } }',
+        '{ switch (n) { case 1: { printf("one"); break; } case 2: printf("two"); break; default: { n--; } } }',
+        '{ do { n--; } while (n > 0); }',
+    ]
+
+    def program(self, rng, statements):
+        body = []
+        for _ in range(statements):
+            block = rng.choice(self.blocks)
+            kind = rng.randrange(4)
+            if kind == 0:
+                body.append(f'if (x > {rng.randrange(2)}) {block} else {block}')
+            elif kind == 1:
+                body.append(f'while (x > 0) {{ {block} if (x == 2) {{ break; }} {block} }}')
+            else:
+                body.append(block)
+        return 'int main() {\n' + '\n'.join(body) + '\nreturn 0;\n}\n'
+
+    def build(self, code, reuse=True):
+        source = code.encode()
+        with parser_pool.checkout() as parser:
+            tree = parser.parse(source)
+        builder = FlowchartBuilder(source)
+        if reuse:
+            return builder.build(tree.root_node), builder
+        with mock.patch.object(FlowchartBuilder, '_block_key', return_value=None):
+            return builder.build(tree.root_node), builder
+
+    def test_stamped_copies_equal_a_full_walk(self):
+        rng = random.Random(23)
+        stamped = 0
+        for _ in range(40):
+            code = self.program(rng, rng.randrange(2, 12))
+            graph, builder = self.build(code)
+            walked, _ = self.build(code, reuse=False)
+            self.assertEqual(graph, walked, code)
+            stamped += any(isinstance(block, _Template) for block in builder._blocks.values())
+        # Most programs repeat a block at least three times, so templates really were used
+        self.assertGreater(stamped, 30)
+
+    def test_blocks_with_errors_are_always_walked(self):
+        code = 'int main() {\n' + 'if (x) { printf("a" }\n' * 4 + '}\n'
+        graph, builder = self.build(code)
+        self.assertEqual(graph, self.build(code, reuse=False)[0])
+        self.assertFalse(any(builder._blocks.values()))
+
+
+class CompactRoundTripTests(SimpleTestCase):
+    program = (
+        'int main() {\n    int n = 3;\n    int total = 0;\n    for (int i = 0; i < n; i++) {\n'
+        '        printf("%d", i);\n        if (i > 1) {\n            printf("big");\n        } else {\n'
+        '            printf("small");\n        }\n    }\n    while (n > 0) {\n        switch (n) {\n'
+        '            case 1:\n                printf("one");\n                break;\n            case 2:\n'
+        '                printf("two");\n                break;\n            default:\n                printf("many");\n'
+        '        }\n        scanf("%d", &n);\n    }\n    printf("%d", total);\n    return 0;\n}\n'
+    )
+    statements = ['int n = 3;', 'int total = 0;', 'printf("%d", i);', 'printf("big");', 'printf("small");',
+                  'printf("one");', 'printf("two");', 'printf("many");', 'scanf("%d", &n);', 'printf("%d", total);',
+                  'return 0;']
+
+    def test_basic_block_and_full_graphs_generate_the_same_program(self):
+        nodes, edges = code_to_flowchart(self.program)
+        full = flowchart_to_code(nodes, edges)
+        block_nodes, block_edges = code_to_flowchart(self.program, basic_blocks=True)
+        self.assertLess(len(block_nodes), len(nodes))
+        self.assertEqual(flowchart_to_code(block_nodes, block_edges), full)
+
+    def test_round_trip_keeps_every_statement(self):
+        for basic_blocks in (False, True):
+            code = flowchart_to_code(*code_to_flowchart(self.program, basic_blocks=basic_blocks))
+            lines = [line.strip() for line in code.split('\n')]
+            for statement in self.statements:
+                self.assertIn(statement, lines, (basic_blocks, statement))
+            self.assertIn('switch (n) {', lines)
+
+
+def apply_hunks(lines, hunks):
+    lines = list(lines)
+    for hunk in reversed(hunks):
+        lines[hunk['start']:hunk['start'] + hunk['deleted']] = hunk['lines']
+    return lines
+
+
+def regenerate(nodes, edges):
+    try:
+        return flowchart_to_code(list(nodes.values()), list(edges.values()))
+    except UnstructuredFlowchart as e:
+        return f'// Error: {e}'
+
+
+class CodeSessionTests(SimpleTestCase):
+    program = CompactRoundTripTests.program
+
+    def post(self, data):
+        response = Client().post('/api/code-session/', json.dumps(data), content_type='application/json')
+        return response.status_code, json.loads(response.content)
+
+    def random_patch(self, rng, nodes, edges, counter):
+        """A random patch of the mirrored graph, applied to the mirror as well."""
+        plain = [node_id for node_id, node in nodes.items() if node['data']['label'] not in ('Start', 'End')]
+        operation = rng.choices(['relabel', 'insert', 'remove', 'label', 'retarget'], [4, 4, 2, 1, 1])[0]
+        if operation == 'relabel' and plain:
+            node = {**nodes[rng.choice(plain)]}
+            node['data'] = {'label': rng.choices(['a();', 'b = 2;', 'x > 1', 'printf("z");', 'End', ''], [4, 4, 4, 4, 1, 1])[0]}
+            nodes[node['id']] = node
+            return {'nodes': {'updated': [node]}}
+        if operation == 'insert' and edges:
+            edge = edges.pop(rng.choice(list(edges)))
+            node_id = f'fuzz-{counter}'
+            node = {'id': node_id, 'type': 'inputOutput', 'data': {'label': f'step{counter}();'}}
+            into = {'id': f'{node_id}-in', 'source': edge['source'], 'target': node_id, 'label': edge['label']}
+            out = {'id': f'{node_id}-out', 'source': node_id, 'target': edge['target'], 'label': ''}
+            nodes[node_id] = node
+            edges[into['id']] = into
+            edges[out['id']] = out
+            return {'nodes': {'added': [node]}, 'edges': {'removed': [edge['id']], 'added': [into, out]}}
+        if operation == 'remove':
+            for node_id in rng.sample(plain, len(plain)):
+                incoming = [e for e in edges.values() if e['target'] == node_id]
+                outgoing = [e for e in edges.values() if e['source'] == node_id]
+                if len(incoming) == 1 and len(outgoing) == 1 and incoming[0] is not outgoing[0]:
+                    bridge = {'id': f'bridge-{counter}', 'source': incoming[0]['source'],
+                              'target': outgoing[0]['target'], 'label': incoming[0]['label']}
+                    del nodes[node_id]
+                    del edges[incoming[0]['id']], edges[outgoing[0]['id']]
+                    edges[bridge['id']] = bridge
+                    return {'nodes': {'removed': [node_id]},
+                            'edges': {'removed': [incoming[0]['id'], outgoing[0]['id']], 'added': [bridge]}}
+        if operation == 'label' and edges:
+            edge = {**edges[rng.choice(list(edges))], 'label': rng.choice(['True', 'False', ''])}
+            edges[edge['id']] = edge
+            return {'edges': {'updated': [edge]}}
+        if operation == 'retarget' and edges:
+            edge = {**edges.pop(rng.choice(list(edges))), 'target': rng.choice(list(nodes))}
+            # A moved edge goes to the end of its source's out-edges, like in the document's graph
+            edges[edge['id']] = edge
+            return {'edges': {'updated': [edge]}}
+        return {}
+
+    def test_patches_give_the_same_code_as_full_regeneration(self):
+        rng = random.Random(7)
+        for run in range(12):
+            raw_nodes, raw_edges = code_to_flowchart(self.program)
+            nodes = {node['id']: node for node in raw_nodes}
+            edges = {edge['id']: edge for edge in raw_edges}
+            document = CodeDocument(list(nodes.values()), list(edges.values()))
+            self.assertEqual(document.code, regenerate(nodes, edges))
+            for step in range(75):
+                patch = self.random_patch(rng, nodes, edges, f'{run}-{step}')
+                before = list(document.lines)
+                hunks = document.apply(json.loads(json.dumps(patch)))
+                expected = regenerate(nodes, edges)
+                self.assertEqual(document.code, expected, (run, step, patch))
+                self.assertEqual(apply_hunks(before, hunks), expected.split('\n'))
+
+    def test_relabelling_statements_only_rewrites_their_lines(self):
+        nodes, edges = code_to_flowchart(sample_program(40))
+        mirror = {node['id']: node for node in nodes}
+        document = CodeDocument(nodes, edges)
+        statements = [node for node in nodes if node['type'] == 'inputOutput' and node['data']['label']]
+        rng = random.Random(24)
+        labels = ['a();', 'b = 2;\nc = 3;', 'x++;\ny++;\nz++;', 'printf("%d", v);']
+        with mock.patch('engine.editing.CodeGenerator', side_effect=AssertionError('regenerated')):
+            for _ in range(200):
+                # Basic blocks take several lines, so every statement below them shifts
+                changed = [{**node, 'data': {'label': rng.choice(labels)}} for node in rng.sample(statements, 3)]
+                mirror.update((node['id'], node) for node in changed)
+                before = list(document.lines)
+                hunks = document.apply({'nodes': {'updated': changed}})
+                expected = regenerate(mirror, {edge['id']: edge for edge in edges})
+                self.assertEqual(document.code, expected)
+                self.assertEqual(apply_hunks(before, hunks), expected.split('\n'))
+                self.assertLessEqual(len(hunks), 3)
+
+        # Structural edits, and labels that can change the structure, regenerate
+        empty = {**statements[0], 'data': {'label': ''}}
+        mirror[empty['id']] = empty
+        before = list(document.lines)
+        hunks = document.apply({'nodes': {'updated': [empty]}})
+        self.assertEqual(apply_hunks(before, hunks), regenerate(mirror, {edge['id']: edge for edge in edges}).split('\n'))
+
+    def test_session_protocol(self):
+        nodes, edges = code_to_flowchart(self.program)
+        status, started = self.post({'nodes': nodes, 'edges': edges})
+        self.assertEqual(status, 200)
+        lines = started['code'].split('\n')
+        target = next(node for node in nodes if node['data']['label'] == 'printf("big");')
+        patch = {'nodes': {'updated': [{**target, 'data': {'label': 'printf("huge");'}}]}}
+
+        status, body = self.post({'session_id': started['session_id'], 'version': started['version'], 'patch': patch})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['version'], started['version'] + 1)
+        self.assertEqual(body['diff'], [{'start': lines.index('      printf("big");'), 'deleted': 1,
+                                         'lines': ['      printf("huge");']}])
+        lines = apply_hunks(lines, body['diff'])
+        self.assertEqual(len(lines), body['line_count'])
+
+        # A stale version has to start over, a bad patch is refused and the session survives
+        status, body = self.post({'session_id': started['session_id'], 'version': started['version'], 'patch': patch})
+        self.assertEqual(status, 409)
+        version = body['version']
+        status, _ = self.post({'session_id': started['session_id'], 'version': version,
+                               'patch': {'nodes': {'removed': ['no-such-node']}}})
+        self.assertEqual(status, 400)
+        status, _ = self.post({'session_id': started['session_id'], 'version': version, 'patch': {}})
+        self.assertEqual(status, 200)
+        status, _ = self.post({'session_id': 'unknown', 'version': 1, 'patch': {}})
+        self.assertEqual(status, 404)
+        status, _ = self.post({'patch': {}})
+        self.assertEqual(status, 400)
+
+
+class BatchTests(SimpleTestCase):
+    def tearDown(self):
+        batch._reset_executor()
+
+    def post(self, data):
+        response = Client().post('/api/generate-flowchart/batch/', json.dumps(data), content_type='application/json')
+        return response.status_code, json.loads(response.content)
+
+    @override_settings(FLOWCHART_BATCH_WORKERS=2)
+    def test_batch_runs_on_a_pool_that_never_forks_the_server(self):
+        # Hold the locks a forked child would inherit while the pool starts
+        with parser_pool._lock:
+            files = {f'f{i}.c': sample_program(i + 1) for i in range(4)}
+            files['empty.c'] = ''
+            results = batch.convert_batch(files)
+        self.assertIn(batch._executor._mp_context.get_start_method(), ('forkserver', 'spawn'))
+        self.assertEqual(list(results), list(files))
+        for name, code in files.items():
+            if code:
+                nodes, edges = code_to_flowchart(code)
+                self.assertEqual(results[name], {'status': 'success', 'nodes': nodes, 'edges': edges})
+        self.assertEqual(results['empty.c']['status'], 'error')
+
+    def test_batch_request_errors(self):
+        self.assertEqual(self.post({'files': []})[0], 400)
+        self.assertEqual(self.post({})[0], 400)
+        with self.settings(FLOWCHART_BATCH_MAX_FILES=1):
+            self.assertEqual(self.post({'files': {'a.c': 'int main() {}', 'b.c': 'int main() {}'}})[0], 413)
+        status, body = self.post({'files': {'a.c': 'int main() { return 0; }'}})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['results']['a.c']['status'], 'success')
+
+    def test_batch_reads_bodies_past_the_global_upload_limit(self):
+        self.assertEqual(settings.DATA_UPLOAD_MAX_MEMORY_SIZE, global_settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+        padding = ' ' * (settings.DATA_UPLOAD_MAX_MEMORY_SIZE + 1)
+        body = '{"files": {"a.c": "int main() { return 0; }"},' + padding + '"note": ""}'
+        response = Client().post('/api/generate-flowchart/batch/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        with self.settings(FLOWCHART_BATCH_MAX_BODY_BYTES=len(body) - 1):
+            response = Client().post('/api/generate-flowchart/batch/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+
+
+class StreamNegotiationTests(SimpleTestCase):
+    body = json.dumps({'nodes': [{'id': 's', 'type': 'startEnd', 'data': {'label': 'Start'}},
+                                 {'id': 'e', 'type': 'startEnd', 'data': {'label': 'End'}}],
+                       'edges': [{'id': 'x', 'source': 's', 'target': 'e'}]})
+
+    def post(self, path='/api/generate-code-from-flowchart/', **headers):
+        return Client().post(path, self.body, content_type='application/json', headers=headers)
+
+    def test_json_unless_plain_text_is_preferred(self):
+        for accept in ('application/json, text/plain, */*', '*/*', '', 'application/json'):
+            response = self.post(accept=accept)
+            self.assertFalse(response.streaming, accept)
+            self.assertIn('int main()', json.loads(response.content)['code'])
+        for accept in ('text/plain', 'text/plain, application/json;q=0.5'):
+            response = self.post(accept=accept)
+            self.assertTrue(response.streaming, accept)
+            self.assertIn('int main()', b''.join(response.streaming_content).decode())
+        self.assertTrue(self.post('/api/generate-code-from-flowchart/?stream=1').streaming)
+
+    def test_ndjson_only_when_preferred(self):
+        code = json.dumps({'code': 'int main() { return 0; }'})
+        response = Client().post('/api/generate-flowchart/', code, content_type='application/json',
+                                 headers={'accept': 'application/json, application/x-ndjson'})
+        self.assertFalse(response.streaming)
+        response = Client().post('/api/generate-flowchart/', code, content_type='application/json',
+                                 headers={'accept': 'application/x-ndjson'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[-1]), {'status': 'success'})
+
+    def test_stream_refuses_options_it_cannot_honour(self):
+        def stream(**options):
+            return Client().post('/api/generate-flowchart/', json.dumps({'code': 'int main() { f(); }', **options}),
+                                 content_type='application/json', headers={'accept': 'application/x-ndjson'})
+
+        for options in ({'layout': 'layered'}, {'layout': 'circular'}, {'basic_blocks': True}):
+            response = stream(**options)
+            self.assertEqual(response.status_code, 400, options)
+            self.assertFalse(response.streaming)
+        self.assertTrue(stream(layout='default').streaming)
+
+
+def counter(name, **labels):
+    for series in metrics.snapshot().get(name, []):
+        if series['labels'] == labels:
+            return series['value']
+    return 0
+
+
+def observations(name, **labels):
+    histogram = metrics._histograms.get((name, tuple(sorted(labels.items()))))
+    return histogram[3] if histogram else 0
+
+
+class RequestMetricsTests(SimpleTestCase):
+    graph = StreamNegotiationTests.body
+
+    def test_streamed_responses_are_recorded_when_sent(self):
+        endpoint = 'generate_code_from_flowchart'
+        requests = counter('requests_total', endpoint=endpoint, status=200)
+        streamed = observations('phase_seconds', endpoint=endpoint, phase='stream')
+        response = Client().post('/api/generate-code-from-flowchart/?stream=1', self.graph, content_type='application/json')
+        self.assertTrue(response.streaming)
+        self.assertEqual(counter('requests_total', endpoint=endpoint, status=200), requests)
+        b''.join(response.streaming_content)
+        self.assertEqual(counter('requests_total', endpoint=endpoint, status=200), requests + 1)
+        self.assertEqual(observations('phase_seconds', endpoint=endpoint, phase='stream'), streamed + 1)
+
+        requests = counter('requests_total', endpoint='generate_flowchart', status=200)
+        response = Client().post('/api/generate-flowchart/?stream=1', json.dumps({'code': 'int main() { f(); }'}),
+                                 content_type='application/json')
+        b''.join(response.streaming_content)
+        self.assertEqual(counter('requests_total', endpoint='generate_flowchart', status=200), requests + 1)
+
+    def test_sessions_and_batches_are_timed(self):
+        code = json.dumps({'code': sample_program(2)})
+        sessions = counter('requests_total', endpoint='flowchart_session', status=200)
+        unknown = counter('requests_total', endpoint='flowchart_session', status=404)
+        response = Client().post('/api/flowchart-session/', code, content_type='application/json')
+        self.assertIn('walk;dur=', response['Server-Timing'])
+        Client().post('/api/flowchart-session/', json.dumps({'session_id': 'gone', 'edits': []}),
+                      content_type='application/json')
+        self.assertEqual(counter('requests_total', endpoint='flowchart_session', status=200), sessions + 1)
+        self.assertEqual(counter('requests_total', endpoint='flowchart_session', status=404), unknown + 1)
+
+        batches = counter('requests_total', endpoint='generate_flowchart_batch', status=200)
+        errors = counter('errors_total', endpoint='generate_flowchart_batch', type='RuntimeError')
+        with mock.patch('api.batch.convert_batch', return_value={'a.c': {'status': 'success'}}):
+            response = Client().post('/api/generate-flowchart/batch/', json.dumps({'files': {'a.c': 'int x;'}}),
+                                     content_type='application/json')
+        self.assertIn('convert;dur=', response['Server-Timing'])
+        with mock.patch('api.batch.convert_batch', side_effect=RuntimeError('pool died')):
+            response = Client().post('/api/generate-flowchart/batch/', json.dumps({'files': {'a.c': 'int x;'}}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(counter('requests_total', endpoint='generate_flowchart_batch', status=200), batches + 1)
+        self.assertEqual(counter('errors_total', endpoint='generate_flowchart_batch', type='RuntimeError'), errors + 1)
+
+    @override_settings(FLOWCHART_MAX_NODES=3)
+    def test_errors_in_a_stream_are_counted(self):
+        errors = counter('errors_total', endpoint='generate_flowchart', type='LimitExceeded')
+        response = Client().post('/api/generate-flowchart/?stream=1', json.dumps({'code': sample_program(3)}),
+                                 content_type='application/json', headers={'accept': 'application/x-ndjson'})
+        last = json.loads(b''.join(response.streaming_content).decode().splitlines()[-1])
+        self.assertEqual(last['limit'], 'max_nodes')
+        self.assertEqual(counter('errors_total', endpoint='generate_flowchart', type='LimitExceeded'), errors + 1)
+
+    @override_settings(FLOWCHART_MAX_BODY_BYTES=16)
+    def test_rejected_bodies_are_counted(self):
+        for path, endpoint in (('/api/generate-flowchart/', 'generate_flowchart'),
+                               ('/api/flowchart-session/', 'flowchart_session'),
+                               ('/api/generate-code-from-flowchart/', 'generate_code_from_flowchart')):
+            before = counter('requests_total', endpoint=endpoint, status=413)
+            response = Client().post(path, self.graph, content_type='application/json')
+            self.assertEqual(response.status_code, 413)
+            self.assertIn('Server-Timing', response)
+            self.assertEqual(counter('requests_total', endpoint=endpoint, status=413), before + 1)
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_management_commands_do_not_warm_up(self):
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c', 'from engine import warmup; print(warmup.last_timings)'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, env={**os.environ, 'FLOWCHART_WARM_UP': '1'},
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], '{}')
+
+    def test_server_entry_points_warm_up(self):
+        with mock.patch('engine.warmup.warm_up') as warm_up:
+            for name in ('visual_coder_backend.wsgi', 'visual_coder_backend.asgi'):
+                sys.modules.pop(name, None)
+                importlib.import_module(name)
+            self.assertEqual(warm_up.call_count, 2)
+            with self.settings(FLOWCHART_WARM_UP=False):
+                warm_up_server()
+            self.assertEqual(warm_up.call_count, 2)
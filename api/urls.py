@@ -8,4 +8,31 @@ urlpatterns = [
     
     # New endpoint for generating code from flowchart
     path('generate-code-from-flowchart/', views.generate_code_from_flowchart, name='generate_code_from_flowchart'),
+
+    # One function's flowchart, built on demand from a source outlined with {'outline': true}
+    path('generate-flowchart/function/', views.generate_function_flowchart, name='generate_function_flowchart'),
+
+    # Many named C sources in one request, converted on a process pool
+    path('generate-flowchart/batch/', views.generate_flowchart_batch, name='generate_flowchart_batch'),
+
+    # Async versions for ASGI servers; conversions run on a bounded thread pool
+    path('async/generate-flowchart/', views.generate_flowchart_async, name='generate_flowchart_async'),
+    path('async/generate-code-from-flowchart/', views.generate_code_from_flowchart_async, name='generate_code_from_flowchart_async'),
+
+    # Incremental re-parse sessions for the live editor
+    path('flowchart-session/', views.flowchart_session, name='flowchart_session'),
+
+    # Flowchart editor sessions: graph patches in, line diffs of the code out
+    path('code-session/', views.code_session, name='code_session'),
+
+    # Saved projects: content-addressed revisions, saved as patches
+    path('projects/', views.projects, name='projects'),
+    path('projects/<uuid:project_id>/', views.project_detail, name='project_detail'),
+    path('projects/<uuid:project_id>/revisions/', views.project_revisions, name='project_revisions'),
+
+    # Engine counters (parser pool, result cache, async executor)
+    path('stats/', views.engine_stats, name='engine_stats'),
+
+    # Prometheus scrape target: phase latency histograms, sizes, errors by type
+    path('metrics/', views.prometheus_metrics, name='prometheus_metrics'),
 ]
\ No newline at end of file
@@ -1,17 +1,79 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
 from django.views.decorators.csrf import csrf_exempt
+import hashlib
 import json
 
-from tree_sitter import Parser, Language
-from tree_sitter_c import language as c_language_func
+from engine import (
+    LAYOUTS, LimitExceeded, Limits, NoStartNode, UnknownFunction, UnstructuredFlowchart, code_generator, code_outline,
+    code_to_flowchart,
+)
+from engine.editing import CodeDocument, PatchError
+from engine.flowchart import FlowchartBuilder, build_flowchart
+from engine.limits import parse as parse_source
+from engine.parser_pool import pool as parser_pool
+from engine.wire import COMPACT_CONTENT_TYPE, dumps, loads, to_columnar
 
-node_id_counter = 1
+from .cache import normalize_source, result_cache
+from . import metrics
+from .models import Project
+from .offload import Saturated, executor
+from .projects import Conflict, SaveError, create_project, load_project, read_blob, save_revision
+from .sessions import EditError, code_store as session_code_store, store as session_store
+
+# Bump whenever the generated nodes/edges change, so cached results are not reused
+ENGINE_VERSION = '4'
+
+flowchart_cache = result_cache('flowchart', ENGINE_VERSION)
+# One function's flowchart, by source_id and function name
+function_cache = result_cache('function', ENGINE_VERSION)
+# Outlined sources ({'code', 'functions'}) by source_id, for on-demand function graphs
+source_cache = result_cache('source', ENGINE_VERSION)
+
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def engine_limits():
+    return Limits(
+        max_body_bytes=getattr(settings, 'FLOWCHART_MAX_BODY_BYTES', None),
+        parse_timeout=getattr(settings, 'FLOWCHART_PARSE_TIMEOUT', None),
+        max_nodes=getattr(settings, 'FLOWCHART_MAX_NODES', None),
+        max_edges=getattr(settings, 'FLOWCHART_MAX_EDGES', None),
+        max_depth=getattr(settings, 'FLOWCHART_MAX_DEPTH', None),
+    )
+
+
+def limit_response(error):
+    metrics.inc('limit_exceeded_total', limit=error.limit)
+    return JsonResponse(error.as_dict(), status=error.status)
+
+
+def check_content_length(request, max_bytes, endpoint):
+    """Reject an oversized body from its Content-Length, before it is read; the rejection is still counted."""
+    try:
+        size = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return None
+    try:
+        Limits(max_body_bytes=max_bytes).check_body(size)
+    except LimitExceeded as e:
+        return metrics.RequestTimer(endpoint).finish(limit_response(e))
+    return None
+
+
+def wants_stream(request, content_type):
+    """
+    Streaming is opt-in, with ?stream=1 or an Accept header that prefers the
+    streamed content type to JSON. Clients that merely list it next to JSON
+    (axios sends 'application/json, text/plain, */*') still get JSON.
+    """
+    if request.GET.get('stream') in ('1', 'true'):
+        return True
+    return request.get_preferred_type(['application/json', content_type]) == content_type
 
-def get_unique_node_id():
-    global node_id_counter
-    res = f"node-{node_id_counter}"
-    node_id_counter += 1
-    return res
 
 @csrf_exempt
 def generate_code_from_flowchart(request):
@@ -21,457 +83,770 @@ def generate_code_from_flowchart(request):
     """
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
-    
+    limits = engine_limits()
+    too_large = check_content_length(request, limits.max_body_bytes, 'generate_code_from_flowchart')
+    if too_large:
+        return too_large
+    return code_from_flowchart_response(request.body, stream=wants_stream(request, 'text/plain'), limits=limits)
+
+
+def code_from_flowchart_response(body, stream=False, limits=None):
+    """
+    Convert a flowchart request body to the C code response. With stream, the
+    code itself is streamed as plain text while it is generated.
+    """
+    timer = metrics.RequestTimer('generate_code_from_flowchart')
+    return timer.finish(convert_flowchart_body(body, stream, limits or engine_limits(), timer))
+
+
+def convert_flowchart_body(body, stream, limits, timer):
     try:
-        data = json.loads(request.body)
+        metrics.observe('request_bytes', len(body), metrics.SIZE_BUCKETS, endpoint=timer.endpoint)
+        limits.check_body(len(body))
+        with timer.phase('decode'):
+            data = json.loads(body)
         nodes = data.get('nodes', [])
         edges = data.get('edges', [])
         
         if not nodes:
             return JsonResponse({'status': 'error', 'message': 'No nodes provided'}, status=400)
         
-        # Find the Start node
-        start_node = None
-        for node in nodes:
-            if node.get('data', {}).get('label', '').lower() == 'start':
-                start_node = node
-                break
-        
-        if not start_node:
-            return JsonResponse({'code': '// Error: "Start" node not found!'})
-        
-        # Build adjacency list
-        adj = {}
-        for node in nodes:
-            adj[node['id']] = []
-        
-        for edge in edges:
-            if edge['source'] in adj:
-                adj[edge['source']].append({
-                    'target': edge['target'],
-                    'label': edge.get('label', '')
-                })
-        
-        def get_node(node_id):
-            for node in nodes:
-                if node['id'] == node_id:
-                    return node
-            return None
-        
-        def format_statement(label, indentation):
-            indent = '  ' * indentation
-            trimmed_label = label.strip()
-            if not trimmed_label:
-                return ''
-            if trimmed_label.endswith(';') or trimmed_label.endswith('{') or trimmed_label.endswith('}'):
-                return f"{indent}{trimmed_label}\n"
-            return f"{indent}{trimmed_label};\n"
-        
-        def find_merge_node(decision_node_id, local_adj, local_edges):
-            """Find the merge point for if-else branches"""
-            decision_neighbors = local_adj.get(decision_node_id, [])
-            true_edge = None
-            false_edge = None
-            
-            for edge in decision_neighbors:
-                if edge['label'].lower() == 'true':
-                    true_edge = edge
-                elif edge['label'].lower() == 'false':
-                    false_edge = edge
-            
-            if not true_edge:
-                return false_edge['target'] if false_edge else None
-            
-            # Follow true path and collect all nodes
-            true_path = set()
-            curr = true_edge['target']
-            while curr:
-                true_path.add(curr)
-                next_edges = local_adj.get(curr, [])
-                incoming_edges = [e for e in local_edges if e['target'] == curr]
-                if len(next_edges) == 0 or len(incoming_edges) > 1:
-                    break
-                curr = next_edges[0]['target']
-            
-            # Follow false path and find first intersection with true path
-            curr = false_edge['target'] if false_edge else None
-            while curr:
-                if curr in true_path:
-                    return curr
-                next_edges = local_adj.get(curr, [])
-                incoming_edges = [e for e in local_edges if e['target'] == curr]
-                if len(next_edges) == 0 or len(incoming_edges) > 1:
-                    break
-                curr = next_edges[0]['target']
-            
-            return None
-        
-        def is_while_loop(decision_node_id):
-            """Check if a decision node is part of a while loop"""
-            decision_neighbors = adj.get(decision_node_id, [])
-            true_edge = None
-            
-            for edge in decision_neighbors:
-                if edge['label'].lower() == 'true':
-                    true_edge = edge
-                    break
-            
-            if not true_edge:
-                return False
-            
-            # Follow the true path and see if it loops back to the decision node
-            current_node_id = true_edge['target']
-            path = set()
-            
-            while current_node_id and current_node_id not in path:
-                path.add(current_node_id)
-                if current_node_id == decision_node_id:
-                    return True
-                neighbors = adj.get(current_node_id, [])
-                if len(neighbors) != 1:
-                    return False
-                current_node_id = neighbors[0]['target']
-            
-            return False
-        
-        # Generate C code
-        code = '#include <stdio.h>\n\nint main() {\n'
-        current_node_id = start_node['id']
-        visited = set()
-        
-        while current_node_id and current_node_id not in visited:
-            visited.add(current_node_id)
-            node = get_node(current_node_id)
-            
-            if not node or node.get('data', {}).get('label', '').lower() == 'end':
-                break
-            
-            neighbors = adj.get(node['id'], [])
-            node_type = node.get('type', '')
-            node_label = node.get('data', {}).get('label', '')
-            
-            if node_type == 'startEnd' and node_label.lower() == 'start':
-                current_node_id = neighbors[0]['target'] if neighbors else None
-            
-            elif node_type == 'inputOutput':
-                code += format_statement(node_label, 1)
-                current_node_id = neighbors[0]['target'] if neighbors else None
-            
-            elif node_type == 'forLoop':
-                indent = '  '
-                code += f"{indent}for ({node_label}) {{\n"
-                
-                # Find true and false edges
-                true_edge = None
-                false_edge = None
-                for edge in neighbors:
-                    if edge['label'].lower() == 'true':
-                        true_edge = edge
-                    elif edge['label'].lower() == 'false':
-                        false_edge = edge
-                
-                # Process loop body
-                if true_edge:
-                    body_node_id = true_edge['target']
-                    loop_exit_id = false_edge['target'] if false_edge else None
-                    loop_body_path = set()
-                    
-                    while (body_node_id and body_node_id != node['id'] and 
-                           body_node_id != loop_exit_id and body_node_id not in loop_body_path):
-                        loop_body_path.add(body_node_id)
-                        body_node = get_node(body_node_id)
-                        if body_node:
-                            code += format_statement(body_node.get('data', {}).get('label', ''), 2)
-                        
-                        body_neighbors = adj.get(body_node_id, [])
-                        body_node_id = body_neighbors[0]['target'] if body_neighbors else None
-                
-                code += f"{indent}}}\n"
-                current_node_id = false_edge['target'] if false_edge else None
-            
-            elif node_type == 'decision':
-                if is_while_loop(node['id']):
-                    # Handle while loop
-                    indent = '  '
-                    code += f"{indent}while ({node_label}) {{\n"
-                    
-                    true_edge = None
-                    false_edge = None
-                    for edge in neighbors:
-                        if edge['label'].lower() == 'true':
-                            true_edge = edge
-                        elif edge['label'].lower() == 'false':
-                            false_edge = edge
-                    
-                    if true_edge:
-                        body_node_id = true_edge['target']
-                        while body_node_id and body_node_id != node['id']:
-                            body_node = get_node(body_node_id)
-                            if body_node:
-                                code += format_statement(body_node.get('data', {}).get('label', ''), 2)
-                            
-                            body_neighbors = adj.get(body_node_id, [])
-                            body_node_id = body_neighbors[0]['target'] if body_neighbors else None
-                    
-                    code += f"{indent}}}\n"
-                    current_node_id = false_edge['target'] if false_edge else None
-                
-                else:
-                    # Handle if-else
-                    merge_node_id = find_merge_node(node['id'], adj, edges)
-                    indent = '  '
-                    code += f"{indent}if ({node_label}) {{\n"
-                    
-                    # Process true branch
-                    true_edge = None
-                    false_edge = None
-                    for edge in neighbors:
-                        if edge['label'].lower() == 'true':
-                            true_edge = edge
-                        elif edge['label'].lower() == 'false':
-                            false_edge = edge
-                    
-                    if true_edge:
-                        current_in_true_branch = true_edge['target']
-                        while current_in_true_branch and current_in_true_branch != merge_node_id:
-                            branch_node = get_node(current_in_true_branch)
-                            if branch_node:
-                                code += format_statement(branch_node.get('data', {}).get('label', ''), 2)
-                            
-                            branch_neighbors = adj.get(current_in_true_branch, [])
-                            current_in_true_branch = branch_neighbors[0]['target'] if branch_neighbors else None
-                    
-                    code += f"{indent}}}\n"
-                    
-                    # Process false branch
-                    if false_edge:
-                        code += f"{indent}else {{\n"
-                        current_in_false_branch = false_edge['target']
-                        while current_in_false_branch and current_in_false_branch != merge_node_id:
-                            branch_node = get_node(current_in_false_branch)
-                            if branch_node:
-                                code += format_statement(branch_node.get('data', {}).get('label', ''), 2)
-                            
-                            branch_neighbors = adj.get(current_in_false_branch, [])
-                            current_in_false_branch = branch_neighbors[0]['target'] if branch_neighbors else None
-                        
-                        code += f"{indent}}}\n"
-                    
-                    current_node_id = merge_node_id
-            
-            else:
-                break
-        
-        code += '\n  return 0;\n}'
-        
-        return JsonResponse({'code': code})
+        metrics.observe('nodes', len(nodes), metrics.COUNT_BUCKETS, endpoint=timer.endpoint)
+        try:
+            generator = code_generator(nodes, edges, limits, timer)
+        except NoStartNode as e:
+            return JsonResponse({'code': f'// Error: {e}'})
+
+        if stream:
+            return StreamingHttpResponse(code_chunks(generator), content_type='text/plain; charset=utf-8')
+        try:
+            with timer.phase('codegen'):
+                code = generator.generate()
+        except UnstructuredFlowchart as e:
+            return JsonResponse({'code': f'// Error: {e}'})
+        with timer.phase('encode'):
+            return JsonResponse({'code': code})
     
+    except LimitExceeded as e:
+        timer.error(e)
+        return limit_response(e)
     except Exception as e:
+        timer.error(e)
         import traceback
         traceback.print_exc()
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
+
+def code_chunks(generator):
+    try:
+        yield from generator.iter_chunks()
+    except LimitExceeded as e:
+        metrics.inc('limit_exceeded_total', limit=e.limit)
+        yield f"\n// Error: {e}\n"
+    except Exception as e:
+        # Headers are already sent, so the error can only be reported in the code
+        import traceback
+        traceback.print_exc()
+        yield f"\n// Error: {e}\n"
+
+
 @csrf_exempt
 def generate_flowchart(request):
-    global node_id_counter
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    limits = engine_limits()
+    too_large = check_content_length(request, limits.max_body_bytes, 'generate_flowchart')
+    if too_large:
+        return too_large
+    if wants_stream(request, NDJSON_CONTENT_TYPE):
+        timer = metrics.RequestTimer('generate_flowchart')
+        return timer.finish(flowchart_stream_response(request.body, limits, timer))
+    wire_format = requested_format(request)
+    response = flowchart_response(request.body, wire_format, limits)
+    return gzip_compact(request, response, wire_format)
+
+
+def requested_format(request):
+    """The compact format is opt-in, with ?format=compact or an Accept header naming it."""
+    if request.GET.get('format') == 'compact' or COMPACT_CONTENT_TYPE in request.headers.get('Accept', ''):
+        return 'compact'
+    return 'json'
+
 
+def gzip_compact(request, response, wire_format):
+    """Gzip compact responses for clients that accept it."""
+    if wire_format != 'compact' or response.status_code != 200 or response.has_header('Content-Encoding'):
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if 'gzip' not in request.headers.get('Accept-Encoding', ''):
+        return response
+    response.content = compress_string(response.content)
+    response['Content-Length'] = str(len(response.content))
+    response['Content-Encoding'] = 'gzip'
+    return response
+
+
+def flowchart_response(body, wire_format='json', limits=None):
+    """Convert a C code request body to the flowchart response, in the default or the compact format."""
+    timer = metrics.RequestTimer('generate_flowchart')
+    return timer.finish(convert_code_body(body, wire_format, limits or engine_limits(), timer))
+
+
+def convert_code_body(body, wire_format, limits, timer):
     try:
-        data = json.loads(request.body)
+        metrics.observe('request_bytes', len(body), metrics.SIZE_BUCKETS, endpoint=timer.endpoint)
+        limits.check_body(len(body))
+        with timer.phase('decode'):
+            data = json.loads(body)
         code = data.get('code', '')
         if not code:
             return JsonResponse({'status': 'error', 'message': 'Code cannot be empty'}, status=400)
 
-        parser = Parser()
-        c_lang = Language(c_language_func())
-        parser.language = c_lang
-
-        tree = parser.parse(bytes(code, "utf8"))
-        root_node = tree.root_node
-
-        nodes = []
-        edges = []
-        node_id_counter = 1
-        y_pos = 50
-
-        def create_node(node_type, label, x, y, extra_data={}):
-            nonlocal y_pos
-            node_id = get_unique_node_id()
-            node = {
-                'id': node_id,
-                'type': node_type,
-                'position': {'x': x, 'y': y},
-                'data': {'label': label, **extra_data}
-            }
-            y_pos += 120 
-            return node
-
-        def create_edge(source, target, label=''):
-            edge_id = f"e-{source}-{target}-{label}-{get_unique_node_id()}"
-            return {'id': edge_id, 'source': source, 'target': target, 'label': label, 'type': 'smoothstep'}
-
-        def walk_ast(node, parent_id, x_pos=350, break_target_id=None):
-            current_parent_id = parent_id
-
-            if not node or not hasattr(node, 'children'):
-                return parent_id
-
-            # Hum 'named_children' use karenge taaki '{' jaise faltu tokens na aayein
-            for child in node.named_children:
-                created_node = None
-                child_text = child.text.decode('utf8')
-
-                # --- FUNCTION CALL LOGIC ---
-                # expression_statement ke andar call_expression ho sakta hai
-                if child.type == 'expression_statement' and child.children[0].type == 'call_expression':
-                    created_node = create_node('inputOutput', child_text, x_pos, y_pos)
-
-                elif child.type in ('declaration', 'return_statement'):
-                    created_node = create_node('inputOutput', child_text, x_pos, y_pos)
-                
-                elif child.type == 'if_statement':
-                    # ... (if-else ka logic waisa hi rahega)
-                    condition = child.child_by_field_name('condition').text.decode('utf8')
-                    if_node = create_node('decision', f"{condition}", x_pos, y_pos)
-                    nodes.append(if_node)
-                    edges.append(create_edge(current_parent_id, if_node['id']))
-                    
-                    merge_node = create_node('inputOutput', '', x_pos, y_pos + 240)
-                    merge_node['data']['label'] = ''
-                    nodes.append(merge_node)
-
-                    consequence = child.child_by_field_name('consequence')
-                    true_end_id = walk_ast(consequence, if_node['id'], x_pos - 200, merge_node['id'])
-                    edges.append(create_edge(if_node['id'], true_end_id, 'True'))
-                    if true_end_id != merge_node['id']:
-                       edges.append(create_edge(true_end_id, merge_node['id']))
-                    
-                    alternative = child.child_by_field_name('alternative')
-                    if alternative:
-                        false_end_id = walk_ast(alternative, if_node['id'], x_pos + 200, merge_node['id'])
-                        edges.append(create_edge(if_node['id'], false_end_id, 'False'))
-                        if false_end_id != merge_node['id']:
-                            edges.append(create_edge(false_end_id, merge_node['id']))
-                    else:
-                        edges.append(create_edge(if_node['id'], merge_node['id'], 'False'))
-                    
-                    current_parent_id = merge_node['id']
-                    continue
-                
-                # Baki saare loops aur switch ka logic waisa hi rahega
-                # ... (for, while, switch logic here) ...
-                elif child.type == 'for_statement':
-                    initializer = child.child_by_field_name('initializer')
-                    init_text = initializer.text.decode('utf8') if initializer else ''
-                    init_node = create_node('inputOutput', init_text, x_pos, y_pos)
-                    nodes.append(init_node)
-                    edges.append(create_edge(current_parent_id, init_node['id']))
-
-                    condition = child.child_by_field_name('condition')
-                    cond_text = condition.text.decode('utf8') if condition else 'true'
-                    cond_node = create_node('decision', cond_text, x_pos, y_pos)
-                    nodes.append(cond_node)
-                    edges.append(create_edge(init_node['id'], cond_node['id']))
-                    
-                    body_node = child.child_by_field_name('body')
-                    body_end_id = walk_ast(body_node, cond_node['id'], x_pos + 250)
-                    
-                    update = child.child_by_field_name('update')
-                    update_text = update.text.decode('utf8') if update else ''
-                    update_node = create_node('inputOutput', update_text, x_pos + 250, y_pos)
-                    nodes.append(update_node)
-                    edges.append(create_edge(body_end_id, update_node['id'], 'True'))
-                    
-                    edges.append(create_edge(update_node['id'], cond_node['id']))
-
-                    current_parent_id = cond_node['id']
-                    continue
-
-                elif child.type == 'while_statement':
-                    condition = child.child_by_field_name('condition')
-                    cond_text = condition.text.decode('utf8') if condition else 'true'
-                    cond_node = create_node('decision', cond_text, x_pos, y_pos)
-                    nodes.append(cond_node)
-                    edges.append(create_edge(current_parent_id, cond_node['id']))
-
-                    body = child.child_by_field_name('body')
-                    body_end_id = walk_ast(body, cond_node['id'], x_pos + 250)
-                    edges.append(create_edge(body_end_id, cond_node['id'], 'True'))
-                    
-                    current_parent_id = cond_node['id']
-                    continue
-
-                elif child.type == 'switch_statement':
-                    condition = child.child_by_field_name('condition').text.decode('utf8')
-                    switch_node = create_node('decision', f"switch {condition}", x_pos, y_pos)
-                    nodes.append(switch_node)
-                    edges.append(create_edge(current_parent_id, switch_node['id']))
-                    
-                    body = child.child_by_field_name('body')
-                    
-                    merge_node = create_node('inputOutput', '', x_pos, y_pos + (len(body.named_children) * 120))
-                    merge_node['data']['label'] = ''
-                    nodes.append(merge_node)
-
-                    case_x_offset = -200
-                    
-                    for case_statement in body.named_children:
-                        if case_statement.type == 'case_statement':
-                            value_node = case_statement.child_by_field_name('value')
-                            case_label = value_node.text.decode('utf8') if value_node else "default"
-                            
-                            case_end_id = walk_ast(case_statement, switch_node['id'], x_pos + case_x_offset, merge_node['id'])
-                            if case_end_id != merge_node['id']:
-                                edges.append(create_edge(case_end_id, merge_node['id']))
-                            
-                            case_x_offset += 200
-                        
-                        elif case_statement.type == 'default_statement':
-                            case_end_id = walk_ast(case_statement, switch_node['id'], x_pos + case_x_offset, merge_node['id'])
-                            if case_end_id != merge_node['id']:
-                                edges.append(create_edge(case_end_id, merge_node['id']))
-                            
-                            case_x_offset += 200
-
-
-                    current_parent_id = merge_node['id']
-                    continue
-
-                if created_node:
-                    nodes.append(created_node)
-                    edges.append(create_edge(parent_id, created_node['id']))
-                    current_parent_id = created_node['id']
-                else:
-                    current_parent_id = walk_ast(child, current_parent_id, x_pos, break_target_id)
-
-            return current_parent_id
-
-        start_node = create_node('startEnd', 'Start', 350, y_pos)
-        nodes.append(start_node)
-        
-        main_function_body = None
-        for func in root_node.children:
-            if func.type == 'function_definition':
-                declarator = func.child_by_field_name('declarator')
-                if declarator and 'main' in declarator.text.decode('utf8'):
-                    main_function_body = func.child_by_field_name('body')
-                    break
-        
-        last_node_id = start_node['id']
-        if main_function_body:
-            last_node_id = walk_ast(main_function_body, start_node['id'])
-        else:
-            last_node_id = walk_ast(root_node, start_node['id'])
+        if data.get('outline'):
+            # Only list the functions; their graphs come from generate-flowchart/function/
+            source_id, record = source_record(code, limits, timer)
+            return JsonResponse({'status': 'success', 'source_id': source_id, 'functions': record['functions']})
+
+        layout, basic_blocks, invalid = conversion_options(data)
+        if invalid:
+            return invalid
+
+        content_type = COMPACT_CONTENT_TYPE if wire_format == 'compact' else 'application/json'
+        with timer.phase('cache'):
+            cache_key = flowchart_cache.key(normalize_source(code), layout, wire_format, basic_blocks)
+            content = flowchart_cache.get(cache_key)
+        if content is not None:
+            timer.note('cache', 'hit')
+            return HttpResponse(content, content_type=content_type)
+
+        nodes, edges = code_to_flowchart(code, layout, limits, timer, basic_blocks)
+        response = encode_flowchart(nodes, edges, wire_format, timer)
+        flowchart_cache.set(cache_key, response.content)
+        return response
+
+    except LimitExceeded as e:
+        timer.error(e)
+        return limit_response(e)
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+def conversion_options(data):
+    """The (layout, basic_blocks) options of a request body, or an error response as the third item."""
+    layout = data.get('layout', 'default')
+    if layout not in LAYOUTS:
+        return None, None, JsonResponse({'status': 'error', 'message': f'Unknown layout: {layout}'}, status=400)
+    basic_blocks = data.get('basic_blocks', False)
+    if not isinstance(basic_blocks, bool):
+        return None, None, JsonResponse({'status': 'error', 'message': "'basic_blocks' must be true or false"}, status=400)
+    return layout, basic_blocks, None
 
-        end_node = create_node('startEnd', 'End', 350, y_pos)
-        nodes.append(end_node)
-        
-        edges.append(create_edge(last_node_id, end_node['id']))
 
+def encode_flowchart(nodes, edges, wire_format, timer):
+    metrics.observe('nodes', len(nodes), metrics.COUNT_BUCKETS, endpoint=timer.endpoint)
+    with timer.phase('encode'):
+        if wire_format == 'compact':
+            return HttpResponse(dumps(to_columnar(nodes, edges)), content_type=COMPACT_CONTENT_TYPE)
         return JsonResponse({'status': 'success', 'nodes': nodes, 'edges': edges})
 
+
+def source_record(code, limits, timer):
+    """
+    (source_id, {'code', 'functions'}) of a source: its sha256 and its function
+    outline, from the source cache or outlined now and cached.
+    """
+    source_id = hashlib.sha256(code.encode('utf8')).hexdigest()
+    key = source_cache.key(source_id)
+    with timer.phase('source'):
+        content = source_cache.get(key)
+    if content is not None:
+        timer.note('source', 'hit')
+        return source_id, loads(content)
+    record = {'code': code, 'functions': code_outline(code, limits, timer)}
+    source_cache.set(key, dumps(record))
+    return source_id, record
+
+
+@csrf_exempt
+def generate_function_flowchart(request):
+    """
+    The flowchart of one function of a source outlined with {'outline': true}.
+    Send {'source_id', 'function'} ('code' instead of 'source_id' also works),
+    with 'layout' and 'basic_blocks' as for generate-flowchart. Only that function
+    is parsed and walked, and the result is cached.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    limits = engine_limits()
+    too_large = check_content_length(request, limits.max_body_bytes, 'generate_function_flowchart')
+    if too_large:
+        return too_large
+    wire_format = requested_format(request)
+    timer = metrics.RequestTimer('generate_function_flowchart')
+    response = timer.finish(convert_function_body(request.body, wire_format, limits, timer))
+    return gzip_compact(request, response, wire_format)
+
+
+def convert_function_body(body, wire_format, limits, timer):
+    try:
+        limits.check_body(len(body))
+        with timer.phase('decode'):
+            data = json.loads(body)
+        name = data.get('function')
+        if not isinstance(name, str) or not name:
+            return JsonResponse({'status': 'error', 'message': "'function' is required"}, status=400)
+        layout, basic_blocks, invalid = conversion_options(data)
+        if invalid:
+            return invalid
+
+        if data.get('code'):
+            source_id, record = source_record(data['code'], limits, timer)
+        else:
+            source_id = data.get('source_id')
+            with timer.phase('source'):
+                content = source_cache.get(source_cache.key(source_id)) if isinstance(source_id, str) else None
+            if content is None:
+                return JsonResponse({'status': 'error', 'message': 'Unknown source_id, send the code again'}, status=404)
+            record = loads(content)
+
+        content_type = COMPACT_CONTENT_TYPE if wire_format == 'compact' else 'application/json'
+        with timer.phase('cache'):
+            cache_key = function_cache.key(source_id, name, layout, wire_format, basic_blocks)
+            content = function_cache.get(cache_key)
+        if content is not None:
+            timer.note('cache', 'hit')
+            return HttpResponse(content, content_type=content_type)
+
+        entry = next((function for function in record['functions'] if function['name'] == name), None)
+        if entry is None:
+            raise UnknownFunction(name)
+        # A function definition parses on its own, so only its bytes are parsed and walked
+        source = record['code'].encode('utf8')[entry['start_byte']:entry['end_byte']]
+        nodes, edges = code_to_flowchart(source, layout, limits, timer, basic_blocks, function=name)
+        response = encode_flowchart(nodes, edges, wire_format, timer)
+        function_cache.set(cache_key, response.content)
+        return response
+
+    except UnknownFunction as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+    except LimitExceeded as e:
+        timer.error(e)
+        return limit_response(e)
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+def ndjson_events(tree, source, chunk_size=16 * 1024, limits=None, timer=None):
+    """
+    Yield the flowchart as newline-delimited JSON, one {'node': ...} or
+    {'edge': ...} object per line, ending with a {'status': ...} line.
+    Lines are grouped into chunks of about chunk_size characters. Errors
+    raised while walking are recorded on timer, if one is given.
+    """
+    chunk = []
+    size = 0
+    try:
+        for kind, item in FlowchartBuilder(source, limits or engine_limits()).events(tree.root_node):
+            line = json.dumps({kind: item}) + '\n'
+            chunk.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+        chunk.append(json.dumps({'status': 'success'}) + '\n')
+    except LimitExceeded as e:
+        if timer:
+            timer.error(e)
+        metrics.inc('limit_exceeded_total', limit=e.limit)
+        chunk.append(json.dumps(e.as_dict()) + '\n')
     except Exception as e:
+        # Headers are already sent, so the error can only be reported in the stream
+        if timer:
+            timer.error(e)
         import traceback
         traceback.print_exc()
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
\ No newline at end of file
+        chunk.append(json.dumps({'status': 'error', 'message': str(e)}) + '\n')
+    yield ''.join(chunk)
+
+
+def flowchart_stream_response(body, limits=None, timer=None):
+    """
+    Stream the flowchart as NDJSON while the syntax tree is walked, so nothing
+    but the tree is held in memory. Only useful on WSGI workers: under ASGI
+    Django buffers synchronous streams before sending them.
+    """
+    limits = limits or engine_limits()
+    timer = timer or metrics.RequestTimer('generate_flowchart')
+    try:
+        limits.check_body(len(body))
+        with timer.phase('decode'):
+            data = json.loads(body)
+        code = data.get('code', '')
+        if not code:
+            return JsonResponse({'status': 'error', 'message': 'Code cannot be empty'}, status=400)
+        if data.get('basic_blocks'):
+            # Blocks are only known once the whole graph is there
+            return JsonResponse({'status': 'error', 'message': 'Basic blocks are not available when streaming'}, status=400)
+        if data.get('layout', 'default') != 'default':
+            # So is a layered layout; nodes are streamed with the walker's positions
+            return JsonResponse({'status': 'error', 'message': 'Only the default layout is available when streaming'},
+                                status=400)
+
+        source = bytes(code, "utf8")
+        with timer.phase('parse'), parser_pool.checkout() as parser:
+            tree = parse_source(parser, source, limits)
+
+        return StreamingHttpResponse(ndjson_events(tree, source, limits=limits, timer=timer),
+                                     content_type=NDJSON_CONTENT_TYPE)
+
+    except LimitExceeded as e:
+        timer.error(e)
+        return limit_response(e)
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+@csrf_exempt
+def flowchart_session(request):
+    """
+    Incremental code-to-flowchart conversion for a live editor.
+    Send {'code': ...} to start a session (or reset one with 'session_id'),
+    then {'session_id': ..., 'edits': [{'start_byte', 'old_end_byte', 'text'}]}
+    for every change. Only the nodes and edges that changed are returned, and
+    the new positions of nodes that only moved.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+
+    limits = engine_limits()
+    too_large = check_content_length(request, limits.max_body_bytes, 'flowchart_session')
+    if too_large:
+        return too_large
+    timer = metrics.RequestTimer('flowchart_session')
+    return timer.finish(flowchart_session_body(request.body, limits, timer))
+
+
+def flowchart_session_body(body, limits, timer):
+    try:
+        limits.check_body(len(body))
+        with timer.phase('decode'):
+            data = json.loads(body)
+        session_id = data.get('session_id')
+        edits = data.get('edits')
+
+        if session_id:
+            session = session_store.get(session_id)
+            if session is None:
+                return JsonResponse({'status': 'error', 'message': 'Unknown or expired session'}, status=404)
+        elif edits is not None:
+            return JsonResponse({'status': 'error', 'message': 'Edits need a session_id'}, status=400)
+        else:
+            session = session_store.create()
+
+        with session.lock:
+            try:
+                return flowchart_session_update(session, data, edits, limits, timer)
+            except EditError as e:
+                # Nothing was applied, but the client's copy of the source is not the server's
+                session_store.discard(session.id)
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            except Exception:
+                # The source, tree and flowchart may no longer agree; the client has to start again
+                session_store.discard(session.id)
+                raise
+
+    except LimitExceeded as e:
+        timer.error(e)
+        return limit_response(e)
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+def flowchart_session_update(session, data, edits, limits, timer):
+    if edits is None:
+        code = data.get('code', '')
+        if not code:
+            return JsonResponse({'status': 'error', 'message': 'Code cannot be empty'}, status=400)
+        if not isinstance(code, str):
+            raise EditError("'code' must be a string")
+        session.source = bytes(code, "utf8")
+        session.tree = None
+    else:
+        with timer.phase('edit'):
+            session.apply_edits(edits)
+
+    # The edited source can outgrow the body limit one small edit at a time
+    limits.check_body(len(session.source))
+    with timer.phase('parse'), parser_pool.checkout() as parser:
+        tree = parse_source(parser, session.source, limits, session.tree)
+    with timer.phase('walk'):
+        nodes, edges = build_flowchart(tree.root_node, session.source, limits)
+    metrics.observe('nodes', len(nodes), metrics.COUNT_BUCKETS, endpoint=timer.endpoint)
+    with timer.phase('diff'):
+        delta = session.update(tree, nodes, edges)
+
+    return JsonResponse({
+        'status': 'success',
+        'session_id': session.id,
+        'version': session.version,
+        **delta,
+    })
+
+
+@csrf_exempt
+def code_session(request):
+    """
+    Stateful flowchart-to-code conversion for the flowchart editor.
+    Send {'nodes', 'edges'} to start a session (or reset one with 'session_id')
+    and get the whole code back, then {'session_id', 'version', 'patch'} for
+    every edit, where patch is {'nodes': {'added', 'updated', 'removed'},
+    'edges': {...}} against that version. Only a line diff of the code,
+    [{'start', 'deleted', 'lines'}], is returned.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+
+    limits = engine_limits()
+    too_large = check_content_length(request, limits.max_body_bytes, 'code_session')
+    if too_large:
+        return too_large
+    timer = metrics.RequestTimer('code_session')
+    return timer.finish(code_session_body(request.body, limits, timer))
+
+
+def code_session_body(body, limits, timer):
+    try:
+        limits.check_body(len(body))
+        with timer.phase('decode'):
+            data = json.loads(body)
+        session_id = data.get('session_id')
+        patch = data.get('patch')
+
+        if session_id:
+            session = session_code_store.get(session_id)
+            if session is None:
+                return JsonResponse({'status': 'error', 'message': 'Unknown or expired session'}, status=404)
+        elif patch is not None:
+            return JsonResponse({'status': 'error', 'message': 'A patch needs a session_id'}, status=400)
+        else:
+            session = session_code_store.create()
+
+        with session.lock:
+            if patch is None:
+                nodes = data.get('nodes', [])
+                if not nodes:
+                    return JsonResponse({'status': 'error', 'message': 'No nodes provided'}, status=400)
+                metrics.observe('nodes', len(nodes), metrics.COUNT_BUCKETS, endpoint=timer.endpoint)
+                session.document = CodeDocument(nodes, data.get('edges', []), limits, timer)
+                return JsonResponse({
+                    'status': 'success',
+                    'session_id': session.id,
+                    'version': session.version,
+                    'code': session.document.code,
+                })
+
+            if session.document is None or data.get('version') != session.version:
+                # The client's graph is not the one the server has; it has to send the whole graph again
+                return JsonResponse({
+                    'status': 'error',
+                    'message': f"Version {data.get('version')} is not the latest",
+                    'version': session.version,
+                }, status=409)
+            try:
+                diff = session.document.apply(patch, timer)
+            except PatchError as e:
+                # Checked before anything changed, so the session is still good
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+            except Exception:
+                # The graph may be half updated; the client has to start again
+                session_code_store.discard(session.id)
+                raise
+            return JsonResponse({
+                'status': 'success',
+                'session_id': session.id,
+                'version': session.version,
+                'diff': diff,
+                'line_count': len(session.document.lines),
+            })
+
+    except LimitExceeded as e:
+        timer.error(e)
+        return limit_response(e)
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+@csrf_exempt
+def generate_flowchart_batch(request):
+    """
+    Convert many C sources in one request.
+    Expects {'files': {name: code, ...}} and returns a result (or error) per file.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+
+    max_body_bytes = getattr(settings, 'FLOWCHART_BATCH_MAX_BODY_BYTES', None)
+    too_large = check_content_length(request, max_body_bytes, 'generate_flowchart_batch')
+    if too_large:
+        return too_large
+    # Read the stream itself: request.body would stop at DATA_UPLOAD_MAX_MEMORY_SIZE,
+    # which stays at Django's default for every other endpoint
+    timer = metrics.RequestTimer('generate_flowchart_batch')
+    return timer.finish(convert_batch_body(request.read(), max_body_bytes, timer))
+
+
+def convert_batch_body(body, max_body_bytes, timer):
+    try:
+        metrics.observe('request_bytes', len(body), metrics.SIZE_BUCKETS, endpoint=timer.endpoint)
+        Limits(max_body_bytes=max_body_bytes).check_body(len(body))
+        with timer.phase('decode'):
+            data = json.loads(body)
+        files = data.get('files')
+        if not isinstance(files, dict) or not files:
+            return JsonResponse({'status': 'error', 'message': "'files' must map file names to code"}, status=400)
+
+        max_files = getattr(settings, 'FLOWCHART_BATCH_MAX_FILES', 500)
+        if len(files) > max_files:
+            return JsonResponse({'status': 'error', 'message': f'At most {max_files} files per batch'}, status=413)
+
+        # The process pool machinery is only imported for batches
+        from .batch import convert_batch
+
+        # Per-file limits are reported in that file's result, the batch itself succeeds
+        limits = engine_limits()
+        limits.max_body_bytes = None
+        with timer.phase('convert'):
+            results = convert_batch(files, limits)
+        for result in results.values():
+            if result.get('error') == 'limit_exceeded':
+                metrics.inc('limit_exceeded_total', limit=result['limit'])
+        with timer.phase('encode'):
+            return JsonResponse({'status': 'success', 'results': results})
+
+    except LimitExceeded as e:
+        timer.error(e)
+        return limit_response(e)
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+def project_summary(project):
+    return {
+        'id': str(project.id),
+        'owner': project.owner,
+        'name': project.name,
+        'revision': project.head.number if project.head else None,
+        'updated_at': project.updated_at.isoformat(),
+    }
+
+
+@csrf_exempt
+def projects(request):
+    """
+    GET ?owner=... lists an owner's projects, most recently updated first.
+    POST {'owner', 'name', 'nodes', 'edges', 'code'} saves a new project.
+    """
+    if request.method not in ('GET', 'POST'):
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    timer = metrics.RequestTimer('projects')
+    if request.method == 'GET':
+        return timer.finish(list_projects(request.GET.get('owner'), timer))
+    return timer.finish(create_project_body(request.body, timer))
+
+
+def list_projects(owner, timer):
+    if not owner:
+        return JsonResponse({'status': 'error', 'message': 'owner is required'}, status=400)
+    try:
+        with timer.phase('load'):
+            rows = Project.objects.filter(owner=owner).select_related('head').order_by('-updated_at')[:200]
+            return JsonResponse({'status': 'success', 'projects': [project_summary(p) for p in rows]})
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+def create_project_body(body, timer):
+    try:
+        with timer.phase('decode'):
+            data = json.loads(body)
+        owner = data.get('owner')
+        name = data.get('name', '')
+        nodes = data.get('nodes')
+        if not owner or not isinstance(owner, str) or not isinstance(nodes, list):
+            return JsonResponse({'status': 'error', 'message': "'owner' and 'nodes' are required"}, status=400)
+        if not isinstance(name, str):
+            return JsonResponse({'status': 'error', 'message': "'name' must be a string"}, status=400)
+        with timer.phase('save'):
+            project = create_project(owner, name, nodes, data.get('edges', []), data.get('code'))
+        return JsonResponse({'status': 'success', **project_summary(project)}, status=201)
+
+    except SaveError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+@csrf_exempt
+def project_detail(request, project_id):
+    """
+    Load a saved project: its head revision's source and flowchart, read with
+    one query. The stored graph is already JSON, so it is sent as it is.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    timer = metrics.RequestTimer('project_detail')
+    return timer.finish(project_detail_response(project_id, timer))
+
+
+def project_detail_response(project_id, timer):
+    try:
+        with timer.phase('load'):
+            project = load_project(project_id)
+            head = project.head
+            if head is None:
+                # Only possible for a project whose revisions were deleted, e.g. in the admin
+                return JsonResponse({'status': 'success', **project_summary(project), 'code': None, 'graph': None})
+            meta = {
+                'status': 'success',
+                **project_summary(project),
+                'code': read_blob(head.source).decode('utf8') if head.source_id else None,
+            }
+            graph = read_blob(head.graph)
+        content = json.dumps(meta)[:-1].encode('utf8') + b', "graph": ' + graph + b'}'
+        return HttpResponse(content, content_type='application/json')
+
+    except Project.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Unknown project'}, status=404)
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+@csrf_exempt
+def project_revisions(request, project_id):
+    """
+    Save a new revision. Send {'base_revision': n, 'patch': {'nodes': {'added',
+    'updated', 'removed'}, 'edges': {...}}} with the changes since revision n
+    (or full 'nodes' and 'edges'), and 'code' if the source changed. A save
+    based on an older revision than the latest is refused with 409.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    timer = metrics.RequestTimer('project_revisions')
+    return timer.finish(save_revision_body(request.body, project_id, timer))
+
+
+def save_revision_body(body, project_id, timer):
+    try:
+        with timer.phase('decode'):
+            data = json.loads(body)
+        base = data.get('base_revision')
+        patch = data.get('patch')
+        nodes = data.get('nodes')
+        if not isinstance(base, int) or (patch is None and nodes is None):
+            return JsonResponse(
+                {'status': 'error', 'message': "'base_revision' and a 'patch' (or 'nodes') are required"}, status=400)
+        if patch is not None and not isinstance(patch, dict):
+            return JsonResponse({'status': 'error', 'message': "'patch' must be an object"}, status=400)
+        with timer.phase('save'):
+            project = save_revision(project_id, base, patch, nodes, data.get('edges'), data.get('code'))
+        return JsonResponse({'status': 'success', **project_summary(project)})
+
+    except Project.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Unknown project'}, status=404)
+    except Conflict as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
+    except SaveError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except Exception as e:
+        timer.error(e)
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+async def offload(endpoint, func, *args):
+    """Run a conversion on the bounded executor, answering (and counting) 503 when it is saturated."""
+    try:
+        return await executor.run(func, *args)
+    except Saturated:
+        response = JsonResponse({'status': 'error', 'message': 'Server is busy, please retry'}, status=503)
+        response['Retry-After'] = str(getattr(settings, 'FLOWCHART_RETRY_AFTER', 1))
+        return metrics.RequestTimer(endpoint).finish(response)
+
+
+@csrf_exempt
+async def generate_code_from_flowchart_async(request):
+    """Async version of generate_code_from_flowchart for ASGI servers."""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    limits = engine_limits()
+    too_large = check_content_length(request, limits.max_body_bytes, 'generate_code_from_flowchart')
+    if too_large:
+        return too_large
+    return await offload('generate_code_from_flowchart', code_from_flowchart_response, request.body, False, limits)
+
+
+@csrf_exempt
+async def generate_flowchart_async(request):
+    """Async version of generate_flowchart for ASGI servers."""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    limits = engine_limits()
+    too_large = check_content_length(request, limits.max_body_bytes, 'generate_flowchart')
+    if too_large:
+        return too_large
+    wire_format = requested_format(request)
+    response = await offload('generate_flowchart', flowchart_response, request.body, wire_format, limits)
+    return gzip_compact(request, response, wire_format)
+
+
+def prometheus_metrics(request):
+    """Prometheus text exposition of the engine's histograms, counters and gauges."""
+    gauges = {}
+    for prefix, stats in (('parser_pool', parser_pool.stats()), ('flowchart_cache', flowchart_cache.stats()),
+                          ('function_cache', function_cache.stats()), ('source_cache', source_cache.stats()),
+                          ('executor', executor.stats())):
+        for name, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges[f'{prefix}_{name}'] = value
+    return HttpResponse(metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def engine_stats(request):
+    """Expose counters of the conversion engine (parser pool, result cache)."""
+    return JsonResponse({
+        'parser_pool': parser_pool.stats(),
+        'flowchart_cache': flowchart_cache.stats(),
+        'function_cache': function_cache.stats(),
+        'source_cache': source_cache.stats(),
+        'executor': executor.stats(),
+        'counters': metrics.snapshot(),
+    })
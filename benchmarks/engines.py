@@ -0,0 +1,157 @@
+"""
+Phase timings of both conversion engines.
+
+    python -m benchmarks.engines [--sizes 100 1000 10000] [--depth 4]
+        [--branch-density 0.1] [--loop-density 0.05] [--repeat 5]
+        [--save results.json] [--compare previous.json]
+
+For synthetic inputs of each size it times, separately:
+
+- parse: tree-sitter parsing of a generated C program;
+- walk: walk_ast turning the syntax tree into nodes and edges;
+- serialize: encoding the flowchart response as JSON;
+- codegen: what generate_code_from_flowchart does with a generated
+  react-flow graph (decode the body, index the graph, generate the code).
+
+Every phase reports the best and median of --repeat runs, and how its time
+grew against the previous size (1.0 is linear). --save writes the results as
+JSON; --compare prints the ratio of every timing to a saved run.
+"""
+import argparse
+import datetime
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+
+from engine.codegen import CodeGenerator
+from engine.flowchart import build_flowchart
+from engine.graph import FlowGraph
+from engine.parser_pool import pool
+
+from .generators import c_program, flowchart_graph
+
+PHASES = ('parse', 'walk', 'serialize', 'codegen')
+
+
+def measure(func, repeat):
+    """Run func repeat times; return its last result and the best and median times in seconds."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times), statistics.median(times)
+
+
+def generate_code(body):
+    data = json.loads(body)
+    graph = FlowGraph(data['nodes'], data['edges'])
+    return CodeGenerator(graph, graph.start_node()).generate()
+
+
+def run(sizes, depth, branch_density, loop_density, repeat):
+    results = []
+    shape = {'depth': depth, 'branch_density': branch_density, 'loop_density': loop_density}
+    with pool.checkout() as parser:
+        for size in sizes:
+            source = c_program(size, **shape).encode('utf8')
+            tree, *parse_times = measure(lambda: parser.parse(source), repeat)
+            (nodes, edges), *walk_times = measure(lambda: build_flowchart(tree.root_node, source), repeat)
+            _, *serialize_times = measure(
+                lambda: json.dumps({'status': 'success', 'nodes': nodes, 'edges': edges}), repeat)
+            graph = flowchart_graph(size, **shape)
+            body = json.dumps(graph)
+            _, *codegen_times = measure(lambda: generate_code(body), repeat)
+
+            timings = {'parse': parse_times, 'walk': walk_times, 'serialize': serialize_times, 'codegen': codegen_times}
+            for phase in PHASES:
+                best, median = timings[phase]
+                results.append({
+                    'phase': phase,
+                    'statements': size,
+                    **shape,
+                    'nodes': len(graph['nodes']) if phase == 'codegen' else len(nodes),
+                    'input_bytes': len(body) if phase == 'codegen' else len(source),
+                    'best_ms': round(best * 1000, 3),
+                    'median_ms': round(median * 1000, 3),
+                })
+    return results
+
+
+def growth(results):
+    """Scaling exponent of every result against the previous size of its phase."""
+    previous = {}
+    exponents = []
+    for row in results:
+        prev = previous.get(row['phase'])
+        exponent = None
+        if prev and row['statements'] > prev['statements'] and prev['best_ms'] > 0:
+            exponent = math.log(row['best_ms'] / prev['best_ms']) / math.log(row['statements'] / prev['statements'])
+        exponents.append(exponent)
+        previous[row['phase']] = row
+    return exponents
+
+
+def result_key(row):
+    return (row['phase'], row['statements'], row['depth'], row['branch_density'], row['loop_density'])
+
+
+def metadata(args):
+    try:
+        from importlib.metadata import version
+        tree_sitter = version('tree-sitter')
+    except Exception:
+        tree_sitter = None
+    return {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'tree_sitter': tree_sitter,
+        'repeat': args.repeat,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--branch-density', type=float, default=0.1)
+    parser.add_argument('--loop-density', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', metavar='PATH', help='write the results to PATH as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='compare with results saved by --save')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(sorted(args.sizes), args.depth, args.branch_density, args.loop_density, args.repeat)
+    report = {'meta': metadata(args), 'results': results}
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {result_key(row): row for row in json.load(f)['results']}
+
+    print(f"{'phase':>10} {'statements':>10} {'nodes':>7} {'best ms':>10} {'median ms':>10} {'growth':>7}"
+          + (f" {'vs saved':>9}" if baseline else ''))
+    for row, exponent in zip(results, growth(results)):
+        line = (f"{row['phase']:>10} {row['statements']:>10} {row['nodes']:>7} {row['best_ms']:>10} "
+                f"{row['median_ms']:>10} {'' if exponent is None else f'{exponent:.2f}':>7}")
+        if baseline:
+            old = baseline.get(result_key(row))
+            ratio = f"{row['best_ms'] / old['best_ms']:.2f}x" if old and old['best_ms'] else '-'
+            line += f' {ratio:>9}'
+        print(line)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
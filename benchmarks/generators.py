@@ -0,0 +1,150 @@
+"""
+Synthetic inputs for the conversion benchmarks.
+
+c_program writes a C program and flowchart_graph builds a react-flow graph
+(in the shape the frontend sends to generate-code-from-flowchart), both from
+the same knobs:
+
+- statements: number of simple statements;
+- depth: maximum nesting depth of if/else and loop blocks;
+- branch_density, loop_density: chance that a statement slot opens an
+  if/else or a loop instead, while the depth allows it.
+
+Both are seeded and built iteratively, so the same arguments always give the
+same input and very deep nesting works.
+"""
+import random
+
+# Chance that a block with at least one statement is closed at the next slot
+CLOSE_CHANCE = 0.25
+
+
+def _shape(statements, depth, branch_density, loop_density, seed):
+    """
+    Yield the structure of a program as a flat list of events: ('stmt', n),
+    ('open', kind), ('else', None) and ('close', kind). Every opened block
+    gets at least one statement and every block is closed.
+    """
+    rng = random.Random(seed)
+    stack = []  # [kind, statements so far, in else branch]
+    written = 0
+    while written < statements:
+        if stack and stack[-1][1] and rng.random() < CLOSE_CHANCE:
+            kind, _, in_else = stack[-1]
+            if kind == 'if' and not in_else and rng.random() < 0.5:
+                stack[-1][1:] = [0, True]
+                yield 'else', None
+            else:
+                stack.pop()
+                yield 'close', kind
+            continue
+        roll = rng.random()
+        if len(stack) < depth and roll < branch_density:
+            stack.append(['if', 0, False])
+            yield 'open', 'if'
+        elif len(stack) < depth and roll < branch_density + loop_density:
+            kind = rng.choice(('for', 'while'))
+            stack.append([kind, 0, False])
+            yield 'open', kind
+        else:
+            if stack:
+                stack[-1][1] += 1
+            yield 'stmt', written
+            written += 1
+    while stack:
+        kind = stack.pop()[0]
+        yield 'close', kind
+
+
+def c_program(statements, depth=4, branch_density=0.1, loop_density=0.05, seed=0):
+    """A C program with a main() of the given size and shape."""
+    lines = ['#include <stdio.h>', '', 'int main() {', '    int x = 0;']
+    level = 1
+    for kind, value in _shape(statements, depth, branch_density, loop_density, seed):
+        pad = '    ' * level
+        if kind == 'stmt':
+            if value % 3 == 0:
+                lines.append(f'{pad}printf("%d\\n", x);')
+            elif value % 3 == 1:
+                lines.append(f'{pad}int v{value} = x + {value};')
+            else:
+                lines.append(f'{pad}return x;' if value % 97 == 0 else f'{pad}x = x + {value};')
+        elif kind == 'open':
+            if value == 'if':
+                lines.append(f'{pad}if (x > {level}) {{')
+            elif value == 'for':
+                lines.append(f'{pad}for (int i{level} = 0; i{level} < 10; i{level}++) {{')
+            else:
+                lines.append(f'{pad}while (x < {level * 10}) {{')
+            level += 1
+        elif kind == 'else':
+            lines.append(f"{'    ' * (level - 1)}}} else {{")
+        else:
+            level -= 1
+            lines.append(f"{'    ' * level}}}")
+    lines += ['    return 0;', '}', '']
+    return '\n'.join(lines)
+
+
+def flowchart_graph(statements, depth=4, branch_density=0.1, loop_density=0.05, seed=0):
+    """A react-flow {'nodes': [...], 'edges': [...]} graph of the given size and shape."""
+    nodes = []
+    edges = []
+
+    def add_node(node_type, label, level):
+        node_id = f'node-{len(nodes) + 1}'
+        nodes.append({
+            'id': node_id,
+            'type': node_type,
+            'position': {'x': 350 + level * 250, 'y': 50 + len(nodes) * 120},
+            'data': {'label': label},
+        })
+        return node_id
+
+    def add_edge(tail, target):
+        source, label = tail
+        edges.append({
+            'id': f'e-{source}-{target}-{len(edges)}',
+            'source': source,
+            'target': target,
+            'label': label,
+            'type': 'smoothstep',
+        })
+
+    # The tail is the (node id, edge label) the next node is attached to
+    tail = (add_node('startEnd', 'Start', 0), '')
+    frames = []  # [kind, block node id, merge node id, tail to restore]
+    for kind, value in _shape(statements, depth, branch_density, loop_density, seed):
+        level = len(frames)
+        if kind == 'stmt':
+            node_id = add_node('inputOutput', f'x = x + {value};', level)
+            add_edge(tail, node_id)
+            tail = (node_id, '')
+        elif kind == 'open':
+            if value == 'for':
+                node_id = add_node('forLoop', f'int i{level} = 0; i{level} < 10; i{level}++', level)
+            else:
+                node_id = add_node('decision', f'x > {level}' if value == 'if' else f'x < {level * 10}', level)
+            add_edge(tail, node_id)
+            merge_id = add_node('inputOutput', '', level) if value == 'if' else None
+            frames.append([value, node_id, merge_id, False])
+            tail = (node_id, 'True')
+        elif kind == 'else':
+            _, node_id, merge_id, _ = frames[-1]
+            add_edge(tail, merge_id)
+            frames[-1][3] = True
+            tail = (node_id, 'False')
+        else:
+            block, node_id, merge_id, has_else = frames.pop()
+            if block == 'if':
+                add_edge(tail, merge_id)
+                if not has_else:
+                    add_edge((node_id, 'False'), merge_id)
+                tail = (merge_id, '')
+            else:
+                # Back edge to the loop header, which is left through False
+                add_edge(tail, node_id)
+                tail = (node_id, 'False')
+    end_id = add_node('startEnd', 'End', 0)
+    add_edge(tail, end_id)
+    return {'nodes': nodes, 'edges': edges}
@@ -0,0 +1,443 @@
+"""
+End-to-end load test of the app under different gunicorn worker models.
+
+    python -m benchmarks.loadtest [--models sync gthread asgi] [--workers 2]
+        [--threads 4] [--clients 8] [--duration 20] [--warmup 3]
+        [--sizes 10 100 1000] [--size-weights 6 3 1] [--code-share 0.3]
+        [--cache-hits] [--async-workers N] [--async-queue N]
+        [--save results.json] [--json]
+
+For every worker model a gunicorn server is started on a free local port,
+from the repository root so gunicorn.conf.py applies:
+
+- sync: visual_coder_backend.wsgi with sync workers;
+- gthread: visual_coder_backend.wsgi with gthread workers and --threads;
+- asgi: visual_coder_backend.asgi with uvicorn's UvicornWorker, against the
+  async/ endpoints. Their conversions run on the bounded executor of
+  api.offload, sized by --async-workers and --async-queue (default: the
+  settings), which answers 503 once it is full.
+
+--clients client processes then replay a seeded mix of generate-flowchart
+and generate-code-from-flowchart requests over keep-alive connections, each
+one sending its next request as soon as the last one is answered. Inputs come
+from benchmarks.generators at every size in --sizes, picked by --size-weights;
+--code-share of the requests go to generate-code-from-flowchart. Every
+generate-flowchart body gets a unique trailing comment so the result cache is
+missed, unless --cache-hits is given.
+
+After --warmup seconds that are not counted, requests are recorded for
+--duration seconds. Reported per model: throughput, p50/p95/p99 latency (in
+total and per endpoint and size), non-2xx responses (503 is the async
+executor turning work away) and the peak RSS and PSS of every worker, read
+from /proc. Nothing else is needed: no database server, no cache, no
+external load generator. Models whose server is not installed are skipped.
+
+The numbers only compare worker models for the machine and mix they were
+taken with: conversions are CPU-bound, so with fewer cores than workers the
+models mostly differ in per-request overhead, and the asgi model only sheds
+load when more requests are in flight than the executor admits.
+"""
+import argparse
+import datetime
+import http.client
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .generators import c_program, flowchart_graph
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODELS = {
+    'sync': {
+        'app': 'visual_coder_backend.wsgi:application',
+        'worker_class': 'sync',
+        'requires': 'gunicorn',
+        'paths': {'flowchart': '/api/generate-flowchart/', 'code': '/api/generate-code-from-flowchart/'},
+    },
+    'gthread': {
+        'app': 'visual_coder_backend.wsgi:application',
+        'worker_class': 'gthread',
+        'requires': 'gunicorn',
+        'paths': {'flowchart': '/api/generate-flowchart/', 'code': '/api/generate-code-from-flowchart/'},
+    },
+    'asgi': {
+        'app': 'visual_coder_backend.asgi:application',
+        'worker_class': 'uvicorn.workers.UvicornWorker',
+        'requires': 'uvicorn',
+        'paths': {'flowchart': '/api/async/generate-flowchart/', 'code': '/api/async/generate-code-from-flowchart/'},
+    },
+}
+
+HEADERS = {'Content-Type': 'application/json'}
+READY_TIMEOUT = 60
+RSS_INTERVAL = 0.25
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def build_requests(sizes, weights, code_share, seed=0):
+    """[(endpoint, statements, body, weight)] covering every size for both endpoints."""
+    requests = []
+    for size, weight in zip(sizes, weights):
+        source = c_program(size, seed=seed)
+        requests.append(('flowchart', size, json.dumps({'code': source}).encode('utf8'), weight * (1 - code_share)))
+        graph = flowchart_graph(size, seed=seed)
+        requests.append(('code', size, json.dumps(graph).encode('utf8'), weight * code_share))
+    return [request for request in requests if request[3] > 0]
+
+
+def unique_body(body, tag):
+    # The body ends with '"}': put a comment line at the end of the code string
+    return body[:-2] + f'\\n// {tag}'.encode('utf8') + body[-2:]
+
+
+def client(port, paths, requests, start, deadline, seed, cache_hits):
+    """Closed-loop client: [(endpoint, statements, status, seconds)] of the requests sent from start."""
+    rng = random.Random(seed)
+    weights = [request[3] for request in requests]
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    results = []
+    sent = 0
+    while True:
+        now = time.time()
+        if now >= deadline:
+            break
+        endpoint, size, body, _ = rng.choices(requests, weights)[0]
+        if endpoint == 'flowchart' and not cache_hits:
+            body = unique_body(body, f'{seed}-{sent}')
+        sent += 1
+        began = time.perf_counter()
+        try:
+            connection.request('POST', paths[endpoint], body, HEADERS)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            if response.will_close:
+                connection.close()
+        except (OSError, http.client.HTTPException):
+            status = 0
+            connection.close()
+        elapsed = time.perf_counter() - began
+        if now >= start:
+            results.append((endpoint, size, status, elapsed))
+    connection.close()
+    return results
+
+
+def _client(args):
+    return client(*args)
+
+
+def children(pid):
+    """Pids of the direct children of pid (the gunicorn workers of a master)."""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name is in parentheses and can contain spaces
+        if int(stat.rsplit(')', 1)[1].split()[1]) == pid:
+            pids.append(int(entry))
+    return pids
+
+
+def memory_kb(pid):
+    """(RSS, PSS) of a process in kB; PSS is None where smaps_rollup is not available."""
+    rss = pss = None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1])
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+class MemorySampler(threading.Thread):
+    """Peak RSS and PSS of every worker of a gunicorn master, sampled until stopped."""
+
+    def __init__(self, master):
+        super().__init__(daemon=True)
+        self.master = master
+        self.peaks = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            for pid in children(self.master):
+                rss, pss = memory_kb(pid)
+                if rss is None:
+                    continue
+                peak_rss, peak_pss = self.peaks.get(pid, (0, 0))
+                self.peaks[pid] = (max(peak_rss, rss), max(peak_pss, pss or 0))
+            self.stopped.wait(RSS_INTERVAL)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.peaks
+
+
+class Server:
+    """A gunicorn master serving one worker model on a free local port."""
+
+    def __init__(self, model, workers, threads, settings=None):
+        self.model = MODELS[model]
+        self.workers = workers
+        self.threads = threads
+        self.settings = settings or {}
+        self.port = free_port()
+        self.log = tempfile.TemporaryFile()
+        self.process = None
+
+    def __enter__(self):
+        env = {
+            **os.environ,
+            'PORT': str(self.port),
+            'WEB_CONCURRENCY': str(self.workers),
+            'GUNICORN_THREADS': str(self.threads),
+            'DJANGO_SETTINGS_MODULE': 'visual_coder_backend.settings',
+            **self.settings,
+        }
+        command = [
+            sys.executable, '-m', 'gunicorn', self.model['app'],
+            '--bind', f'127.0.0.1:{self.port}',
+            '--worker-class', self.model['worker_class'],
+            '--workers', str(self.workers),
+            '--threads', str(self.threads),
+            '--log-level', 'warning',
+        ]
+        self.process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        try:
+            self.wait_ready()
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def wait_ready(self):
+        deadline = time.time() + READY_TIMEOUT
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with {self.process.returncode}:\n{self.output()}')
+            # Ready once the master is listening and every worker has booted
+            if len(children(self.process.pid)) >= self.workers:
+                try:
+                    connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                    connection.request('GET', '/api/stats/')
+                    if connection.getresponse().status == 200:
+                        connection.close()
+                        return
+                except (OSError, http.client.HTTPException):
+                    pass
+            time.sleep(0.2)
+        raise RuntimeError(f'gunicorn was not ready after {READY_TIMEOUT}s:\n{self.output()}')
+
+    def output(self):
+        self.log.seek(0)
+        return self.log.read().decode('utf8', 'replace')
+
+    def __exit__(self, *exc):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.log.close()
+
+
+def percentiles(latencies):
+    """p50, p95 and p99 in milliseconds (nearest rank)."""
+    if not latencies:
+        return None, None, None
+    ordered = sorted(latencies)
+    return tuple(
+        round(ordered[min(len(ordered) - 1, max(0, -(-len(ordered) * p // 100) - 1))] * 1000, 2)
+        for p in (50, 95, 99)
+    )
+
+
+def summarize(results, duration):
+    latencies = [elapsed for *_, status, elapsed in results if 200 <= status < 300]
+    p50, p95, p99 = percentiles(latencies)
+    statuses = {}
+    for *_, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(results),
+        'errors': len(results) - len(latencies),
+        'statuses': statuses,
+        'throughput': round(len(latencies) / duration, 2),
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+    }
+
+
+def executor_settings(args):
+    """Environment overrides for the async executor of the server."""
+    settings = {}
+    if args.async_workers is not None:
+        settings['FLOWCHART_ASYNC_WORKERS'] = str(args.async_workers)
+    if args.async_queue is not None:
+        settings['FLOWCHART_ASYNC_QUEUE'] = str(args.async_queue)
+    return settings
+
+
+def run_model(name, args, requests):
+    model = MODELS[name]
+    threads = args.threads if name == 'gthread' else 1
+    with Server(name, args.workers, threads, executor_settings(args)) as server:
+        sampler = MemorySampler(server.process.pid)
+        sampler.start()
+        start = time.time() + args.warmup
+        deadline = start + args.duration
+        jobs = [
+            (server.port, model['paths'], requests, start, deadline, args.seed + index, args.cache_hits)
+            for index in range(args.clients)
+        ]
+        # Fork the clients before Django or the engine is imported here, so they stay small
+        with multiprocessing.get_context('fork').Pool(args.clients) as clients:
+            results = [row for rows in clients.map(_client, jobs) for row in rows]
+        peaks = sampler.stop()
+
+    by_input = {}
+    for row in results:
+        by_input.setdefault((row[0], row[1]), []).append(row)
+    return {
+        'model': name,
+        'workers': args.workers,
+        'threads': threads,
+        **summarize(results, args.duration),
+        'worker_memory_kb': [{'rss': rss, 'pss': pss or None} for rss, pss in sorted(peaks.values())],
+        'inputs': [
+            {'endpoint': endpoint, 'statements': size, **summarize(rows, args.duration)}
+            for (endpoint, size), rows in sorted(by_input.items())
+        ],
+    }
+
+
+def metadata(args):
+    try:
+        from importlib.metadata import version
+        servers = {name: version(name) for name in ('gunicorn', 'uvicorn') if importlib.util.find_spec(name)}
+    except Exception:
+        servers = {}
+    return {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'servers': servers,
+        'clients': args.clients,
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'sizes': args.sizes,
+        'size_weights': args.size_weights,
+        'code_share': args.code_share,
+        'cache_hits': args.cache_hits,
+        'async_workers': args.async_workers,
+        'async_queue': args.async_queue,
+    }
+
+
+def mb(kb):
+    return f'{kb / 1024:.0f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per gthread worker')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client connections')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of recorded load per model')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds of load before recording')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--size-weights', type=float, nargs='+', help='relative frequency of every size (default: smaller sizes more often)')
+    parser.add_argument('--code-share', type=float, default=0.3,
+                        help='fraction of requests sent to generate-code-from-flowchart')
+    parser.add_argument('--cache-hits', action='store_true', help='send repeated inputs that can hit the result cache')
+    parser.add_argument('--async-workers', type=int, help='conversion threads of the async executor (asgi)')
+    parser.add_argument('--async-queue', type=int, help='requests that may wait for an executor thread (asgi)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='PATH', help='write the results to PATH as JSON')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    if args.size_weights is None:
+        # Small programs are the common case
+        args.size_weights = [float(len(args.sizes) - index) ** 2 for index in range(len(args.sizes))]
+    if len(args.size_weights) != len(args.sizes):
+        parser.error('--size-weights needs one weight per size')
+    if not 0 <= args.code_share <= 1:
+        parser.error('--code-share must be between 0 and 1')
+
+    requests = build_requests(args.sizes, args.size_weights, args.code_share, args.seed)
+    results = []
+    skipped = {}
+    for name in args.models:
+        requires = MODELS[name]['requires']
+        if importlib.util.find_spec(requires) is None:
+            skipped[name] = f'{requires} is not installed'
+            continue
+        if not args.json:
+            print(f'{name}: {args.warmup + args.duration:.0f}s of load...', file=sys.stderr)
+        results.append(run_model(name, args, requests))
+
+    report = {'meta': metadata(args), 'results': results, 'skipped': skipped}
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'model':>8} {'workers':>8} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9}  worker RSS (PSS) MB")
+    for row in results:
+        memory = ' '.join(
+            mb(worker['rss']) + (f" ({mb(worker['pss'])})" if worker['pss'] else '')
+            for worker in row['worker_memory_kb']
+        )
+        workers = f"{row['workers']}x{row['threads']}"
+        print(f"{row['model']:>8} {workers:>8} {row['requests']:>9} {row['errors']:>7} {row['throughput']:>8} "
+              f"{row['p50_ms']!s:>9} {row['p95_ms']!s:>9} {row['p99_ms']!s:>9}  {memory}")
+    for row in results:
+        print(f"\n{row['model']}: {json.dumps(row['statuses'])}")
+        print(f"{'endpoint':>10} {'statements':>10} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} "
+              f"{'p95 ms':>9} {'p99 ms':>9}")
+        for line in row['inputs']:
+            print(f"{line['endpoint']:>10} {line['statements']:>10} {line['requests']:>9} {line['errors']:>7} "
+                  f"{line['throughput']:>8} {line['p50_ms']!s:>9} {line['p95_ms']!s:>9} {line['p99_ms']!s:>9}")
+    for name, reason in skipped.items():
+        print(f'\n{name}: skipped, {reason}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Payload size and serialization time of the flowchart wire formats.
+
+    python -m benchmarks.wire_format [--sizes 100 1000 10000] [--repeat 5]
+
+Builds flowcharts for synthetic programs of several sizes and, for the default
+JSON response and the compact columnar one, reports the payload size (plain and
+gzipped) and the time to serialize it.
+"""
+import argparse
+import gzip
+import json
+import time
+
+from engine.flowchart import build_flowchart
+from engine.parser_pool import pool
+from engine.wire import dumps, orjson, to_columnar
+
+
+def synthetic_program(statements):
+    body = []
+    for i in range(statements // 4):
+        body.append(f'    int v{i} = {i};\n')
+        body.append(f'    if (v{i} > 2) {{ printf("big %d", v{i}); }} else {{ printf("small"); }}\n')
+        body.append(f'    for (int j = 0; j < v{i}; j++) {{ printf("%d", j); }}\n')
+        body.append(f'    while (v{i} > 0) {{ v{i}--; }}\n')
+    return 'int main() {\n' + ''.join(body) + '    return 0;\n}\n'
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        source = synthetic_program(size).encode('utf8')
+        with pool.checkout() as parser:
+            tree = parser.parse(source)
+        nodes, edges = build_flowchart(tree.root_node, source)
+
+        formats = {
+            'json': lambda: json.dumps({'status': 'success', 'nodes': nodes, 'edges': edges}).encode('utf8'),
+            'compact': lambda: dumps(to_columnar(nodes, edges)),
+        }
+        for name, serialize in formats.items():
+            payload, seconds = timed(serialize, repeat)
+            results.append({
+                'statements': size,
+                'nodes': len(nodes),
+                'edges': len(edges),
+                'format': name,
+                'bytes': len(payload),
+                'gzip_bytes': len(gzip.compress(payload, compresslevel=6)),
+                'serialize_ms': round(seconds * 1000, 3),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"compact encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'statements':>10} {'nodes':>7} {'format':>8} {'bytes':>10} {'gzip':>9} {'ms':>9}")
+    for row in results:
+        print(f"{row['statements']:>10} {row['nodes']:>7} {row['format']:>8} {row['bytes']:>10} "
+              f"{row['gzip_bytes']:>9} {row['serialize_ms']:>9}")
+
+
+if __name__ == '__main__':
+    main()
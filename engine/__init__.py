@@ -0,0 +1,32 @@
+"""
+Django-free C <-> flowchart conversion engine.
+
+    from engine import code_to_flowchart, flowchart_to_code
+
+    nodes, edges = code_to_flowchart('int main() { return 0; }')
+    code = flowchart_to_code(nodes, edges)
+
+The api app wraps these in HTTP views; `python -m engine` converts whole
+directory trees from the command line.
+"""
+from .convert import (
+    LAYOUTS, NoStartNode, code_generator, code_outline, code_to_flowchart, convert_source, flowchart_to_code,
+)
+from .limits import UNLIMITED, LimitExceeded, Limits
+from .outline import UnknownFunction
+from .structuring import UnstructuredFlowchart
+
+__all__ = [
+    'LAYOUTS',
+    'UNLIMITED',
+    'LimitExceeded',
+    'Limits',
+    'NoStartNode',
+    'UnknownFunction',
+    'UnstructuredFlowchart',
+    'code_generator',
+    'code_outline',
+    'code_to_flowchart',
+    'convert_source',
+    'flowchart_to_code',
+]
@@ -0,0 +1,147 @@
+"""
+Bulk conversion of directory trees.
+
+Every .c file found under the inputs becomes a flowchart (.json) and every
+.json file (an exported {'nodes', 'edges'} graph) becomes C code (.c), at the
+same relative path under the output directory. Files are handed to a
+multiprocessing pool by path only: each worker memory-maps its input, so the
+parser and the walker read straight from the page cache, and writes its own
+output, so only a small status record travels back. Those records are
+yielded in completion order, so progress can be written out while the
+conversion runs and memory use does not grow with the size of the corpus.
+"""
+import mmap
+import multiprocessing
+import os
+import time
+from contextlib import contextmanager
+
+from .convert import code_to_flowchart, flowchart_to_code
+from .limits import UNLIMITED, LimitExceeded
+from .parser_pool import pool as parser_pool
+from .wire import dumps, loads, to_columnar
+
+SOURCE_SUFFIX = '.c'
+GRAPH_SUFFIX = '.json'
+
+
+@contextmanager
+def mapped(path):
+    """The content of path as a read-only mmap (or b'' for an empty file)."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield buffer
+        finally:
+            try:
+                buffer.close()
+            except BufferError:
+                # A slice of it is still referenced; it is unmapped once that is collected
+                pass
+
+
+def _walk(root, skip):
+    """(directory, name) of every file under root, in sorted order, not descending into skip."""
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories[:] = sorted(d for d in subdirectories if os.path.abspath(os.path.join(directory, d)) != skip)
+        for name in sorted(names):
+            yield directory, name
+
+
+def find_tasks(inputs, output, mode='auto'):
+    """
+    Yield (kind, path, relative path, output path) for every input file, where
+    kind is 'flowchart' (C source in) or 'code' (graph in). inputs may be
+    files or directories; directories are walked recursively in sorted order,
+    skipping the output directory if it lies inside one.
+    """
+    kinds = {SOURCE_SUFFIX: 'flowchart', GRAPH_SUFFIX: 'code'}
+    skip = os.path.abspath(output)
+    for root in inputs:
+        if os.path.isfile(root):
+            candidates = [(os.path.dirname(root), os.path.basename(root))]
+        else:
+            candidates = _walk(root, skip)
+        for directory, name in candidates:
+            suffix = os.path.splitext(name)[1]
+            kind = kinds.get(suffix)
+            if kind is None or (mode != 'auto' and kind != mode):
+                continue
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root) if os.path.isdir(root) else name
+            target_suffix = GRAPH_SUFFIX if kind == 'flowchart' else SOURCE_SUFFIX
+            yield kind, path, relative, os.path.join(output, os.path.splitext(relative)[0] + target_suffix)
+
+
+def _write(path, data):
+    """Write data next to path and move it into place, so outputs are never half written."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    partial = f'{path}.partial'
+    with open(partial, 'wb') as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+def convert_file(task):
+    """Convert one file; returns a status record. Runs in a pool worker."""
+    (kind, path, relative, target), options = task
+    limits = options.get('limits', UNLIMITED)
+    started = time.perf_counter()
+    record = {'input': relative, 'output': target, 'kind': kind}
+    if options.get('skip_existing') and _is_fresh(path, target):
+        record['status'] = 'skipped'
+        return record
+    try:
+        with mapped(path) as buffer:
+            if kind == 'flowchart':
+                nodes, edges = code_to_flowchart(
+                    buffer, options.get('layout', 'default'), limits, basic_blocks=options.get('basic_blocks', False))
+            else:
+                data = loads(buffer)
+                nodes, edges = data.get('nodes', []), data.get('edges', [])
+        if kind == 'flowchart':
+            if options.get('wire_format') == 'compact':
+                payload = dumps(to_columnar(nodes, edges))
+            else:
+                payload = dumps({'nodes': nodes, 'edges': edges})
+        else:
+            payload = flowchart_to_code(nodes, edges, limits).encode('utf8')
+        _write(target, payload)
+        record.update(status='success', nodes=len(nodes), edges=len(edges))
+    except LimitExceeded as e:
+        record.update(e.as_dict())
+    except Exception as e:
+        record.update(status='error', message=f'{type(e).__name__}: {e}')
+    record['ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return record
+
+
+def _is_fresh(path, target):
+    try:
+        return os.stat(target).st_mtime >= os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+
+
+def convert_tree(inputs, output, jobs=None, mode='auto', skip_existing=False, **options):
+    """
+    Convert every input file under inputs into output and yield a status
+    record per file as soon as it is done (in completion order). Options:
+    layout, wire_format ('json' or 'compact'), basic_blocks and
+    limits. With skip_existing, files whose output is newer than the input
+    are not converted again.
+    """
+    options['skip_existing'] = skip_existing
+    work = ((task, options) for task in find_tasks(inputs, output, mode))
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        yield from map(convert_file, work)
+        return
+    # Workers only hold their own parser, so forking is safe and cheaper than spawning
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    with context.Pool(jobs, initializer=parser_pool.warm) as pool:
+        yield from pool.imap_unordered(convert_file, work, chunksize=4)
@@ -0,0 +1,88 @@
+"""
+Command line bulk conversion.
+
+    python -m engine INPUT [INPUT ...] --output DIR [--jobs N]
+        [--mode auto|flowchart|code] [--layout default|layered] [--basic-blocks]
+        [--format json|compact] [--manifest PATH|-] [--skip-existing]
+        [--parse-timeout SECONDS] [--max-nodes N] [--max-edges N] [--max-depth N]
+
+C files become flowcharts (.json) and exported graphs (.json) become C code,
+see engine.bulk. With --manifest, one JSON status line per file is written
+(and flushed) as soon as the file is done.
+"""
+import argparse
+import json
+import sys
+import time
+
+from .bulk import convert_tree
+from .convert import LAYOUTS
+from .limits import Limits
+
+
+def add_arguments(parser):
+    parser.add_argument('inputs', nargs='+', metavar='INPUT', help='.c/.json files or directories to convert')
+    parser.add_argument('--output', '-o', required=True, help='directory the results are written to')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--mode', choices=('auto', 'flowchart', 'code'), default='auto',
+                        help="'flowchart' converts only .c files, 'code' only .json graphs")
+    parser.add_argument('--layout', choices=LAYOUTS, default='default')
+    parser.add_argument('--basic-blocks', action='store_true', help='merge straight-line statements into basic blocks')
+    parser.add_argument('--format', dest='wire_format', choices=('json', 'compact'), default='json')
+    parser.add_argument('--manifest', metavar='PATH', help="write a status line per file to PATH ('-' for stdout)")
+    parser.add_argument('--skip-existing', action='store_true', help='skip files whose output is up to date')
+    parser.add_argument('--parse-timeout', type=float, default=None, metavar='SECONDS')
+    parser.add_argument('--max-nodes', type=int, default=None)
+    parser.add_argument('--max-edges', type=int, default=None)
+    parser.add_argument('--max-depth', type=int, default=None)
+
+
+def execute(options, out=sys.stdout, limits=None):
+    """
+    Run a bulk conversion from parsed options (a dict) and print a summary to
+    out. Limit options that are given override the ones in limits. Returns
+    the number of files that failed.
+    """
+    limits = limits or Limits()
+    limits = Limits(
+        parse_timeout=options.get('parse_timeout') or limits.parse_timeout,
+        max_nodes=options.get('max_nodes') or limits.max_nodes,
+        max_edges=options.get('max_edges') or limits.max_edges,
+        max_depth=options.get('max_depth') or limits.max_depth,
+    )
+    manifest = None
+    if options.get('manifest') == '-':
+        manifest = out
+    elif options.get('manifest'):
+        manifest = open(options['manifest'], 'w')
+
+    counts = {}
+    started = time.perf_counter()
+    try:
+        records = convert_tree(
+            options['inputs'], options['output'], jobs=options.get('jobs'), mode=options.get('mode', 'auto'),
+            skip_existing=options.get('skip_existing', False), layout=options.get('layout', 'default'),
+            wire_format=options.get('wire_format', 'json'), basic_blocks=options.get('basic_blocks', False), limits=limits,
+        )
+        for record in records:
+            counts[record['status']] = counts.get(record['status'], 0) + 1
+            if manifest:
+                manifest.write(json.dumps(record) + '\n')
+                manifest.flush()
+    finally:
+        if manifest and manifest is not out:
+            manifest.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed else 0
+    summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items())) or 'no input files'
+    out.write(f'{total} file(s) in {elapsed:.2f}s ({rate:.0f}/s): {summary}\n')
+    return total - counts.get('success', 0) - counts.get('skipped', 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m engine', description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    failed = execute(vars(parser.parse_args(argv)))
+    return 1 if failed else 0
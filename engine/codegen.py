@@ -0,0 +1,312 @@
+"""
+Flowchart to C code generation.
+
+Code is written through a CodeEmitter, which tracks the indentation level and
+collects output in a list of chunks instead of growing one string, so
+generating a long program stays linear. Nested regions (branches and loop
+bodies) are not emitted recursively: like the flowchart walker, each region is
+a generator on an explicit stack that yields a request for a nested region. The
+driver hands out finished chunks between steps, so the code can be streamed to
+the client while it is being generated.
+"""
+from .limits import UNLIMITED, LimitExceeded
+from .structuring import ControlFlow, UnstructuredFlowchart, branches, cases, is_end, switch_expression
+
+HEADER = '#include <stdio.h>\n\nint main() {\n'
+FOOTER = '\n  return 0;\n}'
+
+
+def terminate(statement):
+    """statement, stripped, with a ';' unless it already ends a statement or block."""
+    statement = statement.strip()
+    if statement.endswith(';') or statement.endswith('{') or statement.endswith('}'):
+        return statement
+    return f"{statement};"
+
+
+class CodeEmitter:
+    """Indentation-aware writer that buffers output in chunks of about chunk_size characters."""
+
+    __slots__ = ('level', 'chunk_size', 'line_count', '_buffer', '_size', '_ready')
+
+    def __init__(self, level=0, chunk_size=16 * 1024):
+        self.level = level
+        self.chunk_size = chunk_size
+        self.line_count = 0  # lines written so far, i.e. the index of the next line
+        self._buffer = []
+        self._size = 0
+        self._ready = []
+
+    def write(self, text):
+        self.line_count += text.count('\n')
+        self._append(text)
+
+    def _append(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self._ready.append(''.join(self._buffer))
+            self._buffer = []
+            self._size = 0
+
+    def line(self, text):
+        self.line_count += 1
+        self._append(f"{'  ' * self.level}{text}\n")
+
+    def statement(self, label):
+        trimmed_label = label.strip()
+        if not trimmed_label:
+            return
+        if '\n' not in trimmed_label:
+            self.line(terminate(trimmed_label))
+            return
+        # A basic block (or a statement written over several lines): one line each, re-indented
+        lines = [line.strip() for line in trimmed_label.splitlines() if line.strip()]
+        lines[-1] = terminate(lines[-1])
+        for line in lines:
+            self.line(line)
+
+    def indent(self):
+        self.level += 1
+
+    def dedent(self):
+        self.level -= 1
+
+    @property
+    def has_chunks(self):
+        return bool(self._ready)
+
+    def drain(self):
+        """Return the finished chunks and forget them."""
+        chunks = self._ready
+        self._ready = []
+        return chunks
+
+    def flush(self):
+        """Return every chunk, including the unfinished one."""
+        if self._buffer:
+            self._ready.append(''.join(self._buffer))
+            self._buffer = []
+            self._size = 0
+        return self.drain()
+
+
+class CodeGenerator:
+    def __init__(self, graph, start_node, chunk_size=16 * 1024, limits=UNLIMITED, flow=None, record_statements=False):
+        self.graph = graph
+        self.limits = limits
+        self.start_node = start_node
+        # An editor session passes the analysis of the previous edit when the edges did not change
+        self.flow = flow or ControlFlow(graph, start_node)
+        self.out = CodeEmitter(level=1, chunk_size=chunk_size)
+        self.emitted = set()
+        # With record_statements, node id -> (first line, line count, indentation level) of every statement
+        self.statements = {} if record_statements else None
+
+    def iter_chunks(self):
+        """Generate the program, yielding chunks of code as soon as they are ready."""
+        out = self.out
+        out.write(HEADER)
+        max_depth = self.limits.max_depth
+        stack = [self._region(self.start_node.id, None)]
+        while stack:
+            try:
+                request = next(stack[-1])
+            except StopIteration:
+                stack.pop()
+                continue
+            if request is not None:
+                if max_depth is not None and len(stack) >= max_depth:
+                    raise LimitExceeded('max_depth', max_depth)
+                stack.append(self._region(*request))
+            if out.has_chunks:
+                yield from out.drain()
+        out.write(FOOTER)
+        yield from out.flush()
+
+    def generate(self):
+        return ''.join(self.iter_chunks())
+
+    def _statement(self, node):
+        out = self.out
+        if self.statements is None:
+            out.statement(node.label)
+            return
+        first_line = out.line_count
+        out.statement(node.label)
+        if out.line_count > first_line:
+            self.statements[node.id] = (first_line, out.line_count - first_line, out.level)
+
+    def _is_empty(self, node_id, stop_id, loop):
+        """Whether emitting the region from node_id to stop_id would write nothing"""
+        seen = set()
+        while node_id and node_id != stop_id and node_id not in seen:
+            if loop and node_id in loop:
+                return False
+            node = self.graph.node(node_id)
+            if not node or is_end(node) or node_id in self.emitted:
+                return True
+            seen.add(node_id)
+            if node.type == 'startEnd' and node.label.lower() == 'start':
+                pass
+            elif node.type in ('forLoop', 'decision') or self.flow.is_loop_header(node_id) or node.label.strip():
+                return False
+            node_id = node.next_id()
+        return True
+
+    def _loop_statement(self, header):
+        """Emit a loop whose header is a plain statement: do-while if a decision closes it, else while (1)"""
+        graph = self.graph
+        out = self.out
+        latches = self.flow.back_edges[header.id]
+        latch = graph.node(latches[0]) if len(latches) == 1 else None
+        if latch and latch is not header and latch.type == 'decision':
+            true_edge, false_edge = branches(latch)
+            if true_edge and true_edge.target == header.id:
+                condition, exit_edge = latch.label, false_edge
+            elif false_edge and false_edge.target == header.id:
+                condition, exit_edge = f"!({latch.label})", true_edge
+            else:
+                latch = None
+        else:
+            latch = None
+
+        if latch:
+            exit_id = exit_edge.target if exit_edge else None
+            self.emitted.add(latch.id)
+            out.line('do {')
+            out.indent()
+            self._statement(header)
+            yield (header.next_id(), latch.id, (latch.id, exit_id))
+            out.dedent()
+            out.line(f"}} while ({condition});")
+            return exit_id
+
+        # Exit through the first edge that leaves the loop body, if there is one
+        loop_body = self.flow.loop_body(header.id)
+        exit_id = None
+        for body_id in loop_body:
+            for edge in graph.node(body_id).out:
+                if edge.target not in loop_body:
+                    exit_id = edge.target
+                    break
+            if exit_id:
+                break
+        out.line('while (1) {')
+        out.indent()
+        self._statement(header)
+        yield (header.next_id(), header.id, (header.id, exit_id))
+        out.dedent()
+        out.line('}')
+        return exit_id
+
+    def _block(self, keyword, condition, region):
+        """Emit keyword (condition) { region } where region is a nested region request"""
+        out = self.out
+        out.line(f"{keyword} ({condition}) {{")
+        if region:
+            out.indent()
+            yield region
+            out.dedent()
+        out.line('}')
+
+    def _switch(self, node, loop):
+        """Emit a multi-way decision as a switch, one case per target, and return where the cases merge"""
+        out = self.out
+        if self.flow.is_loop_header(node.id):
+            raise UnstructuredFlowchart(f'Decision "{node.label}" has {len(node.out)} branches and starts a loop')
+        merge_node_id = self.flow.merge_point(node.id)
+        case_loop = (loop[0], loop[1], 'switch') if loop else None
+        out.line(f"switch {switch_expression(node)} {{")
+        out.indent()
+        for labels, target_id in cases(node):
+            for label in labels:
+                out.line(f"{label}:")
+            out.indent()
+            if not self._is_empty(target_id, merge_node_id, case_loop):
+                yield (target_id, merge_node_id, case_loop)
+            out.line('break;')
+            out.dedent()
+        out.dedent()
+        out.line('}')
+        return merge_node_id
+
+    def _region(self, node_id, stop_id, loop=None):
+        """
+        Emit structured code from node_id until stop_id or an End node is reached.
+        loop is the (continue_id, break_id) pair of the innermost enclosing loop,
+        with a third item inside a switch, where break cannot leave the loop.
+        Nested regions are requested by yielding their (node_id, stop_id, loop).
+        """
+        graph = self.graph
+        flow = self.flow
+        out = self.out
+        while node_id and node_id != stop_id:
+            if loop and node_id == loop[0]:
+                out.line('continue;')
+                return
+            if loop and node_id == loop[1]:
+                if len(loop) > 2:
+                    raise UnstructuredFlowchart('A switch case cannot leave the loop around the switch')
+                out.line('break;')
+                return
+
+            node = graph.node(node_id)
+            if not node or is_end(node) or node_id in self.emitted:
+                return
+            self.emitted.add(node_id)
+
+            if node.type == 'startEnd' and node.label.lower() == 'start':
+                node_id = node.next_id()
+
+            elif node.type == 'forLoop':
+                true_edge, false_edge = branches(node)
+                exit_id = false_edge.target if false_edge else None
+                body = (true_edge.target, node.id, (node.id, exit_id)) if true_edge else None
+                yield from self._block('for', node.label, body)
+                node_id = exit_id
+
+            elif switch_expression(node) is not None:
+                node_id = yield from self._switch(node, loop)
+
+            elif node.type == 'decision' and flow.is_loop_header(node.id):
+                # Handle while loop; the branch that stays inside the loop is the body
+                true_edge, false_edge = branches(node)
+                loop_body = flow.loop_body(node.id)
+                condition = node.label
+                if false_edge and false_edge.target in loop_body and not (true_edge and true_edge.target in loop_body):
+                    condition = f"!({node.label})"
+                    true_edge, false_edge = false_edge, true_edge
+                exit_id = false_edge.target if false_edge else None
+                body = (true_edge.target, node.id, (node.id, exit_id)) if true_edge else None
+                yield from self._block('while', condition, body)
+                node_id = exit_id
+
+            elif node.type == 'decision':
+                # Handle if-else; both branches end where they merge again
+                true_edge, false_edge = branches(node)
+                merge_node_id = flow.merge_point(node.id)
+                true_empty = not true_edge or self._is_empty(true_edge.target, merge_node_id, loop)
+                false_empty = not false_edge or self._is_empty(false_edge.target, merge_node_id, loop)
+                if true_empty and not false_empty:
+                    yield from self._block('if', f"!({node.label})", (false_edge.target, merge_node_id, loop))
+                else:
+                    true_branch = (true_edge.target, merge_node_id, loop) if true_edge else None
+                    yield from self._block('if', node.label, true_branch)
+                    if not false_empty:
+                        out.line('else {')
+                        out.indent()
+                        yield (false_edge.target, merge_node_id, loop)
+                        out.dedent()
+                        out.line('}')
+                node_id = merge_node_id
+
+            elif flow.is_loop_header(node.id):
+                node_id = yield from self._loop_statement(node)
+
+            else:
+                self._statement(node)
+                node_id = node.next_id()
+                if out.has_chunks:
+                    # Let the driver pass finished chunks on during long straight runs
+                    yield None
@@ -0,0 +1,112 @@
+"""
+Basic-block compaction of a flowchart.
+
+The walker makes one node per statement and an empty inputOutput node where
+branches merge again. compact_flowchart shrinks that graph in two linear
+passes over the nodes and edges:
+
+* merge nodes that do nothing (an empty inputOutput node with one unlabelled
+  out-edge) are dropped, and the edges into them are pointed at their
+  successor, labels kept;
+* every maximal straight-line run of statements (inputOutput nodes joined by
+  unlabelled edges, where each one after the first has no other way in)
+  becomes a single node whose label holds the statements one per line.
+
+Loop headers, branch targets and decisions are left alone, so the graph still
+has the same control flow and generates the same code.
+"""
+from .codegen import terminate
+
+STATEMENT = 'inputOutput'
+
+
+def _label(node):
+    return (node.get('data') or {}).get('label') or ''
+
+
+def compact_flowchart(nodes, edges):
+    """Compact the walker's (nodes, edges) lists in place and return them."""
+    by_id = {node['id']: node for node in nodes}
+    out_edges = {}
+    for edge in edges:
+        out_edges.setdefault(edge['source'], []).append(edge)
+
+    # Empty statement nodes with a single plain way out can be bypassed
+    bypass = {}
+    for node in nodes:
+        if node.get('type') != STATEMENT or _label(node).strip():
+            continue
+        outgoing = out_edges.get(node['id'], [])
+        if len(outgoing) == 1 and not outgoing[0].get('label') and outgoing[0]['target'] != node['id']:
+            bypass[node['id']] = outgoing[0]['target']
+
+    def resolve(node_id):
+        # Follow chains of empty nodes; a cycle of them (and the way into it) is kept
+        path = []
+        seen = set()
+        while node_id in bypass:
+            if node_id in seen:
+                for passed in path:
+                    bypass.pop(passed, None)
+                return path[0]
+            path.append(node_id)
+            seen.add(node_id)
+            node_id = bypass[node_id]
+        for passed in path:
+            bypass[passed] = node_id
+        return node_id
+
+    removed = set()
+    for node_id in list(bypass):
+        if resolve(node_id) != node_id:
+            removed.add(node_id)
+    kept_edges = []
+    for edge in edges:
+        if edge['source'] in removed:
+            continue
+        edge['target'] = resolve(edge['target'])
+        kept_edges.append(edge)
+
+    in_degree = {}
+    out_edges = {}
+    for edge in kept_edges:
+        in_degree[edge['target']] = in_degree.get(edge['target'], 0) + 1
+        out_edges.setdefault(edge['source'], []).append(edge)
+
+    def next_in_block(node_id):
+        """The statement that continues node_id's basic block, if there is one."""
+        outgoing = out_edges.get(node_id, [])
+        if len(outgoing) != 1 or outgoing[0].get('label'):
+            return None
+        target = outgoing[0]['target']
+        successor = by_id.get(target)
+        if (successor is None or target == node_id or successor.get('type') != STATEMENT
+                or in_degree.get(target) != 1 or not _label(successor).strip()):
+            return None
+        return successor
+
+    absorbed = set(removed)
+    for node in nodes:
+        node_id = node['id']
+        if node_id in absorbed or node.get('type') != STATEMENT or not _label(node).strip():
+            continue
+        successor = next_in_block(node_id)
+        if successor is None:
+            continue
+        lines = [terminate(_label(node))]
+        while successor is not None and successor['id'] not in absorbed and successor['id'] != node_id:
+            absorbed.add(successor['id'])
+            lines.append(terminate(_label(successor)))
+            last_id = successor['id']
+            successor = next_in_block(last_id)
+        # The block leaves through the last statement's edges
+        joining = out_edges[node_id][0]
+        out_edges[node_id] = out_edges.pop(last_id, [])
+        for edge in out_edges[node_id]:
+            edge['source'] = node_id
+        joining['target'] = None
+        node['data'] = {**node['data'], 'label': '\n'.join(lines)}
+
+    nodes[:] = [node for node in nodes if node['id'] not in absorbed]
+    edges[:] = [edge for edge in kept_edges if edge['target'] is not None and edge['source'] not in absorbed]
+    return nodes, edges
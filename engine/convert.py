@@ -0,0 +1,100 @@
+"""
+One-call conversions in both directions.
+
+Each takes optional Limits and an optional timer: any object with a
+phase(name) context manager (the api app passes its RequestTimer), so callers
+can see where the time goes without the engine knowing about them.
+"""
+from contextlib import nullcontext
+
+from .codegen import CodeGenerator
+from .compact import compact_flowchart
+from .flowchart import build_flowchart
+from .graph import FlowGraph
+from .limits import UNLIMITED, LimitExceeded, parse
+from .outline import function_outline
+from .parser_pool import pool as parser_pool
+
+# 'default' keeps the walker's positions, 'layered' computes a layered layout
+LAYOUTS = ('default', 'layered')
+
+
+class NoStartNode(ValueError):
+    def __init__(self):
+        super().__init__('"Start" node not found!')
+
+
+class _NoTimer:
+    def phase(self, name):
+        return nullcontext()
+
+
+NO_TIMER = _NoTimer()
+
+
+def code_to_flowchart(source, layout='default', limits=UNLIMITED, timer=NO_TIMER, basic_blocks=False, function=None):
+    """
+    Convert C source (str, bytes or any buffer, e.g. an mmap) to react-flow
+    (nodes, edges) lists, of main() or of the function named function. With
+    basic_blocks, straight-line statements are merged into basic-block nodes and
+    empty merge nodes are dropped.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f'Unknown layout: {layout}')
+    if isinstance(source, str):
+        source = bytes(source, 'utf8')
+    with timer.phase('parse'), parser_pool.checkout() as parser:
+        tree = parse(parser, source, limits)
+    with timer.phase('walk'):
+        nodes, edges = build_flowchart(tree.root_node, source, limits, function)
+    if basic_blocks:
+        with timer.phase('blocks'):
+            compact_flowchart(nodes, edges)
+    if layout == 'layered':
+        # NumPy is only imported once a layered layout is asked for (or at warm-up)
+        from .layout import layered_layout
+        with timer.phase('layout'):
+            layered_layout(nodes, edges)
+    return nodes, edges
+
+
+def code_outline(source, limits=UNLIMITED, timer=NO_TIMER):
+    """The function outline (see engine.outline) of C source, without walking any function body."""
+    if isinstance(source, str):
+        source = bytes(source, 'utf8')
+    with timer.phase('parse'), parser_pool.checkout() as parser:
+        tree = parse(parser, source, limits)
+    with timer.phase('outline'):
+        return function_outline(tree.root_node, source)
+
+
+def code_generator(nodes, edges, limits=UNLIMITED, timer=NO_TIMER, chunk_size=16 * 1024):
+    """A CodeGenerator for react-flow nodes and edges, to generate or stream the code from."""
+    limits.check_graph(nodes, edges)
+    with timer.phase('index'):
+        graph = FlowGraph(nodes, edges)
+    start_node = graph.start_node()
+    if not start_node:
+        raise NoStartNode()
+    with timer.phase('structure'):
+        return CodeGenerator(graph, start_node, chunk_size, limits)
+
+
+def flowchart_to_code(nodes, edges, limits=UNLIMITED, timer=NO_TIMER):
+    """Generate the C program of react-flow nodes and edges."""
+    generator = code_generator(nodes, edges, limits, timer)
+    with timer.phase('codegen'):
+        return generator.generate()
+
+
+def convert_source(code, limits=UNLIMITED):
+    """Convert one C source to a result dict; errors are reported, not raised."""
+    if not isinstance(code, str) or not code:
+        return {'status': 'error', 'message': 'Code cannot be empty'}
+    try:
+        nodes, edges = code_to_flowchart(code, limits=limits)
+        return {'status': 'success', 'nodes': nodes, 'edges': edges}
+    except LimitExceeded as e:
+        return e.as_dict()
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}
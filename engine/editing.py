@@ -0,0 +1,298 @@
+"""
+Flowchart-to-code regeneration for an editor that sends its edits as patches.
+
+A CodeDocument keeps the indexed FlowGraph of one flowchart, its control-flow
+analysis and the lines of the code generated from it. A patch has the shape
+of a project save, {'nodes': {'added', 'updated', 'removed'}, 'edges':
+{...}}, and is applied to the indexes in place instead of building them again
+from the whole graph. The caller gets a line diff to apply instead of the
+whole program.
+
+A patch that only relabels statements, the common edit, cannot change the
+structure of the code: the lines of those statements are written again and
+spliced in, and nothing else is generated. Any other patch emits the whole
+program again, which is one linear pass, and diffs it against the previous
+lines; the control-flow analysis is still reused unless the patch can change
+it (an edge changed, or a label became or stopped being Start or End).
+"""
+from difflib import SequenceMatcher
+
+from .codegen import CodeEmitter, CodeGenerator
+from .convert import NO_TIMER, NoStartNode
+from .graph import TERMINALS, FlowGraph
+from .limits import UNLIMITED, LimitExceeded
+from .structuring import UnstructuredFlowchart
+
+# Changed regions longer than this are sent as one replacement instead of being diffed
+MAX_DIFF_LINES = 4000
+
+
+class PatchError(ValueError):
+    pass
+
+
+def line_diff(old, new, max_lines=MAX_DIFF_LINES):
+    """
+    Hunks that turn the lines old into new, as [{'start', 'deleted', 'lines'}]:
+    replace `deleted` lines of old from index `start` with `lines`. Hunks are
+    in order and do not overlap; apply them from the last one back.
+    """
+    # Edits are local, so most of the program is a common prefix and suffix
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    old_middle = old[prefix:len(old) - suffix]
+    new_middle = new[prefix:len(new) - suffix]
+    if not old_middle and not new_middle:
+        return []
+    if len(old_middle) + len(new_middle) > max_lines:
+        return [{'start': prefix, 'deleted': len(old_middle), 'lines': new_middle}]
+    matcher = SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+    return [
+        {'start': prefix + i1, 'deleted': i2 - i1, 'lines': new_middle[j1:j2]}
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def _part(patch, kind):
+    part = patch.get(kind) or {}
+    if not isinstance(part, dict):
+        raise PatchError(f"'{kind}' patch must be an object")
+    lists = []
+    for action in ('removed', 'updated', 'added'):
+        items = part.get(action) or []
+        if not isinstance(items, list):
+            raise PatchError(f"'{kind}.{action}' must be a list")
+        lists.append(items)
+    return lists
+
+
+class _LineShifts:
+    """Fenwick tree of the lines each statement gained or lost since the code was generated."""
+
+    __slots__ = ('tree',)
+
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, index, delta):
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def before(self, index):
+        """Total shift of the statements before the index-th one."""
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+class CodeDocument:
+    def __init__(self, nodes, edges, limits=UNLIMITED, timer=NO_TIMER):
+        limits.check_graph(nodes, edges)
+        self.limits = limits
+        with timer.phase('index'):
+            self.graph = FlowGraph(nodes, edges)
+        self.flow = None
+        self.version = 1
+        self.lines = self._generate(timer)
+
+    @property
+    def code(self):
+        return '\n'.join(self.lines)
+
+    def _generate(self, timer):
+        # No statement can be spliced into an error message
+        self._index_statements({})
+        start_node = self.graph.start_node()
+        if start_node is None:
+            self.flow = None
+            return [f'// Error: {NoStartNode()}']
+        if self.flow is not None and self.flow.start is not start_node:
+            self.flow = None
+        with timer.phase('structure'):
+            generator = CodeGenerator(
+                self.graph, start_node, limits=self.limits, flow=self.flow, record_statements=True)
+        self.flow = generator.flow
+        with timer.phase('codegen'):
+            try:
+                lines = generator.generate().split('\n')
+            except UnstructuredFlowchart as e:
+                return [f'// Error: {e}']
+        self._index_statements(generator.statements)
+        return lines
+
+    def _index_statements(self, statements):
+        # node id -> [statement number, first line as generated, line count, level], in line order
+        self._statements = {
+            node_id: [number, *statement] for number, (node_id, statement) in enumerate(statements.items())
+        }
+        self._shifts = _LineShifts(len(statements))
+
+    def _relabelled(self, node_changes, edge_changes):
+        """
+        {node id: label} if the patch only relabels statements that were
+        written, so their lines can be spliced; else None.
+        """
+        removed_nodes, updated_nodes, added_nodes = node_changes
+        if removed_nodes or added_nodes or any(edge_changes):
+            return None
+        labels = {}
+        for raw in updated_nodes:
+            node = self.graph.index[raw['id']]
+            label = (raw.get('data') or {}).get('label') or ''
+            # An empty statement can make a branch empty, a Start or End label moves the program's ends
+            if (node.id not in self._statements or raw.get('type', '') != node.type or not label.strip()
+                    or label.lower() in TERMINALS or node.label.lower() in TERMINALS):
+                return None
+            labels[node.id] = label
+        return labels
+
+    def _splice(self, labels):
+        """Write the statements of labels again and splice them into the lines; returns the hunks."""
+        emitter = CodeEmitter()
+        hunks = []
+        for node_id, label in sorted(labels.items(), key=lambda item: self._statements[item[0]][0]):
+            number, first_line, count, level = self._statements[node_id]
+            emitter.level = level
+            emitter.statement(label)
+            lines = ''.join(emitter.flush()).split('\n')[:-1]
+            start = first_line + self._shifts.before(number)
+            if lines != self.lines[start:start + count]:
+                hunks.append((node_id, {'start': start, 'deleted': count, 'lines': lines}))
+        # Hunks refer to the old lines, so the last one goes in first
+        for node_id, hunk in reversed(hunks):
+            self.lines[hunk['start']:hunk['start'] + hunk['deleted']] = hunk['lines']
+            statement = self._statements[node_id]
+            self._shifts.add(statement[0], len(hunk['lines']) - statement[2])
+            statement[2] = len(hunk['lines'])
+        return [hunk for _, hunk in hunks]
+
+    def apply(self, patch, timer=NO_TIMER):
+        """
+        Apply a patch, update the code and return the line diff against the
+        previous code. A patch that does not fit the graph raises PatchError
+        and leaves the document as it was.
+        """
+        if not isinstance(patch, dict):
+            raise PatchError('Patch must be an object')
+        with timer.phase('patch'):
+            node_changes = _part(patch, 'nodes')
+            edge_changes = _part(patch, 'edges')
+            self._check(node_changes, edge_changes)
+            labels = self._relabelled(node_changes, edge_changes)
+            if self._apply(node_changes, edge_changes):
+                self.flow = None
+        if labels is not None:
+            with timer.phase('splice'):
+                hunks = self._splice(labels)
+            self.version += 1
+            return hunks
+        lines = self._generate(timer)
+        with timer.phase('diff'):
+            hunks = line_diff(self.lines, lines)
+        self.lines = lines
+        self.version += 1
+        return hunks
+
+    def _check(self, node_changes, edge_changes):
+        """Refuse a patch that does not apply cleanly, before anything is changed."""
+        graph = self.graph
+        removed_nodes, updated_nodes, added_nodes = node_changes
+        removed_edges, updated_edges, added_edges = edge_changes
+
+        node_ids = set()
+        for node_id in removed_nodes:
+            if node_id not in graph.index or node_id in node_ids:
+                raise PatchError(f"Cannot remove unknown node {node_id}")
+            node_ids.add(node_id)
+        for raw in updated_nodes:
+            if not isinstance(raw, dict) or raw.get('id') not in graph.index or raw['id'] in node_ids:
+                raise PatchError(f"Cannot update unknown node {raw.get('id') if isinstance(raw, dict) else raw}")
+        gone_nodes = node_ids
+        node_ids = set()
+        for raw in added_nodes:
+            if not isinstance(raw, dict) or not raw.get('id'):
+                raise PatchError("Every added node needs an id")
+            if (raw['id'] in graph.index and raw['id'] not in gone_nodes) or raw['id'] in node_ids:
+                raise PatchError(f"Cannot add existing node {raw['id']}")
+            node_ids.add(raw['id'])
+        new_nodes = node_ids
+
+        def exists(node_id):
+            return node_id in new_nodes or (node_id in graph.index and node_id not in gone_nodes)
+
+        gone_edges = set()
+        for edge_id in removed_edges:
+            if edge_id not in graph.edges or edge_id in gone_edges:
+                raise PatchError(f"Cannot remove unknown edge {edge_id}")
+            gone_edges.add(edge_id)
+        edge_ids = set()
+        for raw in updated_edges:
+            if not isinstance(raw, dict) or raw.get('id') not in graph.edges or raw['id'] in gone_edges:
+                raise PatchError(f"Cannot update unknown edge {raw.get('id') if isinstance(raw, dict) else raw}")
+            edge_ids.add(raw['id'])
+        for raw in added_edges:
+            if not isinstance(raw, dict) or not raw.get('id'):
+                raise PatchError("Every added edge needs an id")
+            if (raw['id'] in graph.edges and raw['id'] not in gone_edges) or raw['id'] in edge_ids:
+                raise PatchError(f"Cannot add existing edge {raw['id']}")
+            edge_ids.add(raw['id'])
+        edge_ids |= gone_edges
+        for raw in updated_edges + added_edges:
+            if not exists(raw.get('source')) or not exists(raw.get('target')):
+                raise PatchError(f"Edge {raw['id']} points to a missing node")
+        # Edges the patch leaves alone must not lose a node either
+        for node_id in gone_nodes:
+            node = graph.index[node_id]
+            for edge in node.out + node.incoming:
+                if edge.id is None or edge.id not in edge_ids:
+                    raise PatchError(f"Edge {edge.id} points to a missing node")
+
+        limits = self.limits
+        node_count = len(graph.index) - len(gone_nodes) + len(new_nodes)
+        edge_count = len(graph.edges) - len(gone_edges) + len(added_edges)
+        if limits.max_nodes is not None and node_count > limits.max_nodes:
+            raise LimitExceeded('max_nodes', limits.max_nodes, status=413)
+        if limits.max_edges is not None and edge_count > limits.max_edges:
+            raise LimitExceeded('max_edges', limits.max_edges, status=413)
+
+    def _apply(self, node_changes, edge_changes):
+        """Apply a checked patch to the graph; returns whether the control flow can have changed."""
+        graph = self.graph
+        removed_nodes, updated_nodes, added_nodes = node_changes
+        removed_edges, updated_edges, added_edges = edge_changes
+        changed = bool(removed_edges or added_edges)
+        for edge_id in removed_edges:
+            graph.remove_edge(edge_id)
+        for node_id in removed_nodes:
+            changed = changed or graph.index[node_id].label.lower() in TERMINALS
+            graph.remove_node(node_id)
+        for raw in updated_nodes:
+            changed = graph.update_node(raw) or changed
+        for raw in added_nodes:
+            node = graph.add_node(raw)
+            changed = changed or node.label.lower() in TERMINALS
+        # A node removed and added again is a new FlowNode, so its edges are linked again
+        readded = set(removed_nodes).intersection(raw['id'] for raw in added_nodes)
+        changed = changed or bool(readded)
+        for raw in updated_edges:
+            edge = graph.edges[raw['id']]
+            before = (edge.source, edge.target, edge.label)
+            if edge.source in readded or edge.target in readded:
+                graph.remove_edge(edge.id)
+                graph.add_edge(raw)
+            else:
+                graph.update_edge(raw)
+            changed = changed or before != (raw['source'], raw['target'], raw.get('label') or '')
+        for raw in added_edges:
+            graph.add_edge(raw)
+        return changed
@@ -0,0 +1,451 @@
+"""
+C code to react-flow flowchart conversion.
+
+All mutable state of one conversion (id allocation, the running y position,
+the node and edge buffers) lives on a FlowchartBuilder, so concurrent
+conversions in threaded or async workers never share anything.
+
+The walk is a generator of ('node', ...) and ('edge', ...) events, so a
+caller can either collect the whole flowchart (build) or stream it out as it
+is produced (events) without holding it in memory.
+"""
+from .limits import UNLIMITED, LimitExceeded
+from .outline import UnknownFunction, find_function
+
+# Nested walks that are hash-consed: the blocks that hold statement runs
+BLOCK_TYPES = frozenset(('compound_statement', 'else_clause', 'case_statement', 'default_statement'))
+
+
+def named_children(node):
+    """Iterate the named children of a node with a TreeCursor, without building a list."""
+    cursor = node.walk()
+    if not cursor.goto_first_child():
+        return
+    while True:
+        if cursor.node.is_named:
+            yield cursor.node
+        if not cursor.goto_next_sibling():
+            return
+
+
+class FlowchartBuilder:
+    def __init__(self, source, limits=UNLIMITED):
+        # Labels are sliced out of this one buffer and decoded only for emitted nodes
+        self.source = memoryview(source)
+        self.limits = limits
+        self.nodes = []
+        self.edges = []
+        self.node_count = 0
+        self.edge_count = 0
+        self.node_id_counter = 1
+        self.y_pos = 50
+        # Block key -> None (walked once), a _Template, or False (cannot be reused)
+        self._blocks = {}
+
+    def text(self, node):
+        return str(self.source[node.start_byte:node.end_byte], 'utf8')
+
+    def get_unique_node_id(self):
+        res = f"node-{self.node_id_counter}"
+        self.node_id_counter += 1
+        return res
+
+    def create_node(self, node_type, label, x, y, extra_data={}):
+        self.node_count += 1
+        if self.limits.max_nodes is not None and self.node_count > self.limits.max_nodes:
+            raise LimitExceeded('max_nodes', self.limits.max_nodes)
+        node_id = self.get_unique_node_id()
+        node = {
+            'id': node_id,
+            'type': node_type,
+            'position': {'x': x, 'y': y},
+            'data': {'label': label, **extra_data}
+        }
+        self.y_pos += 120 
+        return node
+
+    def create_edge(self, source, target, label=''):
+        self.edge_count += 1
+        if self.limits.max_edges is not None and self.edge_count > self.limits.max_edges:
+            raise LimitExceeded('max_edges', self.limits.max_edges)
+        edge_id = f"e-{source}-{target}-{label}-{self.get_unique_node_id()}"
+        return {'id': edge_id, 'source': source, 'target': target, 'label': label, 'type': 'smoothstep'}
+
+    def walk_ast(self, node, parent_id, x_pos=350, break_target_id=None, entry_label=''):
+        """
+        Walk the statements of a block and yield its node/edge events. The
+        first edge out of parent_id gets entry_label ('True'/'False' when the
+        block is a branch). Returns the (id, label) the next statement has to
+        be attached to, e.g. a loop condition and 'False'.
+
+        Nested blocks are not walked recursively: each block is a suspended
+        _walk_block generator on an explicit stack, which asks for a nested
+        block with a ('walk', args) request and is sent back its result. So any
+        nesting depth works without touching Python's recursion limit.
+
+        Nested blocks are hash-consed by kind, entry label and source bytes.
+        The second time a block is seen, its events are recorded relative to
+        the id counter and position it started at; from then on copies are
+        stamped out of that template with fresh ids instead of being walked.
+        Ids advance exactly as a walk would advance them, so the output is
+        the same either way.
+        """
+        max_depth = self.limits.max_depth
+        stack = [self._walk_block(node, parent_id, x_pos, break_target_id, entry_label)]
+        recordings = []
+        log = []
+        result = None
+        while stack:
+            try:
+                kind, item = stack[-1].send(result)
+            except StopIteration as stop:
+                stack.pop()
+                result = stop.value
+                if recordings and recordings[-1].index == len(stack):
+                    recording = recordings.pop()
+                    self._blocks[recording.key] = recording.template(log, result, self)
+                    if recordings:
+                        recordings[-1].deepest = max(recordings[-1].deepest, recording.deepest)
+                    else:
+                        log.clear()
+                continue
+            result = None
+            if kind == 'walk':
+                if max_depth is not None and len(stack) >= max_depth:
+                    raise LimitExceeded('max_depth', max_depth)
+                key = self._block_key(item)
+                if key is not None:
+                    blocks = self._blocks
+                    if key not in blocks:
+                        blocks[key] = None
+                    elif blocks[key] is None:
+                        recordings.append(_Recording(key, len(stack), len(log), self, item[1], item[2]))
+                    elif blocks[key] and blocks[key].fits(self, len(stack)):
+                        template = blocks[key]
+                        result = yield from template.stamp(self, item[1], item[2], log if recordings else None)
+                        if recordings:
+                            recordings[-1].deepest = max(recordings[-1].deepest, len(stack) + 1 + template.depth)
+                        continue
+                stack.append(self._walk_block(*item))
+                if recordings:
+                    recordings[-1].deepest = max(recordings[-1].deepest, len(stack))
+            else:
+                if recordings:
+                    log.append((kind, item))
+                yield kind, item
+        return result
+
+    def _block_key(self, request):
+        """(kind, entry label, source bytes) of a walk request for a block, else None."""
+        node = request[0]
+        # Statements that made no node are walked into too; only blocks are worth a key
+        if node is None:
+            return None
+        node_type = node.type
+        if node_type not in BLOCK_TYPES or node.has_error:
+            return None
+        text = self.source[node.start_byte:node.end_byte]
+        # A memoryview is hashed by content, without copying, if it is read-only
+        return node_type, request[4] if len(request) > 4 else '', text if text.readonly else bytes(text)
+
+    def _walk_block(self, node, parent_id, x_pos, break_target_id=None, entry_label=''):
+        current_parent_id = parent_id
+        # Label of the next edge out of current_parent_id
+        label = entry_label
+
+        if not node:
+            return parent_id, label
+
+        # Hum named children use karenge taaki '{' jaise faltu tokens na aayein
+        for child in named_children(node):
+            created_node = None
+
+            # --- FUNCTION CALL LOGIC ---
+            # expression_statement ke andar call_expression ho sakta hai
+            if child.type == 'expression_statement' and child.child(0).type == 'call_expression':
+                created_node = self.create_node('inputOutput', self.text(child), x_pos, self.y_pos)
+
+            elif child.type in ('declaration', 'return_statement'):
+                created_node = self.create_node('inputOutput', self.text(child), x_pos, self.y_pos)
+            
+            elif child.type == 'if_statement':
+                # ... (if-else ka logic waisa hi rahega)
+                condition = self.text(child.child_by_field_name('condition'))
+                if_node = self.create_node('decision', f"{condition}", x_pos, self.y_pos)
+                yield 'node', if_node
+                yield 'edge', self.create_edge(current_parent_id, if_node['id'], label)
+                
+                merge_node = self.create_node('inputOutput', '', x_pos, self.y_pos + 240)
+                merge_node['data']['label'] = ''
+                yield 'node', merge_node
+
+                # The branch label goes on the edge into the branch's first node
+                consequence = child.child_by_field_name('consequence')
+                true_end_id, true_label = yield 'walk', (consequence, if_node['id'], x_pos - 200, merge_node['id'], 'True')
+                if true_end_id != merge_node['id']:
+                   yield 'edge', self.create_edge(true_end_id, merge_node['id'], true_label)
+                
+                alternative = child.child_by_field_name('alternative')
+                if alternative:
+                    false_end_id, false_label = yield 'walk', (alternative, if_node['id'], x_pos + 200, merge_node['id'], 'False')
+                    if false_end_id != merge_node['id']:
+                        yield 'edge', self.create_edge(false_end_id, merge_node['id'], false_label)
+                else:
+                    yield 'edge', self.create_edge(if_node['id'], merge_node['id'], 'False')
+                
+                current_parent_id, label = merge_node['id'], ''
+                continue
+            
+            # Baki saare loops aur switch ka logic waisa hi rahega
+            # ... (for, while, switch logic here) ...
+            elif child.type == 'for_statement':
+                initializer = child.child_by_field_name('initializer')
+                init_text = self.text(initializer) if initializer else ''
+                init_node = self.create_node('inputOutput', init_text, x_pos, self.y_pos)
+                yield 'node', init_node
+                yield 'edge', self.create_edge(current_parent_id, init_node['id'], label)
+
+                condition = child.child_by_field_name('condition')
+                cond_text = self.text(condition) if condition else 'true'
+                cond_node = self.create_node('decision', cond_text, x_pos, self.y_pos)
+                yield 'node', cond_node
+                yield 'edge', self.create_edge(init_node['id'], cond_node['id'])
+                
+                body_node = child.child_by_field_name('body')
+                body_end_id, body_label = yield 'walk', (body_node, cond_node['id'], x_pos + 250, None, 'True')
+                
+                update = child.child_by_field_name('update')
+                update_text = self.text(update) if update else ''
+                update_node = self.create_node('inputOutput', update_text, x_pos + 250, self.y_pos)
+                yield 'node', update_node
+                yield 'edge', self.create_edge(body_end_id, update_node['id'], body_label)
+                
+                yield 'edge', self.create_edge(update_node['id'], cond_node['id'])
+
+                # The loop is left through the condition's False edge
+                current_parent_id, label = cond_node['id'], 'False'
+                continue
+
+            elif child.type == 'while_statement':
+                condition = child.child_by_field_name('condition')
+                cond_text = self.text(condition) if condition else 'true'
+                cond_node = self.create_node('decision', cond_text, x_pos, self.y_pos)
+                yield 'node', cond_node
+                yield 'edge', self.create_edge(current_parent_id, cond_node['id'], label)
+
+                body = child.child_by_field_name('body')
+                body_end_id, body_label = yield 'walk', (body, cond_node['id'], x_pos + 250, None, 'True')
+                yield 'edge', self.create_edge(body_end_id, cond_node['id'], body_label)
+                
+                current_parent_id, label = cond_node['id'], 'False'
+                continue
+
+            elif child.type == 'switch_statement':
+                condition = self.text(child.child_by_field_name('condition'))
+                switch_node = self.create_node('decision', f"switch {condition}", x_pos, self.y_pos)
+                yield 'node', switch_node
+                yield 'edge', self.create_edge(current_parent_id, switch_node['id'], label)
+                
+                body = child.child_by_field_name('body')
+                
+                merge_node = self.create_node('inputOutput', '', x_pos, self.y_pos + (body.named_child_count * 120))
+                merge_node['data']['label'] = ''
+                yield 'node', merge_node
+
+                case_x_offset = -200
+                
+                for case_statement in named_children(body):
+                    if case_statement.type == 'case_statement':
+                        # The edge into the case says which one it is, so the switch can be generated again
+                        value = case_statement.child_by_field_name('value')
+                        entry = f"case {self.text(value)}" if value else 'default'
+                        case_end_id, case_label = yield 'walk', (case_statement, switch_node['id'], x_pos + case_x_offset, merge_node['id'], entry)
+                        if case_end_id != merge_node['id']:
+                            yield 'edge', self.create_edge(case_end_id, merge_node['id'], case_label)
+                        
+                        case_x_offset += 200
+                    
+                    elif case_statement.type == 'default_statement':
+                        case_end_id, case_label = yield 'walk', (case_statement, switch_node['id'], x_pos + case_x_offset, merge_node['id'], 'default')
+                        if case_end_id != merge_node['id']:
+                            yield 'edge', self.create_edge(case_end_id, merge_node['id'], case_label)
+                        
+                        case_x_offset += 200
+
+                # tree-sitter-c parses 'default:' as a case_statement without a value
+                has_default = any(
+                    case.type == 'default_statement'
+                    or (case.type == 'case_statement' and case.child_by_field_name('value') is None)
+                    for case in named_children(body)
+                )
+                if not has_default:
+                    # A value no case matches goes straight past the switch
+                    yield 'edge', self.create_edge(switch_node['id'], merge_node['id'], 'default')
+
+                current_parent_id, label = merge_node['id'], ''
+                continue
+
+            if created_node:
+                yield 'node', created_node
+                # Chain from the previous statement, not from the block's parent
+                yield 'edge', self.create_edge(current_parent_id, created_node['id'], label)
+                current_parent_id, label = created_node['id'], ''
+            else:
+                current_parent_id, label = yield 'walk', (child, current_parent_id, x_pos, break_target_id, label)
+
+        return current_parent_id, label
+
+    def events(self, root_node, function=None):
+        """
+        Walk main() (or the whole file if there is no main), or the function
+        named function, and yield ('node', node) and ('edge', edge) pairs as
+        they are produced.
+        """
+        main_function_body = None
+        if function is not None:
+            found = find_function(root_node, self.source, function)
+            if found is None:
+                raise UnknownFunction(function)
+            main_function_body = found.child_by_field_name('body')
+        else:
+            found = find_function(root_node, self.source, 'main')
+            if found is not None:
+                main_function_body = found.child_by_field_name('body')
+
+        start_node = self.create_node('startEnd', 'Start', 350, self.y_pos)
+        yield 'node', start_node
+        
+        if main_function_body:
+            last_node_id, last_label = yield from self.walk_ast(main_function_body, start_node['id'])
+        else:
+            last_node_id, last_label = yield from self.walk_ast(root_node, start_node['id'])
+
+        end_node = self.create_node('startEnd', 'End', 350, self.y_pos)
+        yield 'node', end_node
+        
+        yield 'edge', self.create_edge(last_node_id, end_node['id'], last_label)
+
+    def build(self, root_node, function=None):
+        for kind, item in self.events(root_node, function):
+            if kind == 'node':
+                self.nodes.append(item)
+            else:
+                self.edges.append(item)
+        return self.nodes, self.edges
+
+
+def _node_number(node_id):
+    return int(node_id[5:])  # 'node-<n>'
+
+
+class _Recording:
+    """A block being walked for the second time, whose events become a _Template."""
+
+    __slots__ = ('key', 'index', 'start', 'counter', 'y_pos', 'parent_id', 'x_pos', 'deepest')
+
+    def __init__(self, key, index, start, builder, parent_id, x_pos):
+        self.key = key
+        self.index = index  # stack length before the block was pushed
+        self.start = start  # where its events start in the log
+        self.counter = builder.node_id_counter
+        self.y_pos = builder.y_pos
+        self.parent_id = parent_id
+        self.x_pos = x_pos
+        self.deepest = index + 1
+
+    def template(self, log, result, builder):
+        """The _Template of the recorded events, or False if they refer to outside nodes."""
+        counter = self.counter
+
+        def ref(node_id):
+            if node_id == self.parent_id:
+                return None
+            number = _node_number(node_id)
+            if number < counter:
+                raise ValueError(node_id)
+            return number - counter
+
+        steps = []
+        nodes = edges = 0
+        try:
+            for kind, item in log[self.start:]:
+                if kind == 'node':
+                    position = item['position']
+                    steps.append((True, _node_number(item['id']) - counter, item['type'], item['data']['label'],
+                                  position['x'] - self.x_pos, position['y'] - self.y_pos))
+                    nodes += 1
+                else:
+                    # Edge ids end with the counter value they took, '...-node-<n>'
+                    steps.append((False, int(item['id'].rsplit('-', 1)[1]) - counter,
+                                  ref(item['source']), ref(item['target']), item['label']))
+                    edges += 1
+            end = ref(result[0])
+        except ValueError:
+            # e.g. an edge to a node created outside the block
+            return False
+        return _Template(steps, end, result[1], builder.node_id_counter - counter, builder.y_pos - self.y_pos,
+                         nodes, edges, self.deepest - self.index - 1)
+
+
+class _Template:
+    """The events of a block relative to its start: ids as counter offsets, positions as offsets."""
+
+    __slots__ = ('steps', 'end', 'end_label', 'ids', 'height', 'nodes', 'edges', 'depth')
+
+    def __init__(self, steps, end, end_label, ids, height, nodes, edges, depth):
+        self.steps = steps
+        self.end = end
+        self.end_label = end_label
+        self.ids = ids
+        self.height = height
+        self.nodes = nodes
+        self.edges = edges
+        self.depth = depth  # nesting below the block itself
+
+    def fits(self, builder, stack_length):
+        """Whether a copy stays within the limits; if not, the block is walked so the limit is hit where it would be."""
+        limits = builder.limits
+        return not (
+            (limits.max_nodes is not None and builder.node_count + self.nodes > limits.max_nodes)
+            or (limits.max_edges is not None and builder.edge_count + self.edges > limits.max_edges)
+            or (limits.max_depth is not None and self.depth and stack_length + self.depth >= limits.max_depth)
+        )
+
+    def stamp(self, builder, parent_id, x_pos, log=None):
+        """Yield the events of a copy attached to parent_id at x_pos; returns what the walk would return."""
+        base = builder.node_id_counter
+        y_pos = builder.y_pos
+        for step in self.steps:
+            if step[0]:
+                _, offset, node_type, label, dx, dy = step
+                event = 'node', {
+                    'id': f"node-{base + offset}",
+                    'type': node_type,
+                    'position': {'x': x_pos + dx, 'y': y_pos + dy},
+                    'data': {'label': label},
+                }
+            else:
+                _, offset, source, target, label = step
+                source = parent_id if source is None else f"node-{base + source}"
+                target = parent_id if target is None else f"node-{base + target}"
+                event = 'edge', {
+                    'id': f"e-{source}-{target}-{label}-node-{base + offset}",
+                    'source': source, 'target': target, 'label': label, 'type': 'smoothstep',
+                }
+            if log is not None:
+                log.append(event)
+            yield event
+        builder.node_id_counter = base + self.ids
+        builder.y_pos = y_pos + self.height
+        builder.node_count += self.nodes
+        builder.edge_count += self.edges
+        return (parent_id if self.end is None else f"node-{base + self.end}"), self.end_label
+
+
+def build_flowchart(root_node, source, limits=UNLIMITED, function=None):
+    """
+    Walk a parsed C syntax tree and build react-flow nodes and edges, of
+    main() or of the function named function. source is the bytes the tree
+    was parsed from. Returns a (nodes, edges) tuple.
+    """
+    return FlowchartBuilder(source, limits).build(root_node, function)
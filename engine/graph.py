@@ -0,0 +1,143 @@
+"""
+Indexed graph model of a react-flow flowchart.
+
+Built once per request from the raw 'nodes' and 'edges' arrays, so traversal
+helpers can look up a node, its out-edges, its True/False branches and its
+in-degree in constant time instead of scanning the arrays at every step. An
+editor session keeps one FlowGraph and changes it in place (add_node,
+update_edge, ...) instead of building it again for every edit.
+"""
+
+TERMINALS = ('start', 'end')
+
+
+def _terminal(label):
+    """'start' or 'end' for the labels the control-flow analysis looks at, else None."""
+    label = label.lower()
+    return label if label in TERMINALS else None
+
+
+class FlowEdge:
+    __slots__ = ('id', 'source', 'target', 'label')
+
+    def __init__(self, source, target, label, edge_id=None):
+        self.id = edge_id
+        self.source = source
+        self.target = target
+        self.label = label
+
+
+class FlowNode:
+    __slots__ = ('id', 'type', 'label', 'out', 'incoming', 'true_edge', 'false_edge')
+
+    def __init__(self, node_id, node_type, label):
+        self.id = node_id
+        self.type = node_type
+        self.label = label
+        self.out = []
+        self.incoming = []
+        self.true_edge = None
+        self.false_edge = None
+
+    @property
+    def in_degree(self):
+        return len(self.incoming)
+
+    def next_id(self):
+        """Target of the first out-edge, or None for a dead end."""
+        return self.out[0].target if self.out else None
+
+    def find_branches(self):
+        """Set true_edge and false_edge from the labels of the out-edges (the last one of each wins)."""
+        self.true_edge = self.false_edge = None
+        for edge in self.out:
+            branch = edge.label.lower()
+            if branch == 'true':
+                self.true_edge = edge
+            elif branch == 'false':
+                self.false_edge = edge
+
+
+class FlowGraph:
+    __slots__ = ('index', 'edges')
+
+    def __init__(self, nodes, edges):
+        self.index = {}   # node id -> FlowNode, in the order of the nodes array
+        self.edges = {}   # edge id -> FlowEdge, for edges that have an id
+        for raw in nodes:
+            # Keep the first node when ids repeat, like a linear scan would
+            if raw['id'] not in self.index:
+                self.add_node(raw)
+        for raw in edges:
+            self.add_edge(raw)
+
+    def node(self, node_id):
+        return self.index.get(node_id)
+
+    def start_node(self):
+        for node in self.index.values():
+            if node.label.lower() == 'start':
+                return node
+        return None
+
+    def add_node(self, raw):
+        data = raw.get('data') or {}
+        node = FlowNode(raw['id'], raw.get('type', ''), data.get('label') or '')
+        self.index[node.id] = node
+        return node
+
+    def update_node(self, raw):
+        """
+        Change the type and label of a node in place. Returns whether that can
+        change the control flow (the node became or stopped being Start/End).
+        """
+        node = self.index[raw['id']]
+        label = (raw.get('data') or {}).get('label') or ''
+        changed = _terminal(node.label) != _terminal(label)
+        node.type = raw.get('type', '')
+        node.label = label
+        return changed
+
+    def remove_node(self, node_id):
+        """Remove a node; its edges are expected to be removed first."""
+        del self.index[node_id]
+
+    def add_edge(self, raw):
+        edge = FlowEdge(raw['source'], raw['target'], raw.get('label') or '', raw.get('id'))
+        if edge.id is not None:
+            self.edges.setdefault(edge.id, edge)
+        source = self.index.get(edge.source)
+        if source is not None:
+            source.out.append(edge)
+            branch = edge.label.lower()
+            if branch == 'true':
+                source.true_edge = edge
+            elif branch == 'false':
+                source.false_edge = edge
+        target = self.index.get(edge.target)
+        if target is not None:
+            target.incoming.append(edge)
+        return edge
+
+    def update_edge(self, raw):
+        """Change an edge in place, keeping its place among its source's out-edges if only the label changes."""
+        edge = self.edges[raw['id']]
+        if edge.source != raw['source'] or edge.target != raw['target']:
+            self.remove_edge(edge.id)
+            return self.add_edge(raw)
+        edge.label = raw.get('label') or ''
+        source = self.index.get(edge.source)
+        if source is not None:
+            source.find_branches()
+        return edge
+
+    def remove_edge(self, edge_id):
+        edge = self.edges.pop(edge_id)
+        source = self.index.get(edge.source)
+        if source is not None:
+            source.out.remove(edge)
+            if edge is source.true_edge or edge is source.false_edge:
+                source.find_branches()
+        target = self.index.get(edge.target)
+        if target is not None:
+            target.incoming.remove(edge)
@@ -0,0 +1,171 @@
+"""
+Layered (Sugiyama-style) layout of generated flowcharts.
+
+The walker places nodes with a running y position and fixed x offsets, which
+overlaps branches and makes big programs extremely tall. This pass replaces
+those positions in four steps:
+
+1. back edges found by a depth-first search are reversed, so the graph is acyclic;
+2. nodes are put in layers by longest path from the sources;
+3. edges that span several layers get virtual nodes, and the order of nodes
+   inside each layer is improved with barycenter sweeps to reduce crossings;
+4. coordinates are assigned from layer and order.
+
+Layering, barycenters and coordinates are computed with NumPy over whole
+layers at a time, so the Python work is per layer rather than per node.
+"""
+import numpy as np
+
+X_SPACING = 250
+Y_SPACING = 120
+ORIGIN_X = 350
+ORIGIN_Y = 50
+SWEEPS = 4
+
+
+def _acyclic_edges(count, src, dst):
+    """Return src, dst with every DFS back edge reversed and self loops dropped."""
+    keep = src != dst
+    src, dst = src[keep], dst[keep]
+    order = np.argsort(src, kind='stable')
+    starts = np.searchsorted(src[order], np.arange(count + 1))
+
+    # The search itself is inherently sequential; plain lists are faster to step through
+    order_list = order.tolist()
+    starts_list = starts.tolist()
+    dst_list = dst.tolist()
+    state = [0] * count  # 0 new, 1 on stack, 2 done
+    back = np.zeros(len(src), dtype=bool)
+    for root in range(count):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, starts_list[root])]
+        while stack:
+            node, position = stack[-1]
+            if position == starts_list[node + 1]:
+                stack.pop()
+                state[node] = 2
+                continue
+            stack[-1] = (node, position + 1)
+            edge = order_list[position]
+            target = dst_list[edge]
+            if state[target] == 1:
+                back[edge] = True
+            elif state[target] == 0:
+                state[target] = 1
+                stack.append((target, starts_list[target]))
+
+    return np.where(back, dst, src), np.where(back, src, dst)
+
+
+def _layers(count, src, dst):
+    """Longest-path layering of a DAG, processed one frontier at a time."""
+    layer = np.zeros(count, dtype=np.int64)
+    in_degree = np.bincount(dst, minlength=count)
+    order = np.argsort(src, kind='stable')
+    starts = np.searchsorted(src[order], np.arange(count + 1))
+    frontier = np.flatnonzero(in_degree == 0)
+    while frontier.size:
+        # Out-edges of every node in the frontier
+        lengths = starts[frontier + 1] - starts[frontier]
+        if not lengths.sum():
+            break
+        offsets = np.repeat(starts[frontier] - np.cumsum(lengths) + lengths, lengths)
+        edges = order[offsets + np.arange(lengths.sum())]
+        targets = dst[edges]
+        np.maximum.at(layer, targets, layer[src[edges]] + 1)
+        np.subtract.at(in_degree, targets, 1)
+        frontier = np.unique(targets[in_degree[targets] == 0])
+    return layer
+
+
+def _add_virtual_nodes(count, src, dst, layer):
+    """Split edges spanning several layers so every edge joins adjacent layers."""
+    span = layer[dst] - layer[src]
+    long = span > 1
+    if not long.any():
+        return count, src, dst, layer
+    extra = span[long] - 1
+    total = int(extra.sum())
+    virtual = np.arange(count, count + total)
+    # Chain of every long edge: source, its virtual nodes, target
+    edge_of = np.repeat(np.arange(long.sum()), extra)
+    first = np.cumsum(extra) - extra
+    step = np.arange(total) - np.repeat(first, extra) + 1
+    virtual_layer = layer[src[long]][edge_of] + step
+
+    is_first = step == 1
+    is_last = step == extra[edge_of]
+    chain_src = np.concatenate([src[long], virtual[~is_last]])
+    chain_dst = np.concatenate([virtual[is_first], virtual[~is_first]])
+    # Edges from each chain's last virtual node to the real target
+    chain_src = np.concatenate([chain_src, virtual[is_last]])
+    chain_dst = np.concatenate([chain_dst, dst[long]])
+
+    src = np.concatenate([src[~long], chain_src])
+    dst = np.concatenate([dst[~long], chain_dst])
+    return count + total, src, dst, np.concatenate([layer, virtual_layer])
+
+
+def _group(keys, groups):
+    """Indices of keys split by key value 0..groups-1, in index order."""
+    order = np.argsort(keys, kind='stable')
+    bounds = np.searchsorted(keys[order], np.arange(groups + 1))
+    return [order[bounds[value]:bounds[value + 1]] for value in range(groups)]
+
+
+def _order_layers(count, src, dst, layer):
+    """Order nodes inside their layers with barycenter sweeps; returns positions and layer members."""
+    groups = int(layer.max()) + 1
+    members = _group(layer, groups)
+    position = np.zeros(count, dtype=np.float64)
+    for nodes in members:
+        position[nodes] = np.arange(nodes.size)
+
+    # Edges grouped by the layer of their lower and of their upper end
+    down = _group(layer[dst], groups)
+    up = _group(layer[src], groups)
+
+    def sweep(layers, edges_for, fixed, moving):
+        for value in layers:
+            nodes = members[value]
+            edges = edges_for[value]
+            if nodes.size < 2 or not edges.size:
+                continue
+            # position is the index inside the layer, so it doubles as a local index
+            local = position[moving[edges]].astype(np.int64)
+            weight = np.bincount(local, weights=position[fixed[edges]], minlength=nodes.size)
+            degree = np.bincount(local, minlength=nodes.size)
+            # Nodes without neighbours keep their current place
+            barycenter = np.where(degree > 0, weight / np.maximum(degree, 1), position[nodes])
+            nodes = nodes[np.lexsort((position[nodes], barycenter))]
+            members[value] = nodes
+            position[nodes] = np.arange(nodes.size)
+
+    for _ in range(SWEEPS):
+        sweep(range(1, groups), down, src, dst)
+        sweep(range(groups - 2, -1, -1), up, dst, src)
+    return position, members
+
+
+def layered_layout(nodes, edges):
+    """Replace the 'position' of every node with a layered layout, in place."""
+    if not nodes:
+        return nodes
+    index = {node['id']: i for i, node in enumerate(nodes)}
+    pairs = [(index[e['source']], index[e['target']]) for e in edges if e['source'] in index and e['target'] in index]
+    count = len(nodes)
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    src, dst = _acyclic_edges(count, pairs[:, 0], pairs[:, 1])
+    layer = _layers(count, src, dst)
+    total, src, dst, layer = _add_virtual_nodes(count, src, dst, layer)
+    position, members = _order_layers(total, src, dst, layer)
+
+    # Centre every layer on the same axis
+    width = np.array([nodes_in_layer.size for nodes_in_layer in members])
+    x = ORIGIN_X + (position - (width[layer] - 1) / 2) * X_SPACING
+    y = ORIGIN_Y + layer * Y_SPACING
+    for i, node in enumerate(nodes):
+        node['position'] = {'x': float(x[i]), 'y': float(y[i])}
+    return nodes
@@ -0,0 +1,78 @@
+"""
+Per-request work budgets for the conversion engines.
+
+A Limits object says how much work one conversion may do; None means no
+limit. Exceeding a limit raises LimitExceeded, which the views turn into a
+structured 413/422 error instead of letting one huge input tie up a worker.
+"""
+import time
+
+
+class LimitExceeded(Exception):
+    def __init__(self, limit, maximum, status=422):
+        self.limit = limit
+        self.maximum = maximum
+        self.status = status
+        super().__init__(f"Input exceeds the {limit.replace('_', ' ')} limit of {maximum}")
+
+    def as_dict(self):
+        return {
+            'status': 'error',
+            'error': 'limit_exceeded',
+            'limit': self.limit,
+            'maximum': self.maximum,
+            'message': str(self),
+        }
+
+
+class Limits:
+    __slots__ = ('max_body_bytes', 'parse_timeout', 'max_nodes', 'max_edges', 'max_depth')
+
+    def __init__(self, max_body_bytes=None, parse_timeout=None, max_nodes=None, max_edges=None, max_depth=None):
+        self.max_body_bytes = max_body_bytes
+        self.parse_timeout = parse_timeout
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.max_depth = max_depth
+
+    def check_body(self, size):
+        if self.max_body_bytes is not None and size > self.max_body_bytes:
+            raise LimitExceeded('max_body_bytes', self.max_body_bytes, status=413)
+
+    def check_graph(self, nodes, edges):
+        if self.max_nodes is not None and len(nodes) > self.max_nodes:
+            raise LimitExceeded('max_nodes', self.max_nodes, status=413)
+        if self.max_edges is not None and len(edges) > self.max_edges:
+            raise LimitExceeded('max_edges', self.max_edges, status=413)
+
+
+UNLIMITED = Limits()
+
+PARSE_CHUNK_SIZE = 32 * 1024
+
+
+def parse(parser, source, limits=UNLIMITED, old_tree=None):
+    """
+    Parse source, giving up after limits.parse_timeout seconds.
+
+    The source is fed to tree-sitter through a read callback in chunks, and
+    once the deadline has passed the callback reports end of input, which
+    makes tree-sitter wrap up quickly; the truncated tree is then discarded.
+    """
+    if limits.parse_timeout is None:
+        return parser.parse(source, old_tree) if old_tree is not None else parser.parse(source)
+
+    deadline = time.monotonic() + limits.parse_timeout
+    timed_out = False
+
+    def read(offset, point):
+        nonlocal timed_out
+        if timed_out or time.monotonic() > deadline:
+            timed_out = True
+            return b''
+        return source[offset:offset + PARSE_CHUNK_SIZE]
+
+    tree = parser.parse(read, old_tree) if old_tree is not None else parser.parse(read)
+    if timed_out:
+        raise LimitExceeded('parse_timeout', limits.parse_timeout)
+    return tree
@@ -0,0 +1,69 @@
+"""
+Outline of the functions in a C translation unit.
+
+Listing the functions only looks at the top level of the syntax tree (and
+inside preprocessor conditionals and extern "C" blocks), never at function
+bodies, so it costs little more than the parse. The flowchart of a function
+is then built on its own, from just its byte range.
+"""
+
+# Top-level nodes that can hold function definitions
+CONTAINERS = frozenset((
+    'preproc_if', 'preproc_ifdef', 'preproc_else', 'preproc_elif', 'linkage_specification', 'declaration_list',
+))
+
+
+class UnknownFunction(ValueError):
+    def __init__(self, name):
+        super().__init__(f'Function not found: {name}')
+        self.name = name
+
+
+def function_name(function, source):
+    """Name of a function_definition, e.g. 'main' for 'static int *main(void)'."""
+    declarator = function.child_by_field_name('declarator')
+    # Pointer, function and parenthesized declarators wrap the identifier
+    while declarator is not None and declarator.type != 'identifier':
+        inner = declarator.child_by_field_name('declarator')
+        if inner is None and declarator.type == 'parenthesized_declarator' and declarator.named_child_count:
+            inner = declarator.named_children[0]
+        declarator = inner
+    if declarator is None:
+        return ''
+    return str(source[declarator.start_byte:declarator.end_byte], 'utf8', 'replace')
+
+
+def iter_functions(root_node):
+    """Every function_definition of the translation unit, in source order."""
+    stack = [iter(root_node.children)]
+    while stack:
+        for child in stack[-1]:
+            if child.type == 'function_definition':
+                yield child
+            elif child.type in CONTAINERS:
+                stack.append(iter(child.children))
+                break
+        else:
+            stack.pop()
+
+
+def find_function(root_node, source, name):
+    for function in iter_functions(root_node):
+        if function_name(function, source) == name:
+            return function
+    return None
+
+
+def function_outline(root_node, source):
+    """[{'name', 'start_byte', 'end_byte', 'start_line', 'end_line', 'size'}] of every function."""
+    return [
+        {
+            'name': function_name(function, source),
+            'start_byte': function.start_byte,
+            'end_byte': function.end_byte,
+            'start_line': function.start_point[0] + 1,
+            'end_line': function.end_point[0] + 1,
+            'size': function.end_byte - function.start_byte,
+        }
+        for function in iter_functions(root_node)
+    ]
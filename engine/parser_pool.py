@@ -0,0 +1,68 @@
+"""
+Process-wide pool of tree-sitter C parsers.
+
+Building the C ``Language`` and a ``Parser`` is a fixed cost that used to be
+paid on every request. The pool builds the language once and keeps one parser
+per thread, so threaded workers never share a parser between two parses.
+tree-sitter itself is only imported when the first parser is built, so
+importing the pool costs nothing at startup.
+"""
+import threading
+from contextlib import contextmanager
+
+
+class ParserPool:
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._language = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def language(self):
+        if self._language is None:
+            with self._lock:
+                if self._language is None:
+                    from tree_sitter import Language
+                    from tree_sitter_c import language as c_language_func
+                    self._language = Language(c_language_func())
+        return self._language
+
+    def _build(self):
+        from tree_sitter import Parser
+        parser = Parser()
+        parser.language = self.language
+        return parser
+
+    def warm(self):
+        """Build the language and the calling thread's parser ahead of time."""
+        if getattr(self._local, 'parser', None) is None:
+            self._local.parser = self._build()
+
+    @contextmanager
+    def checkout(self):
+        """Lend the calling thread's parser, building it on first use."""
+        parser = getattr(self._local, 'parser', None)
+        # Take the parser out while it is lent, so a nested checkout on the
+        # same thread builds its own instead of sharing one mid-parse.
+        self._local.parser = None
+        with self._lock:
+            if parser is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if parser is None:
+            parser = self._build()
+        try:
+            yield parser
+        finally:
+            parser.reset()
+            self._local.parser = parser
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+pool = ParserPool()
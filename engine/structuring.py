@@ -0,0 +1,214 @@
+"""
+Control-flow analysis used to turn a flowchart back into structured C.
+
+Everything here is computed once per flowchart, with iterative algorithms:
+
+* a depth-first search from the Start node finds the reachable nodes and the
+  back edges (an edge into a node that is still on the DFS stack), whose
+  targets are the loop headers;
+* immediate post-dominators come from the Cooper-Harvey-Kennedy dominator
+  algorithm run on the reversed graph, with a virtual exit joined to every
+  sink. The immediate post-dominator of a decision is where its branches
+  merge again.
+
+A decision with more than two out-edges, or one labelled ``switch (...)``
+like the walker writes them, is a multi-way branch: every out-edge is one
+case, labelled ``case <value>`` or ``default``.
+"""
+import re
+
+SWITCH_LABEL = re.compile(r'switch\s*(\(.*\))\s*$', re.S)
+
+
+class UnstructuredFlowchart(ValueError):
+    """A flowchart whose control flow cannot be written as structured C."""
+
+
+def is_end(node):
+    return node.label.lower() == 'end'
+
+
+def branches(node):
+    """
+    The (true, false) out-edges of a decision. Unlabelled edges are used in
+    order for whichever branch has no labelled edge.
+    """
+    true_edge = node.true_edge
+    false_edge = node.false_edge
+    if true_edge is None or false_edge is None:
+        spare = [edge for edge in node.out if edge is not true_edge and edge is not false_edge and not edge.label]
+        if true_edge is None and spare:
+            true_edge = spare.pop(0)
+        if false_edge is None and spare:
+            false_edge = spare.pop(0)
+    return true_edge, false_edge
+
+
+def switch_expression(node):
+    """The parenthesized expression of a multi-way decision, or None for an ordinary node."""
+    if node.type != 'decision':
+        return None
+    match = SWITCH_LABEL.match(node.label.strip())
+    if match:
+        return match.group(1)
+    if len(node.out) > 2:
+        return f"({node.label.strip()})"
+    return None
+
+
+def cases(node):
+    """
+    The [(labels, target_id)] of a multi-way decision, in edge order. Edges
+    to the same target share one body, like consecutive case labels.
+    """
+    by_target = {}
+    for edge in node.out:
+        label = edge.label.strip()
+        if not label:
+            raise UnstructuredFlowchart(
+                f'Decision "{node.label}" has {len(node.out)} branches; '
+                'label each of its edges with its case ("case 1", "default", ...)'
+            )
+        if label != 'default' and not label.startswith('case '):
+            label = f"case {label}"
+        by_target.setdefault(edge.target, []).append(label)
+    return [(labels, target_id) for target_id, labels in by_target.items()]
+
+
+def successors(graph, node):
+    """Known successor nodes; an End node is a sink whatever its edges say."""
+    if is_end(node):
+        return []
+    result = []
+    for edge in node.out:
+        target = graph.node(edge.target)
+        if target is not None:
+            result.append(target)
+    return result
+
+
+class ControlFlow:
+    def __init__(self, graph, start):
+        self.graph = graph
+        self.start = start
+        self.order = []           # reachable nodes in DFS preorder
+        self.reachable = set()
+        self.back_edges = {}      # loop header id -> [latch ids]
+        self.ipdom = {}           # node id -> immediate post-dominator id (None = virtual exit)
+        self._loop_bodies = {}
+        self._find_back_edges()
+        self.reachable = {node.id for node in self.order}
+        self._find_post_dominators()
+
+    def _find_back_edges(self):
+        graph = self.graph
+        on_stack = set()
+        seen = {self.start.id}
+        self.order.append(self.start)
+        stack = [(self.start, iter(successors(graph, self.start)))]
+        on_stack.add(self.start.id)
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child.id in on_stack:
+                    self.back_edges.setdefault(child.id, []).append(node.id)
+                elif child.id not in seen:
+                    seen.add(child.id)
+                    self.order.append(child)
+                    on_stack.add(child.id)
+                    stack.append((child, iter(successors(graph, child))))
+                    break
+            else:
+                stack.pop()
+                on_stack.discard(node.id)
+
+    def _find_post_dominators(self):
+        graph = self.graph
+        nodes = self.order
+        index = {node.id: i for i, node in enumerate(nodes)}
+        exit_index = len(nodes)
+
+        # Successors in the forward graph are predecessors in the reversed one
+        succ = []
+        preds = [[] for _ in range(exit_index + 1)]
+        for i, node in enumerate(nodes):
+            targets = [index[child.id] for child in successors(graph, node)]
+            if not targets:
+                targets = [exit_index]
+            succ.append(targets)
+            for target in targets:
+                preds[target].append(i)
+
+        # Postorder of the reversed graph, starting from the virtual exit
+        postorder = []
+        visited = [False] * (exit_index + 1)
+        visited[exit_index] = True
+        stack = [(exit_index, iter(preds[exit_index]))]
+        while stack:
+            current, children = stack[-1]
+            for child in children:
+                if not visited[child]:
+                    visited[child] = True
+                    stack.append((child, iter(preds[child])))
+                    break
+            else:
+                stack.pop()
+                postorder.append(current)
+        rank = [-1] * (exit_index + 1)
+        for position, current in enumerate(postorder):
+            rank[current] = position
+
+        idom = [None] * (exit_index + 1)
+        idom[exit_index] = exit_index
+
+        def intersect(a, b):
+            while a != b:
+                while rank[a] < rank[b]:
+                    a = idom[a]
+                while rank[b] < rank[a]:
+                    b = idom[b]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for current in reversed(postorder):
+                if current == exit_index:
+                    continue
+                new_idom = None
+                for other in succ[current]:
+                    if idom[other] is None:
+                        continue
+                    new_idom = other if new_idom is None else intersect(other, new_idom)
+                if new_idom is not None and idom[current] != new_idom:
+                    idom[current] = new_idom
+                    changed = True
+
+        for i, node in enumerate(nodes):
+            # Nodes that can never reach an exit (endless loops) have no post-dominator
+            if idom[i] is None or idom[i] == exit_index:
+                self.ipdom[node.id] = None
+            else:
+                self.ipdom[node.id] = nodes[idom[i]].id
+
+    def is_loop_header(self, node_id):
+        return node_id in self.back_edges
+
+    def loop_body(self, header_id):
+        """Ids of the natural loop of a header: everything reaching a latch without passing the header."""
+        body = self._loop_bodies.get(header_id)
+        if body is None:
+            body = {header_id}
+            stack = [latch for latch in self.back_edges.get(header_id, []) if latch not in body]
+            body.update(stack)
+            while stack:
+                node = self.graph.node(stack.pop())
+                for edge in node.incoming:
+                    if edge.source not in body and edge.source in self.reachable:
+                        body.add(edge.source)
+                        stack.append(edge.source)
+            self._loop_bodies[header_id] = body
+        return body
+
+    def merge_point(self, decision_id):
+        return self.ipdom.get(decision_id)
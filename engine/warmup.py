@@ -0,0 +1,63 @@
+"""
+Warm-up of the conversion engine.
+
+The first conversion in a process pays for importing tree-sitter and NumPy,
+building the C language and a parser, and the first calls into the walker,
+the layout and the code generator. warm_up() pays all of that ahead of time
+by converting a tiny program both ways; the WSGI and ASGI entry points run
+it when FLOWCHART_WARM_UP is set, and with gunicorn's preload_app it runs
+once in the master, before the workers are forked.
+"""
+import time
+
+WARM_UP_PROGRAM = b'''
+int main() {
+    int x = 0;
+    for (int i = 0; i < 3; i++) { x += i; }
+    while (x > 0) { x--; }
+    if (x == 0) { printf("zero"); } else { printf("other"); }
+    return 0;
+}
+'''
+
+# Timings of the last warm_up() in this process, reported by profile_startup
+last_timings = {}
+
+
+def warm_up():
+    """Import, build and exercise the engine once; returns the time of each step in ms."""
+    timings = {}
+
+    def step(name, func):
+        start = time.perf_counter()
+        result = func()
+        timings[name] = round((time.perf_counter() - start) * 1000, 3)
+        return result
+
+    from .parser_pool import pool
+
+    step('parser', pool.warm)
+    with pool.checkout() as parser:
+        tree = step('parse', lambda: parser.parse(WARM_UP_PROGRAM))
+
+    from .codegen import CodeGenerator
+    from .flowchart import build_flowchart
+    from .graph import FlowGraph
+
+    nodes, edges = step('walk', lambda: build_flowchart(tree.root_node, WARM_UP_PROGRAM))
+    graph = FlowGraph(nodes, edges)
+    step('codegen', lambda: CodeGenerator(graph, graph.start_node()).generate())
+
+    def import_layout():
+        from . import layout
+        return layout
+
+    layout = step('import_layout', import_layout)
+    from .wire import dumps, to_columnar
+
+    step('layout', lambda: layout.layered_layout(nodes, edges))
+    step('encode', lambda: dumps(to_columnar(nodes, edges)))
+
+    last_timings.clear()
+    last_timings.update(timings)
+    return timings
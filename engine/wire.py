@@ -0,0 +1,84 @@
+"""
+Compact columnar wire format for flowchart responses.
+
+The default response repeats a lot for every element: each node is a nested
+dict, each edge carries a long synthetic id and 'type': 'smoothstep'. The
+compact format sends one array per field instead, with interned strings:
+
+    {"status": "success", "format": "compact",
+     "strings": ["startEnd", "Start", ...],
+     "nodes": {"id": [1, 3, ...], "type": [0, ...], "label": [1, ...], "x": [...], "y": [...]},
+     "edges": {"source": [0, ...], "target": [1, ...], "label": [...]},
+     "id_prefix": "node-", "edge_type": "smoothstep"}
+
+Node types and labels are indexes into "strings". Edge ends are indexes into
+the node arrays. Node ids are sent as the number after id_prefix when every
+id has that shape, and as strings otherwise. Edge ids are not sent; clients
+can derive them from source, target and position.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COMPACT_CONTENT_TYPE = 'application/vnd.visual-coder.compact+json'
+ID_PREFIX = 'node-'
+EDGE_TYPE = 'smoothstep'
+
+
+def dumps(data):
+    """Serialize to JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode('utf8')
+
+
+def loads(data):
+    """Parse JSON from bytes or any buffer, e.g. an mmap, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(memoryview(data))
+    return json.loads(bytes(data))
+
+
+def to_columnar(nodes, edges):
+    strings = []
+    interned = {}
+
+    def intern(value):
+        index = interned.get(value)
+        if index is None:
+            index = interned[value] = len(strings)
+            strings.append(value)
+        return index
+
+    ids = [node['id'] for node in nodes]
+    suffixes = [node_id[len(ID_PREFIX):] for node_id in ids]
+    if all(node_id.startswith(ID_PREFIX) for node_id in ids) and all(s.isdigit() for s in suffixes):
+        id_column = [int(s) for s in suffixes]
+        id_prefix = ID_PREFIX
+    else:
+        id_column = ids
+        id_prefix = ''
+
+    position = {node_id: i for i, node_id in enumerate(ids)}
+    return {
+        'status': 'success',
+        'format': 'compact',
+        'strings': strings,
+        'id_prefix': id_prefix,
+        'edge_type': EDGE_TYPE,
+        'nodes': {
+            'id': id_column,
+            'type': [intern(node['type']) for node in nodes],
+            'label': [intern(node['data']['label']) for node in nodes],
+            'x': [node['position']['x'] for node in nodes],
+            'y': [node['position']['y'] for node in nodes],
+        },
+        'edges': {
+            'source': [position[edge['source']] for edge in edges],
+            'target': [position[edge['target']] for edge in edges],
+            'label': [intern(edge['label']) for edge in edges],
+        },
+    }
@@ -0,0 +1,30 @@
+"""
+gunicorn settings, picked up automatically from the working directory.
+
+With preload_app the Django app (and with it the engine warm-up in the
+WSGI/ASGI module) is loaded once in the master; forked workers start with
+tree-sitter, NumPy and the C language already in memory, shared copy-on-write.
+Set GUNICORN_PRELOAD=0 to load the app in every worker instead.
+"""
+import os
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+_started = time.perf_counter()
+
+
+def when_ready(server):
+    server.log.info('Ready in %.0f ms (preload_app=%s)', (time.perf_counter() - _started) * 1000, preload_app)
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    # Warm-up never opens a database connection, but make sure no worker inherits one
+    from django.db import connections
+    for connection in connections.all(initialized_only=True):
+        connection.close()
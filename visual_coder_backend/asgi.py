@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'visual_coder_backend.settings')
 
 application = get_asgi_application()
+
+# Server processes only: management commands never import this module
+from api.apps import warm_up_server  # noqa: E402
+
+warm_up_server()
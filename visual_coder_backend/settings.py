@@ -28,7 +28,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,4 +90,32 @@ CORS_ALLOWED_ORIGINS = [
     "https://visual-coder-django.vercel.app"  # No trailing slash!
 ]
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Flowchart engine
+FLOWCHART_MAX_SESSIONS = 256
+# In-process result cache; set FLOWCHART_CACHE_ALIAS to a configured CACHES
+# alias (e.g. redis or memcached) to share results between workers as well.
+FLOWCHART_CACHE_SIZE = 512
+FLOWCHART_CACHE_MAX_BYTES = 64 * 1024 * 1024
+FLOWCHART_CACHE_ALIAS = os.environ.get('FLOWCHART_CACHE_ALIAS')
+# Async views: conversion threads (default: CPU count) and how many more
+# requests may wait for one before the server answers 503 with Retry-After.
+FLOWCHART_ASYNC_WORKERS = int(os.environ.get('FLOWCHART_ASYNC_WORKERS', 0)) or None
+FLOWCHART_ASYNC_QUEUE = int(os.environ.get('FLOWCHART_ASYNC_QUEUE', 64))
+FLOWCHART_RETRY_AFTER = 1
+# Batch endpoint: worker processes (default: CPU count) and files per request
+FLOWCHART_BATCH_WORKERS = int(os.environ.get('FLOWCHART_BATCH_WORKERS', 0)) or None
+FLOWCHART_BATCH_MAX_FILES = 500
+# Per-request budgets; requests over them get a 413/422 'limit_exceeded' error
+FLOWCHART_MAX_BODY_BYTES = 1024 * 1024
+FLOWCHART_PARSE_TIMEOUT = 2.0  # seconds
+FLOWCHART_MAX_NODES = 50000
+FLOWCHART_MAX_EDGES = 100000
+FLOWCHART_MAX_DEPTH = 1000
+# The batch view reads its body past DATA_UPLOAD_MAX_MEMORY_SIZE, up to this
+FLOWCHART_BATCH_MAX_BODY_BYTES = 16 * 1024 * 1024
+# Warm the engine up (imports, parser, a first conversion) when the WSGI or ASGI
+# application is loaded; management commands never do. profile_startup fails above the budget.
+FLOWCHART_WARM_UP = os.environ.get('FLOWCHART_WARM_UP', '1') != '0'
+FLOWCHART_STARTUP_BUDGET_MS = int(os.environ.get('FLOWCHART_STARTUP_BUDGET_MS', 1500))
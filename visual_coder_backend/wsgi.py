@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'visual_coder_backend.settings')
 
 application = get_wsgi_application()
+
+# Server processes only: management commands never import this module
+from api.apps import warm_up_server  # noqa: E402
+
+warm_up_server()